@@ -0,0 +1,196 @@
+# admission.py
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from loguru import logger
+
+from metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入（限流或排队已满），由 main.py 转换为 429 + Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒补充，最多积累 burst 个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        # 桶可能在取得 now 之后才创建，时间差为负时不扣减
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = max(self.updated_at, now)
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个令牌可用的秒数（0 表示现在可用）"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class BucketTable:
+    """按 key 维护令牌桶，LRU 限制条目数；被淘汰的桶早已回满，重新创建等价"""
+
+    def __init__(self, rate: float, burst: float, max_entries: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """/chat 的准入控制
+
+    1. reserve：在事件循环上、进入线程池之前占用名额，执行中与排队中的请求合计达到
+       max_in_flight + max_queue 时立即拒绝（queue_full），多余的请求不会在线程池外无界等待；
+    2. admit：按用户、按会话的令牌桶限流，超限立即拒绝；
+    3. 全局并发上限：超出时在有界等待队列中等待执行槽位，等待超时则拒绝。
+    """
+
+    def __init__(self, settings):
+        per_minute = lambda n: n / 60.0
+        self.users = BucketTable(per_minute(settings.rate_limit_user_per_minute),
+                                 settings.rate_limit_user_burst, settings.rate_limit_max_keys)
+        self.sessions = BucketTable(per_minute(settings.rate_limit_session_per_minute),
+                                    settings.rate_limit_session_burst, settings.rate_limit_max_keys)
+        self.max_in_flight = settings.chat_max_in_flight
+        self.max_queue = settings.chat_max_queue
+        self.queue_timeout = settings.chat_queue_timeout
+        self.retry_after = settings.chat_retry_after
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.reserved = 0
+        self.in_flight = 0
+        self.waiting = 0
+
+    @staticmethod
+    def _rejected(error: AdmissionRejected, user: str) -> AdmissionRejected:
+        metrics.inc("admission_rejected_total", reason=error.reason)
+        logger.warning(f"Admission rejected ({error.reason}) for user {user}, retry after {error.retry_after:.1f}s")
+        return error
+
+    @contextmanager
+    def reserve(self, user: str):
+        """在事件循环上调用（进入线程池之前），请求结束时释放；名额已满抛 AdmissionRejected"""
+        with self._lock:
+            full = self.reserved >= self.max_in_flight + self.max_queue
+            if not full:
+                self.reserved += 1
+        if full:
+            raise self._rejected(AdmissionRejected("queue_full", self.retry_after), user)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.reserved -= 1
+
+    def _check_rate(self, user: str, session_id: Optional[str]):
+        # 两个桶都有令牌时才同时扣减，避免一个桶拒绝时白白消耗另一个桶
+        with self._lock:
+            now = time.monotonic()
+            user_bucket = self.users.get(user)
+            session_bucket = self.sessions.get(session_id) if session_id else None
+            user_wait = user_bucket.wait_time(now)
+            if user_wait > 0:
+                raise AdmissionRejected("user_rate", user_wait)
+            session_wait = session_bucket.wait_time(now) if session_bucket else 0.0
+            if session_wait > 0:
+                raise AdmissionRejected("session_rate", session_wait)
+            user_bucket.consume()
+            if session_bucket:
+                session_bucket.consume()
+
+    def _acquire_slot(self):
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            self.waiting += 1
+        started = time.perf_counter()
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        metrics.observe("admission_wait_seconds", time.perf_counter() - started)
+        if not acquired:
+            raise AdmissionRejected("queue_timeout", self.retry_after)
+
+    @contextmanager
+    def admit(self, user: str, session_id: Optional[str]):
+        """在线程池中调用（已 reserve）：准入成功后占用一个执行槽位，退出时释放；失败抛 AdmissionRejected"""
+        try:
+            self._check_rate(user, session_id)
+            self._acquire_slot()
+        except AdmissionRejected as e:
+            raise self._rejected(e, user)
+        metrics.inc("admission_admitted_total")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {
+                "admission_reserved": self.reserved,
+                "admission_in_flight": self.in_flight,
+                "admission_queue_depth": self.waiting,
+                "admission_tracked_users": len(self.users),
+                "admission_tracked_sessions": len(self.sessions),
+            }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller(settings) -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(settings)
+        return _controller
+
+
+def _collect_admission_metrics() -> dict:
+    controller = _controller
+    return controller.collect() if controller else {}
+
+
+metrics.register_collector(_collect_admission_metrics)
@@ -0,0 +1,211 @@
+# archive.py
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from message_log import MessageRecord
+from metrics import metrics
+
+HUMAN_ASSISTANT = "human_assistant"
+CHANGE_CONFIRMED = "change_confirmed"
+IDLE = "idle"
+OPEN = "open"  # 关闭服务时仍在进行中的会话
+
+
+class ConversationStats:
+    """按会话累计各节点耗时与 token 用量，归档时随会话一起写出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict] = {}
+
+    def _entry(self, session: str) -> Dict:
+        entry = self._sessions.get(session)
+        if entry is None:
+            entry = self._sessions[session] = {
+                "nodes": {}, "tokens": {"prompt": 0, "cached": 0, "completion": 0}, "updated": 0.0
+            }
+        entry["updated"] = time.monotonic()
+        return entry
+
+    def record_node(self, session: Optional[str], node: str, seconds: float):
+        if session is None:
+            return
+        with self._lock:
+            timing = self._entry(session)["nodes"].setdefault(node, {"count": 0, "seconds": 0.0})
+            timing["count"] += 1
+            timing["seconds"] += seconds
+
+    def record_tokens(self, session: Optional[str], prompt: int, cached: int, completion: int):
+        if session is None:
+            return
+        with self._lock:
+            tokens = self._entry(session)["tokens"]
+            tokens["prompt"] += prompt
+            tokens["cached"] += cached
+            tokens["completion"] += completion
+
+    def get(self, session: str) -> Dict:
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None:
+                return {"nodes": {}, "tokens": {"prompt": 0, "cached": 0, "completion": 0}}
+            return {"nodes": {node: dict(timing) for node, timing in entry["nodes"].items()},
+                    "tokens": dict(entry["tokens"])}
+
+    def pop(self, session: str):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def prune(self, keep, max_age: float) -> int:
+        """丢弃不在 keep 中且超过 max_age 秒未更新的统计（首轮即失败、从未保存状态的会话）"""
+        cutoff = time.monotonic() - max_age
+        with self._lock:
+            stale = [s for s, e in self._sessions.items() if e["updated"] < cutoff and s not in keep]
+            for session in stale:
+                del self._sessions[session]
+        return len(stale)
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {"archive_tracked_sessions": len(self._sessions)}
+
+
+conversation_stats = ConversationStats()
+metrics.register_collector(conversation_stats.collect)
+
+
+def archive_record(session_id: str, entry: Dict, outcome: str, stats: Dict, checkpoints: int) -> Dict:
+    """会话的紧凑归档记录：结果、轮数、消息（省略空字段）、已收集信息、节点耗时与 token 合计"""
+    state = entry["state"]
+    messages = [MessageRecord.from_value(message).to_dict() for message in state.get("messages") or []]
+    return {
+        "session_id": session_id,
+        "outcome": outcome,
+        "last_activity": entry["timestamp"].isoformat(timespec="seconds"),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+        "turns": sum(1 for message in messages if message.get("sender") == "user"),
+        "messages": messages,
+        "collected_info": state.get("collected_info") or {},
+        "checkpoints": checkpoints,
+        "node_latency": {
+            node: {"count": timing["count"], "seconds": round(timing["seconds"], 4)}
+            for node, timing in stats["nodes"].items()
+        },
+        "tokens": stats["tokens"],
+    }
+
+
+class ConversationArchiver:
+    """后台归档：已结束（改签确认 / 转人工）或空闲超时的会话写入 gzip 压缩的 JSON 行批次文件，
+    随后释放其检查点、会话状态、会话内备忘与统计
+
+    每轮最多处理 batch_size 个会话，写成一个文件（文件名含进程 id，多 worker 互不覆盖）。
+    会话先经 session_store.claim 认领（有进行中的轮次或状态已更新则跳过），认领期间新的一轮等待；
+    写入失败时只结束认领、不释放，下一轮重试。释放的内存按检查点序列化大小与归档记录大小估算。
+    """
+
+    def __init__(self, settings, session_store, checkpointer, session_cache=None):
+        self.directory = settings.archive_dir
+        self.interval = settings.archive_interval_seconds
+        self.idle_seconds = settings.archive_idle_seconds
+        self.batch_size = settings.archive_batch_size
+        self.session_store = session_store
+        self.checkpointer = checkpointer
+        self.session_cache = session_cache
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _due(self, flush: bool) -> List[Tuple[str, Dict, str]]:
+        now = datetime.now()
+        due = []
+        for session_id, entry in self.session_store.entries():
+            outcome = entry.get("outcome")
+            if outcome is None:
+                if (now - entry["timestamp"]).total_seconds() >= self.idle_seconds:
+                    outcome = IDLE
+                elif flush:
+                    outcome = OPEN
+                else:
+                    continue
+            due.append((session_id, entry, outcome))
+            if len(due) >= self.batch_size:
+                break
+        return due
+
+    def _write(self, lines: List[bytes]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"conversations-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        with gzip.open(f"{path}.part", "wb") as f:
+            f.writelines(lines)
+        os.replace(f"{path}.part", path)
+        return path
+
+    def run_once(self, flush: bool = False) -> Dict:
+        """执行一轮归档；flush 时连同进行中的会话一起写出（关闭服务时使用）"""
+        started = time.perf_counter()
+        due = [item for item in self._due(flush) if self.session_store.claim(item[0], item[1])]
+        if not due:
+            conversation_stats.prune(dict(self.session_store.entries()), self.idle_seconds)
+            return {"archived": 0}
+        released = [session_id for session_id, _, _ in due]
+        archived = False
+        try:
+            stored = self.checkpointer.thread_sizes(released)
+            lines, reclaimed = [], 0
+            for session_id, entry, outcome in due:
+                checkpoints, stored_bytes = stored[session_id]
+                stats = conversation_stats.get(session_id)
+                line = json.dumps(archive_record(session_id, entry, outcome, stats, checkpoints),
+                                  ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+                lines.append(line)
+                reclaimed += stored_bytes + len(line)
+            try:
+                path = self._write(lines)
+            except OSError as e:
+                metrics.inc("archive_failures_total")
+                logger.error(f"Failed to write conversation archive ({len(lines)} conversations): {e}")
+                return {"archived": 0, "error": str(e)}
+            self.checkpointer.delete_threads(released)
+            for session_id, _, outcome in due:
+                conversation_stats.pop(session_id)
+                if self.session_cache is not None:
+                    self.session_cache.drop(session_id)
+                metrics.inc("conversations_archived_total", outcome=outcome)
+            archived = True
+        finally:
+            self.session_store.release(released, remove=archived)
+        elapsed = time.perf_counter() - started
+        metrics.inc("archive_reclaimed_bytes_total", reclaimed)
+        metrics.observe("archive_batch_seconds", elapsed)
+        metrics.set_gauge("archive_conversations_per_second", len(released) / elapsed if elapsed else 0.0)
+        logger.info(f"Archived {len(released)} conversations to {path} in {elapsed * 1000:.1f}ms "
+                    f"({len(released) / max(elapsed, 1e-9):.0f}/s, ~{reclaimed / 1024:.1f} KB reclaimed)")
+        return {"archived": len(released), "path": path, "seconds": elapsed, "reclaimed_bytes": reclaimed}
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                while self.run_once()["archived"] >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.opt(exception=e).error(f"Conversation archiver error: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="conversation-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，并把内存中剩余的会话全部写出"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        while self.run_once(flush=True)["archived"]:
+            pass
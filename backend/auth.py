@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from dependencies import get_settings
+
 # 配置密钥、算法和令牌有效期
 SECRET_KEY = "your_secret_key_here" # 生产环境中请替换为随机字符串
 ALGORITHM = "HS256"
@@ -69,4 +71,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     user = get_user(fake_users_db, username)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    """管理接口（/admin/...）：只允许 settings.admin_users 中的用户调用"""
+    if current_user["username"] not in get_settings().admin_users:
+        raise HTTPException(status_code=403, detail="admin privileges required")
+    return current_user
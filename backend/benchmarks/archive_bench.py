@@ -0,0 +1,116 @@
+"""会话归档基准：归档吞吐与释放的内存
+
+在 backend 目录下运行（使用假 LLM，不访问网络与数据库）：
+    python -m benchmarks.archive_bench [--conversations 200 1000] [--turns 12] [--batch-size 500]
+先用与线上相同的工作流与检查点（SharedLogMemorySaver）执行 --conversations 个各 --turns 轮的对话，
+再把全部会话视为空闲交给 ConversationArchiver 归档。输出每秒归档的会话数、归档文件大小，
+以及释放的内存：tracemalloc 实测的 Python 堆减少量与归档器按序列化大小给出的估算值。
+tracemalloc 会明显拖慢分配与释放，吞吐在不开启 tracemalloc 的另一次运行中测量。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.types import Command
+from loguru import logger
+
+from archive import ConversationArchiver
+from checkpointer import SharedLogMemorySaver
+from dependencies import get_settings
+from main import SessionStore, create_workflow, initial_state
+from schemas import MessageState
+
+# 每个循环的 LLM 调用顺序：意图（搜索）→ 信息收集 → 链接生成 → 意图（闲聊）
+CYCLE_RESPONSES = [
+    json.dumps({"intent_info": "search_flight", "missing_info": [], "content": "Where would you like to fly?"}),
+    json.dumps({"collected_info": {"departure_airport": "MUC", "arrival_airport": "PVG", "departure_date": "250909",
+                                   "return_date": "251010", "adult_passengers": 1},
+                "missing_info": [], "response": "Got it."}),
+    json.dumps({"content": "Here is your search.", "flight_url": "https://example.com/flights", "sender": "system"}),
+    json.dumps({"intent_info": "other", "missing_info": [], "content": "Anything else?"}),
+]
+CYCLE_INPUTS = ["search a flight", "MUC to PVG on 9 Sep, back 10 Oct, 1 adult", "thanks"]
+
+
+def populate(workflow, store: SessionStore, conversations: int, turns: int):
+    for index in range(conversations):
+        session_id = f"bench-{index}"
+        config = {"configurable": {"thread_id": session_id}}
+        for turn in range(turns):
+            message = CYCLE_INPUTS[turn % len(CYCLE_INPUTS)]
+            if turn == 0:
+                result = workflow.invoke(initial_state(message).dict(), config)
+            else:
+                result = workflow.invoke(Command(resume=message), config)
+        store.save(session_id, MessageState(**result))
+
+
+def archive_all(conversations: int, turns: int, batch_size: int, trace: bool) -> dict:
+    directory = tempfile.mkdtemp(prefix="archive-bench-")
+    settings = get_settings().model_copy(update={
+        "archive_dir": directory, "archive_idle_seconds": 0, "archive_batch_size": batch_size,
+    })
+    checkpointer = SharedLogMemorySaver()
+    workflow = create_workflow(FakeListChatModel(responses=CYCLE_RESPONSES), checkpointer=checkpointer,
+                               render_graph=False)
+    store = SessionStore()
+    try:
+        if trace:
+            tracemalloc.start()
+        populate(workflow, store, conversations, turns)
+        before = tracemalloc.get_traced_memory()[0]
+        archiver = ConversationArchiver(settings, store, checkpointer)
+        started = time.perf_counter()
+        estimated = 0
+        while (result := archiver.run_once())["archived"]:
+            estimated += result["reclaimed_bytes"]
+        elapsed = time.perf_counter() - started
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert not store.sessions and not checkpointer.storage
+        archive_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "rate": conversations / elapsed,
+        "ms": elapsed * 1000,
+        "archive_kb": archive_bytes / 1024,
+        "freed_kb": (before - after) / 1024,
+        "estimated_kb": estimated / 1024,
+    }
+
+
+def bench(conversations: int, turns: int, batch_size: int) -> dict:
+    timed = archive_all(conversations, turns, batch_size, trace=False)
+    traced = archive_all(conversations, turns, batch_size, trace=True)
+    return {**traced, "rate": timed["rate"], "ms": timed["ms"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, nargs="*", default=[200, 1000])
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logger.remove()
+    print(f"{'convs':>6} {'turns':>5} {'conv/s':>8} {'total ms':>9} {'archive KB':>10} "
+          f"{'freed KB':>9} {'estimated KB':>12} {'KB/conv':>8}")
+    for conversations in args.conversations:
+        result = bench(conversations, args.turns, args.batch_size)
+        print(f"{conversations:>6} {args.turns:>5} {result['rate']:>8.0f} {result['ms']:>9.1f} "
+              f"{result['archive_kb']:>10.1f} {result['freed_kb']:>9.1f} {result['estimated_kb']:>12.1f} "
+              f"{result['freed_kb'] / conversations:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
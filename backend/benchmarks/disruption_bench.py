@@ -0,0 +1,57 @@
+"""航班中断批量改签吞吐基准
+
+在 backend 目录下运行（需要可访问的 PostgreSQL，DB_* 环境变量同服务）：
+    python -m benchmarks.disruption_bench [--tickets 5000] [--max-alternatives 3]
+向 tickets 写入一批同航班的合成机票（BENCH 前缀），执行 build_rebooking_proposals，
+输出每秒处理的机票数，结束后删除合成数据。
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_pool
+from dependencies import get_settings
+from disruption import build_rebooking_proposals
+
+BENCH_AIRLINE = "BENCH1"
+BENCH_DATE = "12092025"
+
+SEED_SQL = """
+INSERT INTO tickets
+SELECT 'BENCH' || lpad(n::text, 8, '0'), 'Bench Passenger ' || n, '01011990', %(airline)s,
+       'MUC', 'PVG', %(date)s, '13:30:00', '13092025', '06:50:00',
+       'PVG', 'MUC', to_char(to_date('10102025', 'DDMMYYYY') + (n %% 7), 'DDMMYYYY'),
+       '12:45:00', '13102025', '18:20:00', 1100 + (n %% 200)
+FROM generate_series(1, %(count)s) AS n
+"""
+
+CLEANUP_SQL = "DELETE FROM tickets WHERE ticket_number LIKE 'BENCH%%'"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--max-alternatives", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pool = get_db_pool(get_settings())
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(CLEANUP_SQL)
+        cursor.execute(SEED_SQL, {"airline": BENCH_AIRLINE, "date": BENCH_DATE, "count": args.tickets})
+        cursor.execute("ANALYZE tickets")
+    try:
+        for run in range(args.repeat):
+            result = build_rebooking_proposals(BENCH_AIRLINE, BENCH_DATE, args.max_alternatives)
+            print(f"run {run + 1}: {result.affected_tickets} tickets, {result.proposals} proposals, "
+                  f"{result.seconds:.3f}s, {result.tickets_per_second:,.0f} tickets/s")
+    finally:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(CLEANUP_SQL)  # rebooking_proposals 通过 ON DELETE CASCADE 一并删除
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""日志开销基准
+
+在 backend 目录下运行：python -m benchmarks.logging_bench [--turns 200] [--level DEBUG]
+用假 LLM 跑同一段多轮对话，对比不输出日志、同步写文件、后台队列写文件（enqueue=True）
+三种配置下的每轮延迟，衡量日志在请求热路径上的开销。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.types import Command
+from loguru import logger
+
+import logging_config
+from main import create_workflow, initial_state
+
+OTHER_REPLY = json.dumps({"intent_info": "other", "content": "I can help with flight tickets.", "sender": "system"})
+
+
+def configure(mode: str, level: str, directory: str):
+    logger.remove()
+    logger.configure(patcher=logging_config._add_context)
+    if mode == "none":
+        return
+    logger.add(
+        os.path.join(directory, f"{mode}.jsonl"),
+        level=level,
+        serialize=True,
+        enqueue=(mode == "enqueue"),
+    )
+
+
+def run_conversation(turns: int) -> list:
+    llm = FakeListChatModel(responses=[OTHER_REPLY])
+    workflow = create_workflow(llm, render_graph=False)
+    config = {"configurable": {"thread_id": "bench"}}
+    latencies = []
+    started = time.perf_counter()
+    workflow.invoke(initial_state("hello").dict(), config)
+    latencies.append(time.perf_counter() - started)
+    for turn in range(1, turns):
+        started = time.perf_counter()
+        workflow.invoke(Command(resume=f"question {turn}"), config)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--level", default="DEBUG")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("none", "sync", "enqueue"):
+            configure(mode, args.level, directory)
+            latencies = sorted(run_conversation(args.turns))
+            results[mode] = {
+                "p50_ms": statistics.median(latencies) * 1000,
+                "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+                "mean_ms": statistics.fmean(latencies) * 1000,
+            }
+            logger.remove()  # enqueue 模式下等待队列写完再删除临时目录
+
+    baseline = results["none"]["mean_ms"]
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'overhead':>9}")
+    for mode, row in results.items():
+        overhead = row["mean_ms"] - baseline
+        print(f"{mode:<8} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['mean_ms']:>8.2f} {overhead:>+8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""长对话基准：路由字段（phase / last_intent）与扫描消息历史的对比
+
+在 backend 目录下运行（使用假 LLM，不访问网络与数据库）：
+    python -m benchmarks.long_conversation_bench [--turns 600] [--histories 10 100 1000 10000]
+1. 按 “搜索航班 → 补充信息 → 生成链接 → 闲聊” 循环执行 --turns 轮对话，
+   输出开头与末尾各 50 轮的延迟（P50 / P95），观察每轮开销是否随历史增长。
+2. 在不同长度的历史上对比路由判断：原实现每轮从末尾扫描消息找最近的系统回复与用户输入，
+   现实现直接读取状态中的路由字段。历史末尾放一段连续的用户消息，模拟扫描需要回溯的情况。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.types import Command
+
+from checkpointer import SharedLogMemorySaver
+from main import create_workflow, initial_state
+from message_log import MessageLog
+from schemas import MessageState
+
+# 每个循环的 LLM 调用顺序：意图（搜索）→ 信息收集 → 链接生成 → 意图（闲聊）
+CYCLE_RESPONSES = [
+    json.dumps({"intent_info": "search_flight", "missing_info": [], "content": "Where would you like to fly?"}),
+    json.dumps({"collected_info": {"departure_airport": "MUC", "arrival_airport": "PVG", "departure_date": "250909",
+                                   "return_date": "251010", "adult_passengers": 1},
+                "missing_info": [], "response": "Got it."}),
+    json.dumps({"content": "Here is your search.", "flight_url": "https://example.com/flights", "sender": "system"}),
+    json.dumps({"intent_info": "other", "missing_info": [], "content": "Anything else?"}),
+]
+CYCLE_INPUTS = ["search a flight", "MUC to PVG on 9 Sep, back 10 Oct, 1 adult", "thanks"]
+
+
+def run_conversation(turns: int) -> list:
+    workflow = create_workflow(FakeListChatModel(responses=CYCLE_RESPONSES), checkpointer=SharedLogMemorySaver(),
+                               render_graph=False)
+    config = {"configurable": {"thread_id": "long"}}
+    latencies = []
+    for turn in range(turns):
+        message = CYCLE_INPUTS[turn % len(CYCLE_INPUTS)]
+        started = time.perf_counter()
+        if turn == 0:
+            workflow.invoke(initial_state(message).dict(), config)
+        else:
+            workflow.invoke(Command(resume=message), config)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def legacy_route(state: MessageState):
+    """原 after_user_input_logic 的取值方式：两次从末尾扫描消息历史"""
+    last_sys_message = next(
+        (message for message in reversed(state.messages) if message.get("sender") in {"system", "assistant"}), None
+    )
+    last_user_message = next(
+        (message for message in reversed(state.messages) if message.get("sender") in {"user"}), None
+    )
+    return last_sys_message.get("intent_info", ""), last_user_message.get("content", "")
+
+
+def field_route(state: MessageState):
+    return state.phase, state.last_user_message
+
+
+def bench_routing(history: int, trailing_user: int, repeat: int) -> dict:
+    messages = []
+    for i in range(history - trailing_user):
+        sender = "user" if i % 2 else "system"
+        messages.append({"content": f"message {i}", "sender": sender, "intent_info": "other"})
+    messages += [{"content": f"follow-up {i}", "sender": "user", "intent_info": "other"} for i in range(trailing_user)]
+    state = MessageState(messages=MessageLog(messages))
+    assert legacy_route(state) == field_route(state)
+    result = {}
+    for name, route in (("scan_us", legacy_route), ("fields_us", field_route)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            route(state)
+        result[name] = (time.perf_counter() - started) / repeat * 1e6
+    return result
+
+
+def _percentiles(samples: list) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    return f"p50={statistics.median(ordered) * 1000:.2f}ms p95={p95 * 1000:.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=600)
+    parser.add_argument("--histories", type=int, nargs="*", default=[10, 100, 1000, 10000])
+    parser.add_argument("--trailing-user", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    latencies = run_conversation(args.turns)
+    window = min(50, len(latencies))
+    print(f"{args.turns} turns: first {window} {_percentiles(latencies[:window])}  "
+          f"last {window} {_percentiles(latencies[-window:])}  total={sum(latencies):.2f}s")
+    print(f"{'history':>8} {'scan us':>9} {'fields us':>10}")
+    for history in args.histories:
+        result = bench_routing(history, min(args.trailing_user, history - 1), args.repeat)
+        print(f"{history:>8} {result['scan_us']:>9.2f} {result['fields_us']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""100 轮对话的消息日志基准
+
+在 backend 目录下运行：python -m benchmarks.message_log_bench [--turns 100]
+对比 SharedLogMemorySaver（日志按引用保存）与原生 MemorySaver（每步整段序列化）
+每轮延迟与检查点内存，并对比 MessageLog 追加与 list 复制的单次开销。
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
+
+from checkpointer import SharedLogMemorySaver
+from main import create_workflow, initial_state
+from message_log import MessageLog
+
+OTHER_REPLY = json.dumps({"intent_info": "other", "content": "I can help with flight tickets.", "sender": "system"})
+
+
+def checkpoint_bytes(saver) -> int:
+    total = 0
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+    for writes in saver.writes.values():
+        for write in writes.values():
+            total += len(write[2][1])
+    return total
+
+
+def run_conversation(saver, turns: int) -> dict:
+    llm = FakeListChatModel(responses=[OTHER_REPLY])
+    workflow = create_workflow(llm, checkpointer=saver, render_graph=False)
+    config = {"configurable": {"thread_id": "bench"}}
+    tracemalloc.start()
+    latencies = []
+    started = time.perf_counter()
+    workflow.invoke(initial_state("hello").dict(), config)
+    latencies.append(time.perf_counter() - started)
+    for turn in range(1, turns):
+        started = time.perf_counter()
+        workflow.invoke(Command(resume=f"question {turn}"), config)
+        latencies.append(time.perf_counter() - started)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "turn_1_ms": latencies[0] * 1000,
+        "turn_mid_ms": latencies[len(latencies) // 2] * 1000,
+        "turn_last_ms": latencies[-1] * 1000,
+        "total_s": sum(latencies),
+        "checkpoint_kb": checkpoint_bytes(saver) / 1024,
+        "traced_mb": current / 1024 / 1024,
+    }
+
+
+def bench_append(history: int, repeat: int = 200) -> dict:
+    messages = [{"content": f"message {i}", "sender": "user" if i % 2 else "system", "intent_info": "other"}
+                for i in range(history)]
+    new_message = {"content": "reply", "sender": "system", "intent_info": "other"}
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        copy.deepcopy(messages) + [new_message]
+    legacy = (time.perf_counter() - started) / repeat
+
+    log = MessageLog(messages)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        log.concat([new_message])
+    shared = (time.perf_counter() - started) / repeat
+    return {"deepcopy_append_us": legacy * 1e6, "log_concat_us": shared * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=100)
+    args = parser.parse_args()
+
+    for name, saver in (("MemorySaver", MemorySaver()), ("SharedLogMemorySaver", SharedLogMemorySaver())):
+        result = run_conversation(saver, args.turns)
+        print(f"{name:22s} " + "  ".join(f"{k}={v:.2f}" for k, v in result.items()))
+    for history in (10, 100, 1000):
+        result = bench_append(history)
+        print(f"history={history:<5d} " + "  ".join(f"{k}={v:.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/prefork_server.py
+"""预加载 + fork 多进程服务，仅供 benchmarks/serving_bench.py 测量 worker 数量与吞吐、内存的关系
+
+在 backend 目录下运行（Linux / macOS）：
+    python -m benchmarks.prefork_server [--workers 2] [--host 127.0.0.1] [--port 18000] [--memory-report-interval 60]
+
+主进程先加载只读资源：导入 LangChain / LangGraph / NumPy 等依赖，构建编译后的工作流、
+全部节点对象与提示词模板、结构化输出链与 JSON Schema，并渲染一遍提示词；随后 gc.freeze()
+并 fork 出 worker，这些对象以写时复制方式在 worker 间共享。
+每个 worker 自己的资源在 fork 之后创建：LLM 模型及其 HTTP 连接池与调度器（ProcessLocalChatModel
+首次调用时创建）、数据库连接池、日志后台队列（均在 worker 的启动预热中建立）。
+会话状态（SessionStore 与 LangGraph 检查点）、指标、幂等缓存与限流状态都保存在各 worker 进程内，
+而共享的监听套接字把同一会话的后续轮次交给任意 worker，多轮对话会丢失上下文；
+因此这不是生产服务入口（生产环境仍按 start.py / dockerfile 以单个 uvicorn 进程运行）。
+worker 异常退出时主进程按原序号重新 fork；收到 SIGTERM / SIGINT 时通知全部 worker 退出并等待。
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict
+
+from loguru import logger
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from dependencies import get_node_llms, get_settings, process_local_llm
+from warmup import warm_prompts
+
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """进程内存（KB）：rss 常驻、pss 按共享进程数分摊、uss 独占（私有页）"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                values[name] = int(rest.split()[0])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def preload():
+    """fork 前加载共享的只读资源；不建立任何连接、不启动线程"""
+    import main
+    settings = get_settings()
+    started = time.perf_counter()
+    main.init_app_state(process_local_llm(), get_node_llms(process_local_llm), render_graph=False)
+    owners = [*main.app.state.workflow.node_objects.values(), main.app.state.response_chain]
+    logger.info(f"Preloaded workflow in {time.perf_counter() - started:.2f}s: {warm_prompts({'prompt_owners': owners}, settings)}")
+    if threading.active_count() > 1:
+        logger.warning(f"{threading.active_count() - 1} extra threads alive before fork; they will not exist in workers")
+    # 预加载对象移出 GC 跟踪，避免 worker 中的垃圾回收改写引用计数所在页、破坏写时复制
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+def run_worker(app, sock: socket.socket, index: int):
+    import uvicorn
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    config = uvicorn.Config(app, log_config=None, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--memory-report-interval", type=float, default=0,
+                        help="每隔多少秒记录一次各 worker 的 RSS / PSS / USS（0 关闭）")
+    parser.add_argument("--restart-delay", type=float, default=1.0, help="worker 异常退出后的重启间隔（秒）")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    app = preload()
+    workers: Dict[int, int] = {}  # pid -> 序号
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, index)
+            finally:
+                os._exit(0)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        spawn(index)
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers (master pid {os.getpid()})")
+
+    next_report = time.monotonic() + args.memory_report_interval
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            index = workers.pop(pid)
+            if not stopping:
+                logger.error(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(args.restart_delay)
+                spawn(index)
+            continue
+        if args.memory_report_interval and time.monotonic() >= next_report:
+            next_report += args.memory_report_interval
+            for worker_pid, index in sorted(workers.items(), key=lambda item: item[1]):
+                try:
+                    logger.info(f"Worker {index} (pid {worker_pid}) memory KB: {process_memory(worker_pid)}")
+                except OSError:
+                    pass
+        time.sleep(0.2)
+    sock.close()
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
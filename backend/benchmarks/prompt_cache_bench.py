@@ -0,0 +1,182 @@
+"""提示词前缀缓存基准
+
+在 backend 目录下运行（使用服务相同的 LLM 配置：OPENAI_API_KEY / LLM_URL / LLM_MODEL 等）：
+    python -m benchmarks.prompt_cache_bench [--sessions 8] [--nodes verification_node ...]
+    python -m benchmarks.prompt_cache_bench --dry-run   # 不调用 LLM，只比较跨会话的公共前缀长度
+对每个节点用不同会话的数据各发送 --sessions 次请求，对比两种布局：
+  before  会话数据在前、静态指令在后（原提示词的排布方式）
+  after   静态指令在前（system 消息）、会话数据在后（prompt_layout.layered_prompt）
+输出每个节点的平均/P90 延迟、输入 token 中缓存命中的比例，以及按 --*-price（美元 / 百万 token）估算的单次成本。
+注意：OpenAI 只缓存 1024 token 以上的前缀，更短的提示词两种布局都不会命中。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+
+from dependencies import get_llm, get_settings, resolve_node_profile
+from langgraph_nodes.alternative_ticket_node import AlternativeTicketNode
+from langgraph_nodes.collect_info_node import InfoCollectionNode
+from langgraph_nodes.confirmation_node import ConfirmationNode
+from langgraph_nodes.intent_detection_node import IntentDetectionNode
+from langgraph_nodes.search_node import SearchNode
+from langgraph_nodes.verification_node import VerificationNode
+from llm import cached_prompt_tokens
+
+NAMES = ["Anna Schmidt", "Li Wei", "John Smith", "Maria Garcia", "Kenji Sato", "Olga Ivanova", "Ali Khan", "Emma Brown"]
+AIRPORTS = [("FRA", "PEK"), ("MUC", "PVG"), ("JFK", "LHR"), ("CDG", "HND"), ("AMS", "SIN")]
+
+
+def _ticket(i: int) -> dict:
+    departure, arrival = AIRPORTS[i % len(AIRPORTS)]
+    return {
+        "ticket_number": f"LH{1000000000 + i * 7919}",
+        "passenger_name": NAMES[i % len(NAMES)],
+        "passenger_birthday": f"{(i % 28) + 1:02d}0{(i % 9) + 1}1990",
+        "departure_airport": departure,
+        "arrival_airport": arrival,
+        "departure_date": f"{(i % 28) + 1:02d}092025",
+        "price_usd": 450 + i * 13,
+    }
+
+
+def _chat(i: int, text: str) -> list:
+    return [
+        {"content": f"Hi, I am {NAMES[i % len(NAMES)]}", "sender": "user"},
+        {"content": "How can I help you?", "sender": "system"},
+        {"content": text, "sender": "user"},
+    ]
+
+
+def build_cases(node_llm):
+    """节点名 -> (提示词, 第 i 个会话的输入)"""
+    alternative = AlternativeTicketNode(node_llm("alternative_ticket_node"), node_llm("alternative_interpretation"))
+    return {
+        "intent_detection_node": (
+            IntentDetectionNode(node_llm("intent_detection_node")).chain.prompt,
+            lambda i: {"messages": _chat(i, f"I want to change my flight to {AIRPORTS[i % len(AIRPORTS)][1]}")},
+        ),
+        "info_collection_node": (
+            InfoCollectionNode(node_llm("info_collection_node")).prompt,
+            lambda i: {
+                "collected_info": {"ticket_number": _ticket(i)["ticket_number"]},
+                "missing_info": ["passenger_birthday", "passenger_name"],
+                "input": _chat(i, f"My name is {NAMES[i % len(NAMES)]}, born {i % 28 + 1}.3.1990")[-2:],
+            },
+        ),
+        "verification_node": (
+            VerificationNode(node_llm("verification_node")).prompt,
+            lambda i: {
+                "field_str": "\n".join(f"{k}: {v}" for k, v in _ticket(i).items()),
+                "user_message": f"My ticket is {_ticket(i)['ticket_number']}",
+            },
+        ),
+        "alternative_ticket_node": (
+            alternative.sql_prompt,
+            lambda i: {"collected_info": _ticket(i), "messages": _chat(i, f"Can I leave {i % 3 + 1} days later?"),
+                       "feedback": ""},
+        ),
+        "alternative_interpretation": (
+            alternative.interpretation_prompt,
+            lambda i: {"result_count": 1, "columns": ", ".join(_ticket(i)),
+                       "ranked_alternatives": json.dumps([{"score": 0.8, "why": {"price": "$13.00 more expensive"},
+                                                           "ticket": _ticket(i + 1)}]),
+                       "collected_info": _ticket(i)},
+        ),
+        "confirmation_node": (
+            ConfirmationNode(node_llm("confirmation_node")).confirmation_prompt,
+            lambda i: {"message_history": _chat(i, "Confirm Change" if i % 2 else "Re-search")},
+        ),
+        "search_node": (
+            SearchNode(node_llm("search_node")).url_prompt,
+            lambda i: {**{k: _ticket(i)[k] for k in ("departure_airport", "arrival_airport")},
+                       "departure_date": f"25{(i % 12) + 1:02d}10", "return_date": "None", "adult_passengers": i % 4 + 1},
+        ),
+    }
+
+
+def render(prompt, inputs: dict, layout: str) -> list:
+    messages = prompt.format_messages(**inputs)
+    if layout == "after":
+        return messages
+    # before：会话数据在前，静态指令拼在其后，同一条 user 消息
+    system, user = messages
+    return [HumanMessage(content=f"{user.content}\n\n{system.content}")]
+
+
+def run_layout(llm, prompt, make_inputs, layout: str, sessions: int) -> dict:
+    latencies, prompt_tokens, cached_tokens, output_tokens = [], 0, 0, 0
+    for i in range(sessions):
+        started = time.perf_counter()
+        response = llm.invoke(render(prompt, make_inputs(i), layout))
+        latencies.append(time.perf_counter() - started)
+        usage = response.response_metadata.get("token_usage") or {}
+        prompt_tokens += int(usage.get("prompt_tokens") or 0)
+        cached_tokens += cached_prompt_tokens(usage)
+        output_tokens += int(usage.get("completion_tokens") or 0)
+    return {
+        "mean": statistics.mean(latencies),
+        "p90": sorted(latencies)[int(0.9 * (len(latencies) - 1))],
+        "prompt": prompt_tokens / sessions,
+        "cached": cached_tokens / sessions,
+        "output": output_tokens / sessions,
+    }
+
+
+def cost(stats: dict, args) -> float:
+    uncached = stats["prompt"] - stats["cached"]
+    return (uncached * args.input_price + stats["cached"] * args.cached_price + stats["output"] * args.output_price) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--nodes", nargs="*", default=None)
+    parser.add_argument("--input-price", type=float, default=0.15)
+    parser.add_argument("--cached-price", type=float, default=0.075)
+    parser.add_argument("--output-price", type=float, default=0.60)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    llms = {}
+
+    def node_llm(node_id):
+        if node_id not in llms:
+            llms[node_id] = get_llm(resolve_node_profile(node_id, settings))
+        return llms[node_id]
+
+    cases = build_cases(node_llm)
+    selected = args.nodes or list(cases)
+
+    if args.dry_run:
+        print(f"{'node':<28} {'prompt chars':>12} {'shared before':>14} {'shared after':>13}")
+        for node_id in selected:
+            prompt, make_inputs = cases[node_id]
+            row = {}
+            for layout in ("before", "after"):
+                texts = ["\n".join(m.content for m in render(prompt, make_inputs(i), layout)) for i in range(args.sessions)]
+                row[layout] = len(os.path.commonprefix(texts))
+            total = statistics.mean(len(text) for text in texts)
+            print(f"{node_id:<28} {total:>12,.0f} {row['before']:>14,} {row['after']:>13,}")
+        return
+
+    print(f"{'node':<28} {'layout':<7} {'mean s':>7} {'p90 s':>7} {'prompt':>7} {'cached':>7} {'hit %':>6} {'$/call':>10}")
+    for node_id in selected:
+        prompt, make_inputs = cases[node_id]
+        for layout in ("before", "after"):
+            stats = run_layout(node_llm(node_id), prompt, make_inputs, layout, args.sessions)
+            hit = 100 * stats["cached"] / stats["prompt"] if stats["prompt"] else 0.0
+            print(f"{node_id:<28} {layout:<7} {stats['mean']:>7.2f} {stats['p90']:>7.2f} {stats['prompt']:>7.0f} "
+                  f"{stats['cached']:>7.0f} {hit:>6.1f} {cost(stats, args):>10.6f}")
+
+
+if __name__ == "__main__":
+    main()
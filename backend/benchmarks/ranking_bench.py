@@ -0,0 +1,108 @@
+"""备选航班多准则排序基准
+
+在 backend 目录下运行（不访问数据库与 LLM）：
+    python -m benchmarks.ranking_bench [--rows 1000 10000 50000] [--top-k 3] [--repeat 5]
+随机生成 alternative_tickets 结构的候选行（与查询返回一致：日期为 DDMMYYYY 文本、时刻为 time、
+价格为 Decimal），对比 ranking.rank_alternatives（按列向量化）与逐行计算相同准则再排序的耗时。
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ALTERNATIVE_COLUMNS
+from ranking import DATE_SCALE_DAYS, DEFAULT_WEIGHTS, rank_alternatives
+
+ORIGINAL = {
+    "airline_code": "LH720", "departure_airport": "FRA", "arrival_airport": "PEK",
+    "departure_date": "10092025", "departure_time": datetime.time(10, 0),
+    "return_departure_airport": "PEK", "return_arrival_airport": "FRA", "return_date": "10102025",
+    "price_usd": Decimal("650.00"),
+}
+AIRLINES = ["LH", "CA", "AF", "KL", "BA"]
+
+
+def make_rows(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        day = rng.randint(1, 28)
+        row = dict.fromkeys(ALTERNATIVE_COLUMNS)
+        row.update({
+            "airline_code": f"{rng.choice(AIRLINES)}{rng.randint(100, 999)}",
+            "departure_airport": "FRA", "arrival_airport": "PEK",
+            "departure_date": f"{day:02d}092025", "departure_time": datetime.time(rng.randint(0, 23), rng.choice((0, 30))),
+            "arrival_date": f"{day:02d}092025", "arrival_time": datetime.time(rng.randint(0, 23), 0),
+            "return_departure_airport": "PEK", "return_arrival_airport": rng.choice(("FRA", "MUC")),
+            "return_date": f"{rng.randint(1, 28):02d}102025",
+            "price_usd": Decimal(rng.randint(300, 1200)),
+        })
+        rows.append(tuple(row[col] for col in ALTERNATIVE_COLUMNS))
+    return rows
+
+
+def _day(text: str) -> int:
+    return datetime.datetime.strptime(text, "%d%m%Y").toordinal()
+
+
+def rank_rowwise(rows: list, original: dict, top_k: int) -> list:
+    """逐行计算同样的惩罚（作为对照）"""
+    price0 = float(original["price_usd"])
+    minute0 = original["departure_time"].hour * 60 + original["departure_time"].minute
+    day0, return0 = _day(original["departure_date"]), _day(original["return_date"])
+    weights = sum(DEFAULT_WEIGHTS.values())
+    index = {col: i for i, col in enumerate(ALTERNATIVE_COLUMNS)}
+    scored = []
+    for row in rows:
+        price = (min(1.0, max(-1.0, (float(row[index["price_usd"]]) - price0) / price0)) + 1) / 2
+        time_ = row[index["departure_time"]]
+        shift = abs(time_.hour * 60 + time_.minute - minute0)
+        date = abs(_day(row[index["departure_date"]]) - day0)
+        back = abs(_day(row[index["return_date"]]) - return0)
+        airport = 0.5 * (row[index["return_arrival_airport"]] != original["return_arrival_airport"])
+        cost = (DEFAULT_WEIGHTS["price"] * price
+                + DEFAULT_WEIGHTS["departure_time"] * min(shift, 1440 - shift) / 720
+                + DEFAULT_WEIGHTS["date"] * date / (date + DATE_SCALE_DAYS)
+                + DEFAULT_WEIGHTS["airline"] * (row[index["airline_code"]][:2] != original["airline_code"][:2])
+                + DEFAULT_WEIGHTS["return_leg"] * (back / (back + DATE_SCALE_DAYS) + airport) / 2) / weights
+        scored.append((cost, row))
+    scored.sort(key=lambda item: item[0])
+    return scored[:top_k]
+
+
+def timed(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[1000, 10000, 50000])
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'vectorized ms':>14} {'row-wise ms':>12} {'same top-k':>11}")
+    for count in args.rows:
+        rows = make_rows(count)
+        vectorized = timed(lambda: rank_alternatives(ALTERNATIVE_COLUMNS, rows, ORIGINAL, top_k=args.top_k), args.repeat)
+        rowwise = timed(lambda: rank_rowwise(rows, ORIGINAL, args.top_k), args.repeat)
+        ranked = rank_alternatives(ALTERNATIVE_COLUMNS, rows, ORIGINAL, top_k=args.top_k)
+        expected = rank_rowwise(rows, ORIGINAL, args.top_k)
+        same = all(abs((1 - r.score) - cost) < 1e-9 for r, (cost, _) in zip(ranked, expected))
+        print(f"{count:>7} {vectorized * 1000:>14.1f} {rowwise * 1000:>12.1f} {str(same):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""离线回放录制的对话，检测自身代码的 CPU / 内存 / 每轮延迟回归
+
+录制：LLM_CASSETTE_MODE=record 运行服务，cassette 写入 LLM_CASSETTE_DIR（默认 logs/cassettes）
+回放（backend 目录下）：
+    python -m benchmarks.replay_cassettes --dir logs/cassettes --output replay.json
+    python -m benchmarks.replay_cassettes --dir logs/cassettes --baseline replay.json --threshold 0.1
+--latency-scale 0 时不模拟 LLM 延迟，只测量本仓库代码本身的开销。
+cassette 只记录 LLM 调用，票务验证与备选航班查询仍访问 DB_* 配置的数据库：回放前需要启动
+并导入与录制时相同数据的 PostgreSQL（database/ 下的建表与数据脚本），否则直接退出。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langgraph.types import Command
+
+from db import get_db_pool
+from dependencies import get_settings
+from llm import REPLAY, CassetteChatModel, CassetteStore
+from main import create_workflow, initial_state
+
+SEEDED_TABLES = ("tickets", "alternative_tickets", "rebooking_proposals")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def require_seeded_database(settings):
+    """回放依赖真实数据库中的票务数据：连不上或表为空时给出明确提示后退出"""
+    try:
+        with get_db_pool(settings).connection(statement_timeout=5, read_only=True) as conn:
+            with conn.cursor() as cursor:
+                empty = []
+                for table in SEEDED_TABLES:
+                    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+                    if not cursor.fetchone()[0]:
+                        empty.append(table)
+    except Exception as e:
+        sys.exit(f"Cassette replay queries the live database, which is unavailable "
+                 f"({settings.db_host}:{settings.db_port}/{settings.db_name}): {e}\n"
+                 f"Start PostgreSQL seeded with the data used while recording.")
+    if empty:
+        sys.exit(f"Cassette replay queries the live database, but these tables are empty: {', '.join(empty)}\n"
+                 f"Seed them with the data used while recording.")
+
+
+def replay_session(workflow, store: CassetteStore, session_id: str):
+    config = {"configurable": {"thread_id": session_id}}
+    latencies, cpu_times, errors = [], [], 0
+    started_conversation = False
+    for entry in store.load(session_id):
+        if entry.get("type") != "turn":
+            continue
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            if entry.get("resumed") and started_conversation:
+                workflow.invoke(None, config)
+            elif not started_conversation:
+                workflow.invoke(initial_state(entry["message"]).dict(), config)
+                started_conversation = True
+            else:
+                workflow.invoke(Command(resume=entry["message"]), config)
+        except Exception as e:
+            # 对话到达 END 或 cassette 不再匹配时停止该会话
+            if not (isinstance(e, KeyError) and e.args and e.args[0] == "__end__"):
+                errors += 1
+            break
+        finally:
+            latencies.append(time.perf_counter() - wall)
+            cpu_times.append(time.process_time() - cpu)
+    return latencies, cpu_times, errors
+
+
+def run(directory: str, latency_scale: float) -> dict:
+    require_seeded_database(get_settings())
+    store = CassetteStore(directory)
+    llm = CassetteChatModel(store=store, mode=REPLAY, latency_scale=latency_scale)
+    workflow = create_workflow(llm, render_graph=False)
+    latencies, cpu_times, errors = [], [], 0
+    sessions = store.sessions()
+    tracemalloc.start()
+    started = time.perf_counter()
+    for session_id in sessions:
+        session_latencies, session_cpu, session_errors = replay_session(workflow, store, session_id)
+        latencies += session_latencies
+        cpu_times += session_cpu
+        errors += session_errors
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "sessions": len(sessions),
+        "turns": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "turn_p50_ms": percentile(latencies, 50) * 1000,
+        "turn_p95_ms": percentile(latencies, 95) * 1000,
+        "cpu_per_turn_ms": statistics.mean(cpu_times) * 1000 if cpu_times else 0.0,
+        "peak_memory_mb": peak / 1024 / 1024,
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for key in ("turn_p50_ms", "turn_p95_ms", "cpu_per_turn_ms", "peak_memory_mb"):
+        before, after = baseline.get(key), result.get(key)
+        if before and after > before * (1 + threshold):
+            regressions.append(f"{key}: {before:.2f} -> {after:.2f} (+{(after / before - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="logs/cassettes")
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    result = run(args.dir, args.latency_scale)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""多进程服务基准：worker 数量与吞吐、内存的关系
+
+在 backend 目录下运行（Linux，需要 /proc）：
+    python -m benchmarks.serving_bench [--workers 1 2 4] [--turns 1 4] [--clients 32] [--seconds 10] [--llm-delay 0.05]
+对每个 worker 数量启动 benchmarks/prefork_server.py，LLM 指向本脚本内置的
+OpenAI 兼容桩服务（固定延迟，只用于隔离服务端自身的开销），用 --clients 个并发客户端持续发送 /chat 请求。
+--turns 为每个会话的轮数：1 时每个请求都是新会话；大于 1 时客户端沿用 session_id 连续发送多轮，
+每轮使用新连接（与经负载均衡转发时一样，后续轮次不保证回到同一 worker），桩服务在回复中给出
+提示词里看到的本会话轮数，与客户端已发送的轮数不符即计为丢失上下文（lost）。
+会话状态按 worker 保存，多个 worker 下后续轮次落到其他 worker 时就会丢失上下文。
+输出吞吐（请求 / 秒）、P50 / P95 延迟、丢失上下文的轮数，以及每个 worker 的 RSS / PSS / USS
+（PSS 按共享页分摊，USS 为独占内存；fork 前预加载的对象以写时复制共享，体现为 PSS、USS 明显低于 RSS）。
+数据库不可用时 /chat 仍可执行（首轮只经过意图识别），预热只要求 prompts 步骤成功。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from auth import create_access_token
+from benchmarks.prefork_server import process_memory
+
+TURN_MARKER = re.compile(r"conversation (\d+) turn (\d+)")
+SEEN_REPLY = re.compile(r"seen (\d+) turns")
+
+
+def stub_reply(prompt: str) -> str:
+    """回复中给出提示词里最近一个会话出现过的轮数，供客户端核对上下文是否完整"""
+    markers = TURN_MARKER.findall(prompt)
+    seen = len({turn for conversation, turn in markers if conversation == markers[-1][0]}) if markers else 0
+    return json.dumps({"intent_info": "other", "missing_info": [],
+                       "content": f"I can help with flight tickets (seen {seen} turns).", "sender": "system"})
+
+
+def serve_llm_stub(port: int, delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._send({"object": "list", "data": [{"id": "bench-model", "object": "model"}]})
+
+        def do_POST(self):
+            prompt = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8", "replace")
+            time.sleep(delay)
+            self._send({
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": "bench-model",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": stub_reply(prompt)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+            })
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def start_llm_stub(port: int, delay: float) -> multiprocessing.Process:
+    """桩服务放在独立进程中，避免与压测客户端争用 GIL"""
+    process = multiprocessing.Process(target=serve_llm_stub, args=(port, delay), daemon=True)
+    process.start()
+    return process
+
+
+def worker_pids(master: int) -> list:
+    with open(f"/proc/{master}/task/{master}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_ready(base_url: str, workers: int, master: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # 每个 worker 独立预热：多探测几次，尽量覆盖所有 worker
+            if len(worker_pids(master)) == workers and all(
+                httpx.get(f"{base_url}/readyz", timeout=2).status_code == 200 for _ in range(workers * 4)
+            ):
+                return
+        except (httpx.HTTPError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server with {workers} workers not ready after {timeout}s")
+
+
+def drive(base_url: str, clients: int, seconds: float, turns: int) -> dict:
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    stop_at = time.monotonic() + seconds
+    latencies, errors, lost = [], [0], [0]
+    lock = threading.Lock()
+
+    def client(index: int):
+        conversation = 0
+        with httpx.Client(base_url=base_url, headers=headers, timeout=30) as http:
+            while time.monotonic() < stop_at:
+                conversation += 1
+                session_id = None
+                for turn in range(turns):
+                    body = {"message": f"What can you do? (conversation {index * 1000000 + conversation} turn {turn})"}
+                    if session_id:
+                        body["session_id"] = session_id
+                    started = time.perf_counter()
+                    response = http.post("/chat", json=body, headers={"Connection": "close"} if turns > 1 else None)
+                    elapsed = time.perf_counter() - started
+                    if response.status_code != 200:
+                        with lock:
+                            errors[0] += 1
+                        break
+                    session_id = response.json()["session_id"]
+                    seen = SEEN_REPLY.search(response.json()["response"])
+                    with lock:
+                        latencies.append(elapsed)
+                        if turns > 1 and (seen is None or int(seen.group(1)) != turn + 1):
+                            lost[0] += 1
+
+    with ThreadPoolExecutor(clients) as pool:
+        for index in range(clients):
+            pool.submit(client, index)
+    ordered = sorted(latencies) or [0.0]
+    return {
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(ordered),
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "errors": errors[0],
+        "lost": lost[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--turns", type=int, nargs="*", default=[1, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--llm-delay", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--llm-port", type=int, default=18001)
+    args = parser.parse_args()
+
+    stub = start_llm_stub(args.llm_port, args.llm_delay)
+    env = {
+        **os.environ,
+        "LLM_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "LLM_MODEL": "bench-model",
+        "WARMUP_REQUIRED": '["prompts"]',
+        "RATE_LIMIT_USER_PER_MINUTE": "1000000",
+        "RATE_LIMIT_USER_BURST": "1000000",
+        "LOG_CONSOLE": "false",
+    }
+    print(f"{'workers':>7} {'turns':>5} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'errors':>6} {'lost':>6} "
+          f"{'RSS MB':>7} {'PSS MB':>7} {'USS MB':>7} {'total PSS MB':>12}")
+    try:
+        for workers in args.workers:
+            command = [sys.executable, "-m", "benchmarks.prefork_server", "--workers", str(workers),
+                       "--host", "127.0.0.1", "--port", str(args.port)]
+            master = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base_url = f"http://127.0.0.1:{args.port}"
+                wait_ready(base_url, workers, master.pid)
+                for turns in args.turns:
+                    result = drive(base_url, args.clients, args.seconds, turns)
+                    memory = [process_memory(pid) for pid in worker_pids(master.pid)]
+                    mean = {key: statistics.mean(m[key] for m in memory) / 1024 for key in ("rss", "pss", "uss")}
+                    total_pss = (sum(m["pss"] for m in memory) + process_memory(master.pid)["pss"]) / 1024
+                    print(f"{workers:>7} {turns:>5} {result['rps']:>8.1f} {result['p50'] * 1000:>7.1f} "
+                          f"{result['p95'] * 1000:>7.1f} {result['errors']:>6} {result['lost']:>6} {mean['rss']:>7.1f} "
+                          f"{mean['pss']:>7.1f} {mean['uss']:>7.1f} {total_pss:>12.1f}")
+            finally:
+                master.terminate()
+                master.wait(timeout=30)
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""核验查询微基准
+
+在 backend 目录下运行（需要可访问的 PostgreSQL，DB_* 环境变量同服务）：
+    python -m benchmarks.verification_bench [--lookups 2000]
+对比三种方式每秒可完成的核验查询数：
+  connect   每次新建连接 + 发送完整 SQL 文本（VerificationNode 原实现）
+  pooled    连接池 + 发送完整 SQL 文本
+  prepared  连接池 + 预编译语句（queries.execute）
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+
+from db import get_db_pool, queries
+from dependencies import get_settings
+
+LEGACY_QUERY = """
+SELECT ticket_number, passenger_name, passenger_birthday, airline_code,
+       departure_airport, arrival_airport, departure_date, departure_time,
+       arrival_date, arrival_time, return_departure_airport, return_arrival_airport,
+       return_date, return_departure_time, return_arrival_date, return_arrival_time,
+       price_usd
+FROM tickets
+WHERE ticket_number = %s AND passenger_birthday = %s AND passenger_name = %s;
+"""
+
+
+def sample_keys(pool, count: int):
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT ticket_number, passenger_birthday, passenger_name FROM tickets")
+        rows = cursor.fetchall()
+    return [rows[i % len(rows)] for i in range(count)]
+
+
+def bench_connect(settings, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        connection = psycopg2.connect(
+            host=settings.db_host, database=settings.db_name, user=settings.db_user,
+            password=settings.db_password, port=settings.db_port,
+        )
+        cursor = connection.cursor()
+        cursor.execute(LEGACY_QUERY, key)
+        cursor.fetchone()
+        cursor.close()
+        connection.close()
+    return len(keys) / (time.perf_counter() - started)
+
+
+def bench_pooled(pool, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(LEGACY_QUERY, key)
+            cursor.fetchone()
+    return len(keys) / (time.perf_counter() - started)
+
+
+def bench_prepared(pool, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            queries.execute(cursor, "verify_ticket", key)
+            cursor.fetchone()
+    return len(keys) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    pool = get_db_pool(settings)
+    keys = sample_keys(pool, args.lookups)
+    # 预热：建立池中连接并完成 PREPARE
+    bench_pooled(pool, keys[:50])
+    bench_prepared(pool, keys[:50])
+
+    connect_rate = bench_connect(settings, keys[:max(1, args.lookups // 10)])
+    pooled_rate = bench_pooled(pool, keys)
+    prepared_rate = bench_prepared(pool, keys)
+    print(f"{'mode':<10} {'lookups/s':>10} {'speedup':>8}")
+    for mode, rate in (("connect", connect_rate), ("pooled", pooled_rate), ("prepared", prepared_rate)):
+        print(f"{mode:<10} {rate:>10,.0f} {rate / connect_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# checkpointer.py
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+
+from message_log import MessageLog
+
+
+class SharedLogMemorySaver(MemorySaver):
+    """MemorySaver 变体：MessageLog 通道不再每步整段序列化
+
+    检查点只保存对不可变 MessageLog 的引用，相邻检查点共享历史前缀，
+    每个 super-step 新增的内存只有本步追加的消息（增量），其余通道照常序列化。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (thread_id, checkpoint_ns) -> checkpoint_id -> {channel: MessageLog}
+        self.logs: Dict[Tuple[str, str], Dict[str, Dict[str, MessageLog]]] = defaultdict(dict)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        values = checkpoint["channel_values"]
+        shared = {k: v for k, v in values.items() if isinstance(v, MessageLog)}
+        if shared:
+            checkpoint = {
+                **checkpoint,
+                "channel_values": {k: v for k, v in values.items() if k not in shared},
+            }
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        key = (config["configurable"]["thread_id"], config["configurable"]["checkpoint_ns"])
+        self.logs[key][checkpoint["id"]] = shared
+        return next_config
+
+    def _attach(self, checkpoint_tuple: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        if checkpoint_tuple is None:
+            return None
+        configurable = checkpoint_tuple.config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        shared = self.logs.get(key, {}).get(checkpoint_tuple.checkpoint["id"])
+        if shared:
+            checkpoint_tuple.checkpoint["channel_values"].update(shared)
+        return checkpoint_tuple
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._attach(super().get_tuple(config))
+
+    def list(self, config: Optional[RunnableConfig], **kwargs) -> Iterator[CheckpointTuple]:
+        for checkpoint_tuple in super().list(config, **kwargs):
+            yield self._attach(checkpoint_tuple)
+
+    def thread_sizes(self, thread_ids: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        """各会话的检查点数与序列化后的字节数（检查点、元数据与待写入项；共享的 MessageLog 不计）"""
+        sizes = {}
+        for thread_id in thread_ids:
+            checkpoints, size = 0, 0
+            for saved in list(self.storage.get(thread_id, {}).values()):
+                for checkpoint, metadata, _ in list(saved.values()):
+                    checkpoints += 1
+                    size += len(checkpoint[1]) + len(metadata[1])
+            sizes[thread_id] = (checkpoints, size)
+        for key in list(self.writes):
+            if key[0] in sizes:
+                checkpoints, size = sizes[key[0]]
+                writes = list(self.writes.get(key, {}).values())
+                sizes[key[0]] = (checkpoints, size + sum(len(value[1]) for _, _, value, _ in writes))
+        return sizes
+
+    def delete_threads(self, thread_ids: Iterable[str]) -> None:
+        """释放若干会话的全部检查点与共享日志（写入项与日志只各遍历一次）"""
+        thread_ids = set(thread_ids)
+        for thread_id in thread_ids:
+            self.storage.pop(thread_id, None)
+        # 其他会话的图执行可能同时写入，先复制键再遍历
+        for key in [k for k in list(self.writes) if k[0] in thread_ids]:
+            self.writes.pop(key, None)
+        for key in [k for k in list(self.logs) if k[0] in thread_ids]:
+            self.logs.pop(key, None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """释放某个会话的全部检查点与共享日志"""
+        self.delete_threads([thread_id])
@@ -1,9 +1,197 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
+class ModelProfile(BaseModel):
+    """单个节点使用的模型配置，未设置的字段沿用默认模型"""
+    model: Optional[str] = None
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+
+# 分类/抽取类节点走小模型，面向用户的长文本走大模型
+SMALL_MODEL_NODES = {
+    "intent_detection_node",
+    "confirmation_node",
+    "info_collection_node",
+    "alternative_ticket_node",
+}
+
+# 按各节点输出结构实际需要的长度限制 max_tokens
+NODE_MAX_TOKENS = {
+    "intent_detection_node": 512,       # intent_info + missing_info + 简短追问
+    "confirmation_node": 256,           # 回复要求少于 50 词
+    "info_collection_node": 1024,       # collected_info + missing_info + response
+    "search_node": 512,                 # content + flight_url
+    "verification_node": 1024,          # 确认文本 + 17 个字段的详情
+    "alternative_ticket_node": 512,     # 单条 SELECT 语句
+    "alternative_interpretation": 1536, # 备选机票对比说明
+}
+
+# LLM 调度优先级：越接近完成改签的节点级别越高，饱和时优先出队
+PRIORITY_CLASS_LEVELS = {
+    "closing": 2,   # 确认改签 / 生成与解读备选机票
+    "progress": 1,  # 信息收集、查询与核验
+    "entry": 0,     # 新对话的意图识别
+}
+DEFAULT_PRIORITY_CLASS = "progress"
+NODE_PRIORITY_CLASSES = {
+    "confirmation_node": "closing",
+    "alternative_ticket_node": "closing",
+    "alternative_interpretation": "closing",
+    "verification_node": "progress",
+    "search_node": "progress",
+    "info_collection_node": "progress",
+    "intent_detection_node": "entry",
+}
+
 class Settings(BaseSettings):
     openai_api_key: str
     model_name: str = "deepseek-chat"
-    
+
+    # LLM HTTP 连接池
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 30.0
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+    llm_write_timeout: float = 10.0
+    llm_pool_timeout: float = 5.0
+
+    # 重试（指数退避 + 抖动，仅针对 429/5xx 与连接错误）
+    llm_max_retries: int = 2
+    llm_backoff_base: float = 0.5
+    llm_backoff_max: float = 8.0
+
+    # 熔断器
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_reset_timeout: float = 30.0
+
+    # 对冲请求：主模型超过延迟分位数未返回时，向备用端点/模型发出重复请求
+    llm_hedge_enabled: bool = False
+    llm_hedge_url: Optional[str] = None
+    llm_hedge_model: Optional[str] = None
+    llm_hedge_api_key: Optional[str] = None
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_delay: float = 2.0
+    llm_hedge_max_ratio: float = 0.1
+    llm_hedge_window: int = 200
+
+    # LLM 录制/回放："record" 把每次调用写入 cassette，"replay" 离线按 cassette 回放
+    llm_cassette_mode: Optional[str] = None
+    llm_cassette_dir: str = "logs/cassettes"
+    llm_replay_latency_scale: float = 1.0
+
+    # 按节点路由模型：SMALL_MODEL_NODES 默认使用小模型（如已配置），
+    # NODE_MODELS 可按节点覆盖，例如 {"intent_detection_node": {"model": "gpt-4o-mini", "max_tokens": 256}}
+    llm_small_model: Optional[str] = None
+    llm_small_url: Optional[str] = None
+    node_models: Dict[str, ModelProfile] = {}
+
+    # LLM 全局并发上限（按服务商限额设置，0 表示不限制）；等待每满 aging 秒提升一级优先级防止饿死
+    llm_max_concurrency: int = 16
+    llm_priority_aging_seconds: float = 5.0
+    node_priority_classes: Dict[str, str] = {}
+
+    # /chat 准入控制：按用户 / 会话令牌桶限流 + 全局并发上限与有界等待队列
+    rate_limit_user_per_minute: float = 30
+    rate_limit_user_burst: float = 10
+    rate_limit_session_per_minute: float = 12
+    rate_limit_session_burst: float = 5
+    rate_limit_max_keys: int = 10000
+    chat_max_in_flight: int = 16
+    chat_max_queue: int = 32
+    chat_queue_timeout: float = 2
+    chat_retry_after: float = 1
+    # 同步端点线程池（anyio 默认 40）在启动时至少扩到 chat_max_in_flight + chat_max_queue
+    # + chat_threadpool_headroom，保证排队的对话请求都有线程，并给 /readyz、/metrics 等留出余量
+    chat_threadpool_headroom: int = 8
+
+    # /chat 幂等键：结果缓存时长、条目上限、重复请求等待首个请求的最长时间
+    idempotency_ttl_seconds: float = 600
+    idempotency_max_entries: int = 10000
+    idempotency_wait_timeout: float = 90
+
+    # /ws/chat：空闲时每隔 heartbeat 秒发送 ping，超过 idle_timeout 无客户端消息则关闭连接
+    ws_heartbeat_interval: float = 20
+    ws_idle_timeout: float = 300
+
+    # PostgreSQL（与 DB_HOST 等环境变量对应）与共享连接池
+    db_host: str = "localhost"
+    db_name: str = "flight_ticket_db"
+    db_user: str = "postgres"
+    db_password: str = ""
+    db_port: int = 5432
+    db_pool_min: int = 1
+    db_pool_max: int = 10
+    db_connect_timeout: int = 5
+
+    # /tickets/verify:batch
+    verify_batch_max_items: int = 10000
+    verify_batch_statement_timeout: float = 30
+    verify_batch_fetch_size: int = 500
+
+    # 管理接口（/admin/...）允许调用的用户
+    admin_users: List[str] = ["admin"]
+
+    # 航班中断批量改签：备选航班与原航班的最大日期差（天），任务的语句超时
+    disruption_window_days: int = 7
+    disruption_statement_timeout: float = 120
+
+    # AlternativeTicketNode 执行 LLM 生成的 SQL：只读事务、语句超时、EXPLAIN 代价上限与默认行数上限
+    # （行数上限即候选集大小，由 ranking 在本地排序，可以较大）
+    generated_sql_statement_timeout: float = 5
+    generated_sql_max_cost: float = 100000
+    generated_sql_row_limit: int = 5000
+    generated_sql_max_attempts: int = 2
+    # 查询结果经 ranking 多准则排序后交给 LLM 解读的条数
+    alternative_rank_top_k: int = 3
+
+    # 结构化输出：json_schema（按 Pydantic 模型约束，需服务端支持）| json_object | none（只靠提示词）
+    llm_response_format: str = "json_object"
+    structured_output_max_reasks: int = 1
+
+    # 启动预热：按顺序执行的步骤，以及 /readyz 判定就绪前必须成功的步骤
+    warmup_steps: List[str] = ["db_pool", "llm", "prompts"]
+    warmup_required: List[str] = ["db_pool", "prompts"]
+    # 失败的预热步骤在后台按指数退避重试：首次间隔与最长间隔（秒）
+    warmup_retry_base: float = 1.0
+    warmup_retry_max: float = 60.0
+
+    # 请求剖析：profile_admin_users 可通过 X-Profile 头或 ?profile=1 剖析单次 /chat；
+    # profile_sample_rate 为持续抽样剖析的比例（0 关闭），结果写入 profile_dir
+    profile_admin_users: List[str] = ["admin"]
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5
+    profile_dir: str = "logs/profiles"
+
+    # 会话归档：已结束（改签确认 / 转人工）或空闲超过 archive_idle_seconds 的会话由后台线程
+    # 每隔 archive_interval_seconds 写入 archive_dir 下的 gzip JSON 行批次文件并释放内存；间隔为 0 关闭
+    archive_dir: str = "logs/archive"
+    archive_interval_seconds: float = 30
+    archive_idle_seconds: float = 3600
+    archive_batch_size: int = 500
+
+    # 会话内结果备忘：已核验的机票与备选航班查询（collected_info 变化即失效）；0 关闭
+    session_cache_ttl_seconds: float = 1800
+    session_cache_max_sessions: int = 5000
+
+    # 日志：后台队列写入 logs/ 下的 JSON 行文件，大体积内容按比例采样
+    log_dir: str = "logs"
+    log_level: str = "INFO"
+    log_console: bool = True
+    log_rotation: str = "50 MB"
+    log_retention: str = "14 days"
+    log_payload_sample_rate: float = 0.1
+    log_payload_max_chars: int = 2000
+
+    # 请求端到端时间预算（秒），可按端点覆盖，例如 {"/chat": 45}
+    request_deadline_seconds: float = 60.0
+    endpoint_deadlines: Dict[str, float] = {}
+    # 剩余预算低于该值时跳过可选的 LLM 步骤，改用模板回复
+    optional_llm_min_budget: float = 8.0
+
     class Config:
         env_file = ".env"
-        extra = "ignore"
\ No newline at end of file
+        extra = "ignore"
@@ -0,0 +1,152 @@
+# db.py
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+from loguru import logger
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.pool import ThreadedConnectionPool
+
+from request_context import current_deadline
+
+# tickets / alternative_tickets 共用的机票字段（与 VerificationNode 查询的列一致）
+TICKET_COLUMNS = (
+    "ticket_number", "passenger_name", "passenger_birthday", "airline_code",
+    "departure_airport", "arrival_airport", "departure_date", "departure_time",
+    "arrival_date", "arrival_time", "return_departure_airport", "return_arrival_airport",
+    "return_date", "return_departure_time", "return_arrival_date", "return_arrival_time",
+    "price_usd",
+)
+# alternative_tickets / rebooking_proposals 中的航班字段（不含旅客信息）
+ALTERNATIVE_COLUMNS = TICKET_COLUMNS[3:]
+
+
+class PooledConnection(PGConnection):
+    """记录本连接上已 PREPARE 的语句名（预编译语句随连接存在，事务回滚不影响）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PreparedQuery:
+    def __init__(self, name: str, sql: str, param_types: Sequence[str]):
+        self.name = name
+        self.sql = sql
+        self.param_types = tuple(param_types)
+        self.prepare_sql = f"PREPARE {name} ({', '.join(self.param_types)}) AS {sql}"
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(self.param_types))})"
+
+
+class QueryRegistry:
+    """固定语句注册表：每个连接首次使用时 PREPARE 一次，之后按名称 EXECUTE，省去每次的解析与规划
+
+    psycopg2 只支持文本协议，结果仍以文本格式返回。
+    """
+
+    def __init__(self):
+        self.queries: Dict[str, PreparedQuery] = {}
+
+    def register(self, name: str, sql: str, param_types: Sequence[str]) -> PreparedQuery:
+        query = self.queries[name] = PreparedQuery(name, sql, param_types)
+        return query
+
+    def execute(self, cursor, name: str, params: Sequence = ()):
+        query = self.queries[name]
+        prepared = cursor.connection.prepared
+        if name not in prepared:
+            cursor.execute(query.prepare_sql)
+            prepared.add(name)
+        cursor.execute(query.execute_sql, params)
+
+
+queries = QueryRegistry()
+
+queries.register(
+    "verify_ticket",
+    f"""SELECT {", ".join(TICKET_COLUMNS)}
+    FROM tickets
+    WHERE ticket_number = $1 AND passenger_birthday = $2 AND passenger_name = $3""",
+    ("text", "text", "text"),
+)
+
+queries.register(
+    "proposals_for_ticket",
+    f"""SELECT {", ".join(ALTERNATIVE_COLUMNS)}
+    FROM rebooking_proposals
+    WHERE ticket_number = $1
+    ORDER BY rank""",
+    ("text",),
+)
+
+
+class DatabasePool:
+    """进程级共享的 PostgreSQL 连接池"""
+
+    def __init__(self, settings):
+        self.pool = ThreadedConnectionPool(
+            settings.db_pool_min,
+            settings.db_pool_max,
+            host=settings.db_host,
+            database=settings.db_name,
+            user=settings.db_user,
+            password=settings.db_password,
+            port=settings.db_port,
+            connect_timeout=settings.db_connect_timeout,
+            connection_factory=PooledConnection,
+        )
+
+    @contextmanager
+    def connection(self, statement_timeout: Optional[float] = None, read_only: bool = False) -> Iterator:
+        """借出一个连接，退出时提交（异常时回滚）并归还
+
+        statement_timeout 以 SET LOCAL 设置，只在本次事务内有效；
+        未指定时按当前请求剩余预算设置。read_only 时本次事务为只读事务。
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("database")
+            remaining = deadline.remaining()
+            statement_timeout = min(statement_timeout, remaining) if statement_timeout else remaining
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cursor:
+                if read_only:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                if statement_timeout:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (max(1, int(statement_timeout * 1000)),))
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def close(self):
+        self.pool.closeall()
+
+
+_pool: Optional[DatabasePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool(settings) -> DatabasePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DatabasePool(settings)
+            logger.info("数据库连接池初始化成功")
+        return _pool
+
+
+def close_db_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
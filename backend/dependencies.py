@@ -1,20 +1,27 @@
 # dependencies.py
 import logging
 import os
+from functools import lru_cache, partial
 from dotenv import load_dotenv
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, AsyncGenerator, Callable, Dict, Optional
 from fastapi import Depends, HTTPException
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel
 from openai import AsyncOpenAI
-from config import Settings
+from config import NODE_MAX_TOKENS, SMALL_MODEL_NODES, ModelProfile, Settings
+from llm import (
+    CassetteChatModel, HedgedChatModel, ProcessLocalChatModel, ScheduledChatModel, UsageTrackingChatOpenAI,
+    get_cassette_store, get_hedge_policy, get_http_pool, get_llm_scheduler
+)
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 # 配置加载 ========================================================
+@lru_cache
 def get_settings() -> Settings:
     """加载应用配置（带错误处理）"""
     try:
         load_dotenv()
+        return Settings()
     except Exception as e:
         logger.critical("配置加载失败: %s", str(e))
         raise HTTPException(
@@ -23,40 +30,122 @@ def get_settings() -> Settings:
         ) from e
 
 # LLM 核心依赖 ====================================================
-def get_llm() -> ChatOpenAI:
+def _build_chat_model(api_key: str, base_url: str, model: str,
+                      temperature: float = 0.1, max_tokens: int = 4096) -> BaseChatModel:
+    # 共享连接池：重试与熔断在传输层完成，SDK 自身不再重试；usage（含缓存命中 token）计入指标
+    settings = get_settings()
+    pool = get_http_pool(settings)
+    llm = UsageTrackingChatOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=pool.timeout,
+        max_retries=0,
+        stream_usage=True,
+        http_client=pool.client,
+        http_async_client=pool.async_client
+    )
+    if settings.llm_max_concurrency > 0:
+        # 每个真正访问网络的模型都经过全局优先级调度（对冲的备用请求同样受限）
+        llm = ScheduledChatModel(inner=llm, scheduler=get_llm_scheduler(settings))
+    return llm
+
+def get_llm(profile: Optional[ModelProfile] = None) -> BaseChatModel:
     if not os.getenv("OPENAI_API_KEY"):
         logger.error("OPENAI_API_KEY未配置")
         raise HTTPException(
             status_code=500,
             detail="服务未正确配置"
         )
-    
-    return ChatOpenAI(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("LLM_URL"),
-        model=os.getenv("LLM_MODEL"),
-        temperature=0.1,
-        max_tokens=4096
+
+    settings = get_settings()
+    profile = profile or ModelProfile()
+    temperature = profile.temperature if profile.temperature is not None else 0.1
+    max_tokens = profile.max_tokens or 4096
+    primary = _build_chat_model(
+        profile.api_key or os.getenv("OPENAI_API_KEY"),
+        profile.base_url or os.getenv("LLM_URL"),
+        profile.model or os.getenv("LLM_MODEL"),
+        temperature,
+        max_tokens
     )
+    llm = primary
+    if settings.llm_hedge_enabled:
+        # 对冲：备用端点/模型未单独配置时沿用主模型的配置
+        secondary = _build_chat_model(
+            settings.llm_hedge_api_key or os.getenv("OPENAI_API_KEY"),
+            settings.llm_hedge_url or os.getenv("LLM_URL"),
+            settings.llm_hedge_model or os.getenv("LLM_MODEL"),
+            temperature,
+            max_tokens
+        )
+        llm = HedgedChatModel(primary=primary, secondary=secondary, policy=get_hedge_policy(settings),
+                              model_name=profile.model or os.getenv("LLM_MODEL") or "")
+    if settings.llm_cassette_mode:
+        llm = CassetteChatModel(
+            inner=llm,
+            store=get_cassette_store(settings),
+            mode=settings.llm_cassette_mode,
+            latency_scale=settings.llm_replay_latency_scale
+        )
+    return llm
+
+def resolve_node_profile(node_id: str, settings: Settings) -> ModelProfile:
+    """默认值 ← 小模型层级 ← NODE_MAX_TOKENS ← NODE_MODELS 中的节点覆盖"""
+    profile = ModelProfile(max_tokens=NODE_MAX_TOKENS.get(node_id))
+    if node_id in SMALL_MODEL_NODES and settings.llm_small_model:
+        profile.model = settings.llm_small_model
+        profile.base_url = settings.llm_small_url
+    if override := settings.node_models.get(node_id):
+        profile = profile.model_copy(update=override.model_dump(exclude_none=True))
+    return profile
+
+def get_node_llms(build: Callable[[ModelProfile], BaseChatModel] = get_llm) -> Dict[str, BaseChatModel]:
+    """为每个节点构建模型，配置相同的节点共享同一实例"""
+    settings = get_settings()
+    llms: Dict[str, BaseChatModel] = {}
+    by_profile: Dict[str, BaseChatModel] = {}
+    for node_id in NODE_MAX_TOKENS:
+        profile = resolve_node_profile(node_id, settings)
+        key = profile.model_dump_json()
+        if key not in by_profile:
+            by_profile[key] = build(profile)
+        llms[node_id] = by_profile[key]
+    return llms
+
+def process_local_llm(profile: Optional[ModelProfile] = None) -> BaseChatModel:
+    """多进程服务：fork 前只创建占位模型，各 worker 首次调用时才建立自己的连接池与调度器"""
+    return ProcessLocalChatModel(factory=partial(get_llm, profile))
+
+_async_client: AsyncOpenAI | None = None
 
 async def get_async_client() -> AsyncGenerator[AsyncOpenAI, None]:
-    """获取异步OpenAI客户端（资源安全）"""
+    """获取进程级共享的异步OpenAI客户端（连接由连接池管理，不在每次请求后关闭）"""
+    global _async_client
     try:
-        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("LLM_URL"))
-        logger.debug("OpenAI异步客户端初始化成功")
-        yield client
+        if _async_client is None:
+            pool = get_http_pool(get_settings())
+            _async_client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("LLM_URL"),
+                timeout=pool.timeout,
+                max_retries=0,
+                http_client=pool.async_client
+            )
+            logger.debug("OpenAI异步客户端初始化成功")
     except Exception as e:
         logger.error("客户端初始化失败: %s", str(e))
         raise HTTPException(
             status_code=500,
             detail="AI服务暂时不可用"
         ) from e
-    finally:
-        await client.close()  # 确保关闭连接
+    yield _async_client
 
 # 类型别名（提高可读性）=============================================
 SettingsDep = Annotated[Settings, Depends(get_settings)]
-LLMDep = Annotated[ChatOpenAI, Depends(get_llm)]
+LLMDep = Annotated[BaseChatModel, Depends(get_llm)]
 AsyncClientDep = Annotated[AsyncOpenAI, Depends(get_async_client)]
 
 # 数据库示例（按需扩展）=============================================
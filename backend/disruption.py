@@ -0,0 +1,129 @@
+# disruption.py
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import psycopg2
+from fastapi import APIRouter, Depends, HTTPException
+from loguru import logger
+
+from auth import require_admin
+from db import ALTERNATIVE_COLUMNS, get_db_pool, queries
+from dependencies import get_settings
+from metrics import metrics
+from schemas import DisruptionRequest, DisruptionResult
+
+router = APIRouter()
+
+AFFECTED_COUNT_SQL = """
+SELECT count(*) FROM tickets
+WHERE airline_code = %(airline_code)s AND departure_date = %(departure_date)s
+"""
+
+CLEAR_PROPOSALS_SQL = """
+DELETE FROM rebooking_proposals p
+USING tickets t
+WHERE p.ticket_number = t.ticket_number
+  AND t.airline_code = %(airline_code)s AND t.departure_date = %(departure_date)s
+"""
+
+# 一条语句完成匹配与写入：对每张受影响机票 LATERAL 取同航线的备选航班，
+# 按 去程日期差 → 返程日期差 → 差价 → 起飞时间 排序，取前 N 个写入 rebooking_proposals
+BUILD_PROPOSALS_SQL = f"""
+INSERT INTO rebooking_proposals (
+    ticket_number, rank, disrupted_airline_code, disrupted_date,
+    {", ".join(ALTERNATIVE_COLUMNS)}, price_difference_usd
+)
+SELECT t.ticket_number, alt.rank, t.airline_code, t.departure_date,
+       {", ".join(f"alt.{col}" for col in ALTERNATIVE_COLUMNS)}, alt.price_usd - t.price_usd
+FROM tickets t
+CROSS JOIN LATERAL (
+    SELECT a.*, row_number() OVER (ORDER BY ranking.outbound_gap, ranking.return_gap,
+                                            abs(a.price_usd - t.price_usd), a.departure_time) AS rank
+    FROM alternative_tickets a
+    CROSS JOIN LATERAL (
+        SELECT abs(to_date(a.departure_date, 'DDMMYYYY') - to_date(t.departure_date, 'DDMMYYYY')) AS outbound_gap,
+               coalesce(abs(to_date(a.return_date, 'DDMMYYYY') - to_date(t.return_date, 'DDMMYYYY')), 0) AS return_gap
+    ) ranking
+    WHERE a.departure_airport = t.departure_airport
+      AND a.arrival_airport = t.arrival_airport
+      AND a.airline_code <> t.airline_code
+      AND (t.return_date IS NULL) = (a.return_date IS NULL)
+      AND ranking.outbound_gap <= %(window_days)s
+    ORDER BY rank
+    LIMIT %(max_alternatives)s
+) alt
+WHERE t.airline_code = %(airline_code)s AND t.departure_date = %(departure_date)s
+RETURNING ticket_number
+"""
+
+
+def build_rebooking_proposals(airline_code: str, departure_date: str, max_alternatives: int = 3,
+                              window_days: Optional[int] = None) -> DisruptionResult:
+    """为受影响航班上的所有机票重新计算改签方案（同一事务内先清除旧方案）"""
+    settings = get_settings()
+    params = {
+        "airline_code": airline_code,
+        "departure_date": departure_date,
+        "max_alternatives": max_alternatives,
+        "window_days": window_days if window_days is not None else settings.disruption_window_days,
+    }
+    started = time.perf_counter()
+    with get_db_pool(settings).connection(statement_timeout=settings.disruption_statement_timeout) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(AFFECTED_COUNT_SQL, params)
+            affected = cursor.fetchone()[0]
+            cursor.execute(CLEAR_PROPOSALS_SQL, params)
+            cursor.execute(BUILD_PROPOSALS_SQL, params)
+            proposed_tickets = {row[0] for row in cursor.fetchall()}
+            proposals = cursor.rowcount
+    elapsed = time.perf_counter() - started
+    result = DisruptionResult(
+        airline_code=airline_code,
+        departure_date=departure_date,
+        affected_tickets=affected,
+        tickets_with_proposals=len(proposed_tickets),
+        proposals=proposals,
+        seconds=round(elapsed, 4),
+        tickets_per_second=round(affected / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+    metrics.inc("disruption_tickets_total", affected)
+    metrics.observe("disruption_job_seconds", elapsed)
+    logger.info(f"Disruption {airline_code} {departure_date}: {result.model_dump()}")
+    return result
+
+
+def load_proposals(ticket_number: str) -> List[Dict]:
+    """读取预先计算的改签方案（按排名），供会话直接展示"""
+    with get_db_pool(get_settings()).connection() as conn:
+        with conn.cursor() as cursor:
+            queries.execute(cursor, "proposals_for_ticket", (ticket_number,))
+            return [dict(zip(ALTERNATIVE_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+@router.post("/admin/disruptions", response_model=DisruptionResult)
+def create_disruption(
+    request: DisruptionRequest,
+    current_user: dict = Depends(require_admin)
+):
+    """航班取消/延误：批量生成受影响旅客的改签方案（仅管理员）"""
+    logger.info(f"Disruption job for {request.airline_code} {request.departure_date} by {current_user['username']}")
+    try:
+        return build_rebooking_proposals(
+            request.airline_code, request.departure_date, request.max_alternatives, request.window_days
+        )
+    except psycopg2.Error as e:
+        logger.opt(exception=e).error("Disruption job failed")
+        raise HTTPException(503, detail=f"Database error: {e}")
+
+
+if __name__ == "__main__":
+    # 管理任务：python disruption.py LH726 13092025 [--max-alternatives 3]
+    parser = argparse.ArgumentParser(description="Pre-compute rebooking proposals for a disrupted flight")
+    parser.add_argument("airline_code")
+    parser.add_argument("departure_date", help="DDMMYYYY")
+    parser.add_argument("--max-alternatives", type=int, default=3)
+    parser.add_argument("--window-days", type=int, default=None)
+    args = parser.parse_args()
+    print(build_rebooking_proposals(args.airline_code, args.departure_date,
+                                    args.max_alternatives, args.window_days).model_dump_json(indent=2))
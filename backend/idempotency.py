@@ -0,0 +1,121 @@
+# idempotency.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from metrics import metrics
+
+T = TypeVar("T")
+
+
+class IdempotencyInProgress(Exception):
+    """同一幂等键的请求仍在执行，等待超时"""
+
+
+class IdempotencyKeyMismatch(Exception):
+    """同一幂等键被用于内容不同的请求"""
+
+
+class _Entry:
+    __slots__ = ("done", "result", "error", "expires_at", "fingerprint")
+
+    def __init__(self, fingerprint: Optional[str]):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.expires_at = float("inf")
+
+
+class IdempotencyCache:
+    """按 (作用域, 幂等键) 缓存一轮对话的结果
+
+    - 已完成且未过期：直接返回缓存结果，不再执行图；
+    - 正在执行：并发的重复请求等待首个请求完成并共享其结果；
+    - 首个请求失败：等待者收到同一异常，条目被移除，之后的重试会重新执行；
+    - 请求体指纹与条目不符：抛出 IdempotencyKeyMismatch，不返回首个请求的结果。
+    """
+
+    def __init__(self, ttl: float, max_entries: int, wait_timeout: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        # 已完成的条目按完成顺序排列（过期时间递增），执行中的条目单独保存，不参与淘汰
+        self._done: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._pending: Dict[Tuple[Hashable, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        # 从最早完成的条目开始，清理已过期或超出 max_entries 的部分
+        while self._done:
+            entry = next(iter(self._done.values()))
+            if entry.expires_at <= now or len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+            else:
+                break
+
+    def run(self, scope: Hashable, key: str, func: Callable[[], T],
+            fingerprint: Optional[str] = None) -> Tuple[T, bool]:
+        """返回 (结果, 是否为重放)；fingerprint 为请求体的哈希，同一键必须对应同一请求体"""
+        cache_key = (scope, key)
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._pending.get(cache_key) or self._done.get(cache_key)
+            owner = entry is None
+            if owner:
+                entry = self._pending[cache_key] = _Entry(fingerprint)
+
+        if not owner:
+            if entry.fingerprint != fingerprint:
+                metrics.inc("idempotency_mismatches_total")
+                raise IdempotencyKeyMismatch(f"Request {key} was already used with a different body")
+            if not entry.done.is_set():
+                metrics.inc("idempotency_waits_total")
+                logger.info(f"Duplicate request {key} is waiting for the in-flight execution")
+                if not entry.done.wait(self.wait_timeout):
+                    raise IdempotencyInProgress(f"Request {key} is still being processed")
+            if entry.error is not None:
+                raise entry.error
+            metrics.inc("idempotency_replays_total")
+            return entry.result, True
+
+        try:
+            entry.result = func()
+        except BaseException as e:
+            entry.error = e
+            with self._lock:
+                self._pending.pop(cache_key, None)
+            raise
+        else:
+            entry.expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                self._pending.pop(cache_key, None)
+                self._done[cache_key] = entry
+                self._purge(time.monotonic())
+        finally:
+            entry.done.set()
+        return entry.result, False
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {"idempotency_entries": len(self._done), "idempotency_in_flight": len(self._pending)}
+
+
+_cache: Optional[IdempotencyCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_idempotency_cache(settings) -> IdempotencyCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IdempotencyCache(
+                ttl=settings.idempotency_ttl_seconds,
+                max_entries=settings.idempotency_max_entries,
+                wait_timeout=settings.idempotency_wait_timeout,
+            )
+            metrics.register_collector(_cache.collect)
+        return _cache
@@ -0,0 +1,159 @@
+# json_stream.py
+import json
+from typing import Any, Iterable, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _decode_escape(escape: str) -> str:
+    try:
+        return json.loads(f'"{escape}"')
+    except ValueError:
+        return ""  # 非法转义：丢弃，最终结果以完整解析为准
+
+
+class JsonFieldStream:
+    """增量解析模型逐 token 输出的 JSON 对象（只跟踪最外层字段）
+
+    feed() 返回本次新产生的事件：
+      ("delta", 字段名, 文本)  text_fields 中的字符串字段，每收到一段字符即解码转发
+      ("field", 字段名, 值)    任一最外层字段的值完整到达（嵌套对象/数组整体解析）
+    第一个 "{" 之前的内容（例如代码块标记）与对象结束之后的内容被忽略。
+    """
+
+    def __init__(self, text_fields: Iterable[str] = ("content",)):
+        self.text_fields = set(text_fields)
+        self.buffer = ""
+        self.depth = 0
+        self.state = "start"       # start → key → colon → value → after_value → … → done
+        self.in_string = False
+        self.escaped = False
+        self.key_start = 0
+        self.key = None
+        self.value_start = 0
+        self.pending_escape = ""   # 流式字段中尚不完整的转义序列
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        events: List[Tuple[str, str, Any]] = []
+        delta: List[str] = []
+        start = len(self.buffer)
+        self.buffer += chunk
+        for pos in range(start, len(self.buffer)):
+            if self.state == "done":
+                break
+            char = self.buffer[pos]
+            if self.in_string:
+                streaming = self.state == "value" and self.depth == 1 and self.key in self.text_fields
+                if self.escaped:
+                    self.escaped = False
+                    if streaming:
+                        self._escape_char(char, delta)
+                elif char == "\\":
+                    self.escaped = True
+                    if streaming:
+                        # 可能是代理项对的后半个 \uXXXX，接在未完成的转义之后
+                        self.pending_escape += "\\"
+                elif char == '"':
+                    self.in_string = False
+                    self._string_closed(pos, events, delta)
+                elif streaming:
+                    if self.pending_escape:
+                        self._escape_char(char, delta)
+                    else:
+                        delta.append(char)
+                continue
+            self._structural(char, pos, events, delta)
+        self._flush(delta, events)
+        return events
+
+    def _structural(self, char: str, pos: int, events, delta):
+        if self.state == "start":
+            if char == "{":
+                self.depth, self.state = 1, "key"
+        elif self.depth > 1:
+            # 嵌套对象/数组：只需配对括号，回到第一层时整体解析
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1:
+                    self._emit_field(self.buffer[self.value_start:pos + 1], events, delta)
+                    self.state = "after_value"
+        elif self.state == "key":
+            if char == '"':
+                self.in_string, self.key_start = True, pos
+            elif char == "}":
+                self.state = "done"
+        elif self.state == "colon":
+            if char == ":":
+                self.state = "value_start"
+        elif self.state == "value_start":
+            if char in _WHITESPACE:
+                return
+            self.value_start, self.state = pos, "value"
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+        elif self.state == "value":
+            # 数字、true/false/null：遇到分隔符即完整
+            if char in ",}":
+                self._emit_field(self.buffer[self.value_start:pos], events, delta)
+                self.state = "key" if char == "," else "done"
+        elif self.state == "after_value":
+            if char == ",":
+                self.state = "key"
+            elif char == "}":
+                self.state = "done"
+
+    def _string_closed(self, pos: int, events, delta):
+        if self.state == "key":
+            self.key = self._loads(self.buffer[self.key_start:pos + 1])
+            self.state = "colon"
+        elif self.state == "value" and self.depth == 1:
+            self._emit_field(self.buffer[self.value_start:pos + 1], events, delta)
+            self.state = "after_value"
+
+    def _escape_char(self, char: str, delta: List[str]):
+        self.pending_escape += char
+        escape = self.pending_escape
+        if len(escape) == 2 and escape[1] in _SIMPLE_ESCAPES:
+            delta.append(_SIMPLE_ESCAPES[escape[1]])
+            self.pending_escape = ""
+        elif len(escape) == 6 and escape[1] == "u":
+            # 高位代理项需要等下一个 \uXXXX 才能组成完整字符
+            try:
+                high_surrogate = 0xD800 <= int(escape[2:], 16) <= 0xDBFF
+            except ValueError:
+                high_surrogate = False
+            if not high_surrogate:
+                delta.append(_decode_escape(escape))
+                self.pending_escape = ""
+        elif len(escape) == 12:
+            delta.append(_decode_escape(escape))
+            self.pending_escape = ""
+        elif len(escape) == 2 and escape[1] != "u":
+            self.pending_escape = ""  # 非法转义：丢弃，最终结果以完整解析为准
+
+    def _emit_field(self, raw: str, events, delta):
+        self._flush(delta, events)
+        events.append(("field", self.key, self._loads(raw.strip())))
+
+    def _flush(self, delta: List[str], events):
+        if delta:
+            events.append(("delta", self.key, "".join(delta)))
+            delta.clear()
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return raw
@@ -1,39 +1,53 @@
 # alternative_ticket_node.py
-
 import json
+
 from loguru import logger
-import psycopg2
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableLambda
-from langchain_core.messages import AIMessage
+from logging_config import log_payload
+from db import ALTERNATIVE_COLUMNS
+from dependencies import get_settings
+from disruption import load_proposals
+from prompt_layout import layered_prompt
+from ranking import rank_alternatives
+from request_context import budget_is_low
+from session_cache import get_session_cache, info_fingerprint, normalize_sql, normalize_text
+from sql_guard import SqlRejected, run_guarded_select
+from schemas import Alternative_Found, AlternativeOutput, GeneratedSQL, No_Alternative
+from structured_output import StructuredChain
 
-class AlternativeTicketNode:
-    def _parse_output(self, text: str) -> str:
-        try:
-            if isinstance(text, AIMessage):
-                text = text.content 
-                text = text.replace("```sql", "")
-                text = text.replace("```json", "")
-                text = text.replace("```", "")
-                # text = text.replace("\n", " ")
-            return text
-        except Exception as e:
-            logger.error(f"Failed to parse LLM output: {e}")
+INTERPRETATION_INSTRUCTIONS = """
+        Generate a SINGLE analysis message containing:
+        1. Natural language summary in user's language, and ask if the user if the showed alternative ticket is what they are looking for, if there are several alternatives, ask the user to specify which one they want to book, and in the intent_info, you need to put "alternative_found".
+        2. If there is no alternative ticket found, you need to ask user for other options, and in the intent_info, you need to put "no_alternative".
+        3. The alternatives are already ranked, best match first. Present them in that order, explain why the first one is the best match using its "why" notes (price difference, departure time shift, date distance, airline, return leg) and summarize the changes compared to the Original Ticket info (highlighted in bold, be aware that the content only recognizes the html tags)
+        4. Structured details section after two newlines
+
+        The Input Data (result count, schema fields, ranked alternative tickets with score and "why" notes, original ticket info) is given at the end.
 
-    def __init__(self, llm, db_host, db_name, db_user, db_password, db_port=5432):
+        Requirements:
+        - Use airport full names (e.g., JFK → John F. Kennedy International Airport)
+        - Localize dates/times based on user's language
+        - Format currency as USD (e.g., $450.00) and specify the price difference compared to the original ticket
+        - For React compatibility:
+          - Use <br/><br/> between sections
+          - Use <br/> for line breaks
+          - Avoid special characters
+
+        Output should be strict JSON:
+        {
+            "content": "Summary text...<br/><br/>**Options**<br/>- Field1: Value1<br/>- ...",
+            "sender": "system",
+            "intent_info": "alternative_found" | "no_alternative" 
+        }"""
+
+
+class AlternativeTicketNode:
+    def __init__(self, llm, interpretation_llm=None):
         self.llm = llm
-        self.db_host = db_host
-        self.db_name = db_name
-        self.db_user = db_user
-        self.db_password = db_password
-        self.db_port = db_port
-        
-        sql_template = """You are a database expert and you need to generate executable SQL for alternative_tickets table based on(**Output ONLY the PostgreSQL statement with ABSOLUTELY no other information.**) :
-        
-        # Original Ticket info:
-        {collected_info}
+        # SQL 生成用小模型，面向用户的结果解读可单独使用大模型
+        self.interpretation_llm = interpretation_llm or llm
         
-        # Chat History: "{messages}"
+        # 表结构与规则在前（可命中服务端前缀缓存），机票信息、对话与重试反馈放在最后
+        sql_instructions = """You are a database expert and you need to generate executable SQL for alternative_tickets table based on the Original Ticket info and the Chat History given at the end (**Output ONLY a JSON object {"sql": "<PostgreSQL statement>", "priorities": {...}} with ABSOLUTELY no other information.**) :
         
         # Rules:
         1. Use exact column names from alternative_tickets table, the table schema is as follows:
@@ -61,107 +75,144 @@ class AlternativeTicketNode:
         4. Include mandatory WHERE conditions
         5. Do not use airline_code or any time information or price to do the SQL 'WHERE' query, unless user input specifies like "I want to depart earlier that day" or "I want a cheaper flight".
         6. No INSERT, UPDATE, DELETE, or JOIN operations are allowed, only SELECT.
+        7. Do not add ORDER BY or LIMIT: the matching rows are ranked afterwards by price difference, departure time shift, date distance, same airline and return leg fit.
+        8. In "priorities", give a weight from 0 to 3 to each of these criteria the user stressed: "price", "departure_time", "date", "airline", "return_leg" (e.g. {"price": 3} for "I want a cheaper flight", {"airline": 0} for "any airline is fine"). Leave out criteria the user did not mention.
+        **Output ONLY a JSON object {"sql": "<PostgreSQL statement>", "priorities": {...}} with ABSOLUTELY no other information.**"""
         
-        **Output ONLY the PostgreSQL statement with ABSOLUTELY no other information.**"""
-        
-        self.sql_prompt = PromptTemplate.from_template(sql_template)
-        self.sql_chain = self.sql_prompt | self.llm | RunnableLambda(self._parse_output)
+        self.sql_prompt = layered_prompt(
+            sql_instructions,
+            [("Original Ticket info", "collected_info"), ("Chat History", "messages")],
+            closing="{feedback}"
+        )
+        self.interpretation_prompt = layered_prompt(INTERPRETATION_INSTRUCTIONS, [
+            ("Found alternatives", "result_count"),
+            ("Schema fields", "columns"),
+            ("Ranked Alternative Tickets", "ranked_alternatives"),
+            ("Original Ticket info", "collected_info"),
+        ])
+        # 模型仍直接输出 SQL 文本（或代码块）时，整段作为 sql 字段，不必重新询问；SQL 不推送给客户端
+        self.sql_chain = StructuredChain(
+            self.sql_prompt, self.llm, GeneratedSQL, "alternative_ticket_node", raw_field="sql", text_field=None
+        )
+        self.interpretation_chain = StructuredChain(
+            self.interpretation_prompt, self.interpretation_llm, AlternativeOutput, "alternative_interpretation"
+        )
 
     def process(self, state: dict) -> dict:
-        logger.info("====== AlternativeTicketNode Start =====")
-        new_state = state.copy(deep=True)
-        
+        logger.debug("AlternativeTicketNode start")
         try:
-            # Step 1: 生成SQL
-            collected_info = new_state.collected_info
-            messages = new_state.messages
-            
-            sql_input = {
-                "collected_info": collected_info,
-                "messages": messages
-            }
-            
-            raw_sql = self.sql_chain.invoke(sql_input)
-            print(f"Generated SQL: {raw_sql}")
+            # Step 1: 读取会话信息
+            collected_info = state.collected_info
+            messages = state.messages
+            # 航班中断的预生成改签方案只在本会话第一次给出备选方案时使用（last_offer 为空）
+            offer_proposals = bool(collected_info.get("ticket_number")) and not state.last_offer
 
-            # Step 2: 执行SQL
-            results = []
-            try:
-                with psycopg2.connect(
-                    host=self.db_host,
-                    database=self.db_name,
-                    user=self.db_user,
-                    password=self.db_password,
-                    port=self.db_port
-                ) as conn:
-                    with conn.cursor() as cursor:
-                        cursor.execute(raw_sql)
-                        results = cursor.fetchall()
-                        columns = [desc[0] for desc in cursor.description]
-            except Exception as e:
-                logger.error(f"Database error: {str(e)}")
-                raise
+            # 会话内备忘（collected_info 变化即失效）：同一请求复用生成的 SQL，同一查询复用结果与解读
+            settings = get_settings()
+            session_cache = get_session_cache(settings)
+            fingerprint = info_fingerprint(collected_info)
+            last_request = normalize_text(state.last_user_message or "")
+            cached_sql = session_cache.get("alternative_sql", last_request, fingerprint)
+            if cached_sql is not None:
+                cached = session_cache.get("alternatives", (cached_sql, offer_proposals), fingerprint)
+                if cached is not None:
+                    return {"messages": [dict(cached[2])]}
+
+            # Step 2: 生成SQL并在只读事务中执行；被拒绝或超时时把原因交给 LLM 重新生成
+            feedback = ""
+            for attempt in range(settings.generated_sql_max_attempts):
+                generated = self.sql_chain.invoke({
+                    "collected_info": collected_info,
+                    "messages": messages,
+                    "feedback": feedback
+                })
+                raw_sql = generated.sql
+                log_payload("Generated SQL", raw_sql, level="INFO")
+                filter_key = normalize_sql(raw_sql)
+                cached = session_cache.get("alternatives", (filter_key, offer_proposals), fingerprint)
+                if cached is not None:
+                    # 措辞不同但归一化后是同一查询：不再访问数据库与 LLM
+                    session_cache.put("alternative_sql", last_request, fingerprint, filter_key)
+                    return {"messages": [dict(cached[2])]}
+                try:
+                    columns, results = run_guarded_select(raw_sql, settings)
+                    break
+                except SqlRejected as e:
+                    feedback = e.retry_prompt()
+            else:
+                return {"messages": [{
+                    "content": "Sorry, I couldn't search alternatives for that request. Could you describe the change differently (e.g. another date or airport)?",
+                    "sender": "system",
+                    "intent_info": No_Alternative
+                }]}
 
-            # Step 3: 生成解读消息
+            # Step 3: 查询结果中包含预生成的改签方案时，只展示这些方案（它们同样满足用户的要求）
+            if offer_proposals:
+                results = self._matching_proposals(collected_info, columns, results) or results
+
+            # Step 4: 生成解读消息
             interpretation = self._generate_interpretation(
                 columns=columns,
                 results=results,
-                collected_info=collected_info
+                collected_info=collected_info,
+                priorities=generated.priorities
             )
-            
-            new_state.messages.append(interpretation)
-            return new_state
+            session_cache.put("alternatives", (filter_key, offer_proposals), fingerprint,
+                              (columns, len(results), interpretation))
+            session_cache.put("alternative_sql", last_request, fingerprint, filter_key)
+            return {"messages": [interpretation]}
 
         except Exception as e:
-            new_state.messages.append({
+            return {"messages": [{
                 "content": f"System Error: {str(e)}",
                 "sender": "system"
-            })
-            return new_state
-
-    def _generate_interpretation(self, columns, results, collected_info):
-        """生成结果解读消息"""
-        prompt_template = """
-        Generate a SINGLE analysis message containing:
-        1. Natural language summary in user's language, and ask if the user if the showed alternative ticket is what they are looking for, if there are several alternatives, ask the user to specify which one they want to book, and in the intent_info, you need to put "alternative_found".
-        2. If there is no alternative ticket found, you need to ask user for other options, and in the intent_info, you need to put "no_alternative".
-        3. Highlight best matches, analyze the Original Ticket info and compare with Sample Data and summarize the changes (highlighted in bold, be aware that the content only recognizes the html tags)
-        4. Structured details section after two newlines
+            }]}
 
-        Input Data:
-        - Found {result_count} alternatives
-        - Schema fields: {columns}
-        - Alternative Tickets: {sample_data}
-        - Original Ticket info: {collected_info}
-
-        Requirements:
-        - Use airport full names (e.g., JFK → John F. Kennedy International Airport)
-        - Localize dates/times based on user's language
-        - Format currency as USD (e.g., $450.00) and specify the price difference compared to the original ticket
-        - For React compatibility:
-          - Use <br/><br/> between sections
-          - Use <br/> for line breaks
-          - Avoid special characters
+    def _matching_proposals(self, collected_info, columns, results):
+        """查询结果中属于该机票预生成改签方案的行（按结果中共有的列比对）；方案每个会话只读取一次"""
+        ticket_number = collected_info["ticket_number"]
+        session_cache = get_session_cache(get_settings())
+        fingerprint = info_fingerprint(collected_info, ["ticket_number"])
+        proposals = session_cache.get("proposals", ticket_number, fingerprint)
+        if proposals is None:
+            try:
+                proposals = load_proposals(ticket_number)
+            except Exception as e:
+                # 方案表不可用时照常展示查询结果
+                logger.warning(f"Failed to load rebooking proposals: {e}")
+                return []
+            session_cache.put("proposals", ticket_number, fingerprint, proposals)
+        shared = [i for i, col in enumerate(columns) if col in ALTERNATIVE_COLUMNS]
+        if not proposals or not shared:
+            return []
+        proposed = {tuple(p[columns[i]] for i in shared) for p in proposals}
+        return [row for row in results if tuple(row[i] for i in shared) in proposed]
 
-        Output should be strict JSON:
-        {{
-            "content": "Summary text...<br/><br/>**Options**<br/>- Field1: Value1<br/>- ...",
+    def _render_template(self, result_count, ranked):
+        """预算不足时的模板解读消息"""
+        if not ranked:
+            return {
+                "content": "No alternative ticket matches your request. Would you like to try other dates or airports?",
+                "sender": "system",
+                "intent_info": No_Alternative
+            }
+        details = "".join(f"<br/>- {col}: {val}" for col, val in ranked[0].row.items())
+        why = ", ".join(ranked[0].explanations.values())
+        return {
+            "content": f"Found {result_count} alternative(s). Is this best match ({why}) the ticket you are looking for?<br/><br/>**Options**{details}",
             "sender": "system",
-            "intent_info": "alternative_found" | "no_alternative" 
-        }}"""
-        
-        sample_data = results[:1] if results else [] 
-        prompt = prompt_template.format(
-            result_count=len(results),
-            columns=", ".join(columns),
-            sample_data=str(sample_data),
-            collected_info=collected_info
-        )
-        
-        response = self.llm.invoke(prompt)
-        text = response.content
-        text = text.replace("```json", "")
-        text = text.replace("```", "")
-        text = text.replace("\n", "")
-        data = json.loads(text)
-        return data
\ No newline at end of file
+            "intent_info": Alternative_Found
+        }
+
+    def _generate_interpretation(self, columns, results, collected_info, priorities):
+        """对全部结果做多准则排序，只把前 k 个及各准则的说明交给 LLM 生成解读消息"""
+        ranked = rank_alternatives(columns, results, collected_info, priorities,
+                                   top_k=get_settings().alternative_rank_top_k)
+        if budget_is_low():
+            return self._render_template(len(results), ranked)
+        return self.interpretation_chain.invoke({
+            "result_count": len(results),
+            "columns": ", ".join(columns),
+            "ranked_alternatives": json.dumps([r.to_prompt() for r in ranked], ensure_ascii=False),
+            "collected_info": collected_info
+        }).model_dump()
@@ -1,4 +1,6 @@
 # backend/langgraph_nodes/awaiting_user_input_node.py
+from loguru import logger
+from logging_config import log_payload
 from schemas import MessageState
 from langgraph.types import Command, interrupt
 
@@ -7,7 +9,7 @@ class AwaitingUserInputNode:
         pass
         
     def process(self, state: MessageState) -> MessageState:
-        print("===Awaiting User Input===")
+        logger.debug("Awaiting user input")
         # 首次进入时触发中断，向客户端发送提示
         user_input = interrupt(
             value={
@@ -15,16 +17,14 @@ class AwaitingUserInputNode:
                 "message": "请提供更多信息"  # 自定义提示内容
             }
         )
-        print(f"===User Input: {user_input}===")
+        log_payload("User Input", user_input)
         # 恢复执行时处理用户输入（此时user_input为前端传回的值）
-        last_message = state.messages[-1] if state.messages else None
-        intent_info = last_message.get("intent_info", "") if last_message else ""
+        # 用户消息沿用上一条消息的意图（路由字段 last_intent）
+        intent_info = state.last_intent
         return {
-            "messages": state.messages + [{
+            "messages": [{
                 "content": user_input,
                 "sender": "user",
                 "intent_info": intent_info
-            }],
-            "collected_info": state.collected_info.copy(), 
-            "missing_info": state.missing_info.copy() 
+            }]
         }
\ No newline at end of file
@@ -1,22 +1,18 @@
 # collect_info_node.py
 from loguru import logger
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from schemas import MessageState, Search_Flight
+from logging_config import log_payload
+from prompt_layout import layered_prompt
+from schemas import InfoCollectionOutput, MessageState, Search_Flight
+from structured_output import StructuredChain
 
 class InfoCollectionNode:
     def __init__(self, llm):
         self.llm = llm
-        self.parser = JsonOutputParser()
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a professional flight ticketing specialist, you answer all questions using the language of user input. Your task is to collect the following information from the user: 
-Required Fields are listed in {missing_info}:
-Current Status:
-- Collected Info: {collected_info}
-- Missing Fields: {missing_info}
+        # 规则在前（可命中服务端前缀缓存），收集状态与对话放在最后
+        self.prompt = layered_prompt("""You are a professional flight ticketing specialist, you answer all questions using the language of user input. Your task is to collect the information listed in Missing Fields from the user.
+The current status (Collected Info, Missing Fields) and the Chat History are given at the end of the conversation.
 Processing Rules:
-1. Analyze the chat history {input} but ONLY extract ALL available information from last round of conversation. If the extraced info can be mapped to the required fields,
+1. Analyze the Chat History but ONLY extract ALL available information from last round of conversation. If the extraced info can be mapped to the required fields,
    put the mapped info into collected_info and remove the same field from missing_info, so that the chain can keep collecting the remaining fields.
    **VERY IMPORTANT**: try to understand the user's natural language input and map the input to the required fields. 
              Few-shot example, both "my birthday is 1991.10.19" or "I was born on 1991.10.19" should be mapped to "passenger_birthday". 
@@ -39,61 +35,61 @@ Processing Rules:
 -"missing_info": a List containing the STILL missing information,
 -"response": LLM's response to the user, asking for the STILL missing information or asking for clarification or indicate the completion of data collection.             
 for example, if the user says "my ticket number is ABC1234567890", the ticket_number field should be added to collected_info Dict and ticket_number shoulded be removed from missing_info List.  
-             """)
-        ]).partial(format_instructions=self.parser.get_format_instructions())
+             """, [
+            ("Collected Info", "collected_info"),
+            ("Missing Fields", "missing_info"),
+            ("Chat History", "input"),
+        ])
 
-        # 构建处理链
-        self.chain = (
-            RunnablePassthrough.assign(
-                collected_info=lambda x: x.get("collected_info",{}),
-                missing_info=lambda x: x.get("missing_info",[]),
-                input=lambda x: x["input"]
-            )
-            | self.prompt
-            | self.llm
-            | self.parser
+        # 构建处理链：输出按 InfoCollectionOutput 校验，失败时本地修复或重新询问一次
+        self.chain = StructuredChain(
+            self.prompt, self.llm, InfoCollectionOutput, "info_collection_node", text_field="response"
         )
 
     def process(self, state: MessageState) -> MessageState:
-        print("===Info collection node BEGIN===")
-        new_state = state.model_copy(deep=True)
-        new_state.log_state()  
-        last_message = state.messages[-1] if state.messages else None
-        intent_info = last_message.get("intent_info", "") if last_message else ""
+        logger.debug("Info collection node begin")
+        state.log_state()
+        intent_info = state.last_intent
+        # 只返回增量：新增消息与更新后的收集状态，不复制整段历史
+        collected_info = dict(state.collected_info)
+        missing_info = list(state.missing_info)
+        new_messages = []
         # 执行处理
         try:
             try:
-                last2_messages = new_state.messages[-2:] if len(new_state.messages) >= 2 else new_state.messages
+                last2_messages = state.messages[-2:]
                 result = self.chain.invoke({
-                    "collected_info": new_state.collected_info,
-                    "missing_info": new_state.missing_info,
+                    "collected_info": collected_info,
+                    "missing_info": missing_info,
                     "input": last2_messages
-                })
-                print(f"LLM 输出: {result}")
-                if not isinstance(result, dict):
-                    raise ValueError(f"Invalid JSON response: {result}")
+                }).model_dump()
+                log_payload("LLM 输出", result)
             except Exception as e:
-                logger.error(f"信息收集节点处理失败: {str(e)}", exc_info=True)
+                logger.opt(exception=e).error(f"信息收集节点处理失败: {str(e)}")
             
             # 更新收集状态
-            new_state.collected_info.update(result.get("collected_info", {}))
-            new_state.missing_info = [
-                f for f in new_state.missing_info 
+            collected_info.update(result.get("collected_info", {}))
+            missing_info = [
+                f for f in missing_info 
                 if f not in result.get("collected_info", {})
             ]
 
             # 添加系统回复
             if response := result.get("response"):
-                new_state.messages.append({
+                new_messages.append({
                     "content": response,
                     "sender": "system",
                     "intent_info": intent_info
                 })
   
         except Exception as e:
-            logger.error(f"信息收集节点处理失败: {str(e)}", exc_info=True)  # 打印堆栈跟踪
-            new_state.messages.append({
+            logger.opt(exception=e).error(f"信息收集节点处理失败: {str(e)}")  # 打印堆栈跟踪
+            new_messages.append({
                 "content": "系统处理出错，请重新输入",
                 "sender": "system"
             })
-        return new_state
\ No newline at end of file
+        return {
+            "messages": new_messages,
+            "collected_info": collected_info,
+            "missing_info": missing_info
+        }
\ No newline at end of file
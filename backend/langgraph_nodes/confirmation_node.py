@@ -1,28 +1,40 @@
 # confirmation_node.py
 import json
 from loguru import logger
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 
-from schemas import GeneralMessage
+from prompt_layout import layered_prompt
+from request_context import budget_is_low
+from schemas import Change_Confirmed, ConfirmationOutput, Flight_Change, GeneralMessage
+from structured_output import StructuredChain
+
+# 前端按钮的固定回复，预算不足时无需调用 LLM
+TEMPLATED_REPLIES = {
+    "Confirm Change": {
+        "intent_info": Change_Confirmed,
+        "sender": "system",
+        "content": "Your flight change has been confirmed. You will receive a confirmation email shortly."
+    },
+    "Re-search": {
+        "intent_info": Flight_Change,
+        "sender": "system",
+        "content": "We will continue searching for alternative flight options based on your request."
+    },
+}
 
 class ConfirmationNode:
     def __init__(self, llm):
         self.llm = llm
         confirmation_template = """
-        You are a flight booking confirmation specialist. Analyze the user's latest messages to determine their intent and generate appropriate responses.
-
-        **Message History**:
-        {message_history}
+        You are a flight booking confirmation specialist. Analyze the user's latest messages (Message History, given at the end) to determine their intent and generate appropriate responses.
 
         **Task**:
         1. Analyze the user's latest message to determine their intent
         2. Generate a JSON response with the following structure:
-        {{
+        {
             "intent_info": "flight_change" | "change_confirmed",
             "sender": "system",
             "content": "generated response text"
-        }}
+        }
 
         **Response Rules**:
         - If user message is "Confirm Change":
@@ -40,27 +52,28 @@ class ConfirmationNode:
         - Keep responses under 50 words
         """
 
-        self.confirmation_prompt = PromptTemplate.from_template(confirmation_template)
-        self.parser = JsonOutputParser()
-        self.confirmation_chain = self.confirmation_prompt | llm | self.parser
+        # 固定规则在前（可命中服务端前缀缓存），对话记录放在最后
+        self.confirmation_prompt = layered_prompt(confirmation_template, [("Message History", "message_history")])
+        self.confirmation_chain = StructuredChain(self.confirmation_prompt, llm, ConfirmationOutput, "confirmation_node")
 
     def process(self, state: dict) -> dict:
-        print("====== ConfirmationNode Begin =====")
-        new_state = state.copy(deep=True)
+        logger.debug("ConfirmationNode begin")
         try:
+            last_content = state.messages[-1].get("content") if state.messages else None
+            if budget_is_low() and last_content in TEMPLATED_REPLIES:
+                return {"messages": [dict(TEMPLATED_REPLIES[last_content])]}
+
             chain_input = {
-                "message_history": new_state.messages,
+                "message_history": state.messages,
             }
 
             # 调用大模型生成响应
-            result = self.confirmation_chain.invoke(chain_input)
-            new_state.messages.append(result)
-            return new_state
+            result = self.confirmation_chain.invoke(chain_input).model_dump()
+            return {"messages": [result]}
 
         except Exception as e:
             logger.error(f"Confirmation processing failed: {str(e)}")
             error_message = GeneralMessage(
                 content=f"System error: {str(e)}",
             )
-            new_state.messages.append(error_message.to_dict())
-            return new_state
\ No newline at end of file
+            return {"messages": [error_message.to_dict()]}
\ No newline at end of file
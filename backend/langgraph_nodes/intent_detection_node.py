@@ -1,14 +1,16 @@
 # intent_detection_node.py
-import json
 from loguru import logger
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableLambda
-from langchain_core.messages import AIMessage  # 导入 AIMessage
-from schemas import Flight_Change, FlightMessage, GeneralMessage, Other_Intent, Search_Flight
+from prompt_layout import layered_prompt
+from schemas import Flight_Change, FlightMessage, GeneralMessage, IntentOutput, Other_Intent, Search_Flight
+from structured_output import StructuredChain, StructuredOutputError
+
+SEARCH_FLIGHT_FIELDS = ["departure_date", "return_date", "adult_passengers", "departure_airport", "arrival_airport"]
+FLIGHT_CHANGE_FIELDS = ["ticket_number", "passenger_birthday", "passenger_name"]
 
 class IntentDetectionNode:
     def __init__(self, llm):
-        prompt = PromptTemplate.from_template(
+        # 对话记录本就在末尾；拆为 system/user 两条消息，与其他节点的分层布局一致
+        prompt = layered_prompt(
             """**Flight Service Agent Protocol**
     
 As a flight ticketing specialist, analyze the conversation history and:
@@ -33,70 +35,41 @@ C) For other intents:
    - Politely decline non-flight related requests
 
 **Strict JSON Response Format**
-{{
+{
     "intent_info": "search_flight" | "flight_change" | "other",
     "missing_info": ["field1", "field2"],  // Use exact field names
-    "content": "generated response text" 
+    "content": "generated response text",
     "sender": "system"
-}}
-
-**Conversation History**
-{messages}
+}
 
-**Current Response** (STRICT JSON ONLY):"""
+**Conversation History** is given at the end.""",
+            [("Conversation History", "messages")],
+            closing="**Current Response** (STRICT JSON ONLY):"
         )
-        self.chain = prompt | llm | RunnableLambda(self._parse_output)
+        self.prompt = prompt
+        self.chain = StructuredChain(prompt, llm, IntentOutput, "intent_detection_node")
 
-    def _parse_output(self, text: str) -> dict:
-        try:
-            # 处理 AIMessage 输出
-            if isinstance(text, AIMessage):
-                text = text.content  # 从 AIMessage 中提取内容
-                text = text.replace("```json", "")
-                text = text.replace("```", "")
-                text = text.replace("\n", "")
-            # 解析 JSON
-            data = json.loads(text)
-            # 验证并返回结构化数据
-            if data.get("intent_info") == Search_Flight:
-                return {
-                    "intent_info": data.get("intent_info", Other_Intent),
-                    "content": data.get("content", ""),
-                    "missing_info": ["departure_date", "return_date", "adult_passengers", "departure_airport", "arrival_airport"]
-                }
-            elif data.get("intent_info") == Flight_Change:
-                return {
-                    "intent_info": data.get("intent_info", Other_Intent),
-                    "content": data.get("content", ""),
-                    "missing_info": ["ticket_number", "passenger_birthday", "passenger_name"]
-                }
-            else:
-                return {
-                    "content": data.get("content", ""),
-                    "intent_info": Other_Intent
-                }
-        except Exception as e:
-            logger.error(f"Failed to parse LLM output: {e}")
-            return {
-                "type": "general",
-                "content": "抱歉，我暂时无法处理您的请求",
-                "intent_info": Other_Intent
-            }
+    def _to_output(self, result: IntentOutput) -> dict:
+        # 缺失字段由意图决定，不采用模型给出的列表
+        if result.intent_info == Search_Flight:
+            return {"intent_info": Search_Flight, "content": result.content, "missing_info": list(SEARCH_FLIGHT_FIELDS)}
+        if result.intent_info == Flight_Change:
+            return {"intent_info": Flight_Change, "content": result.content, "missing_info": list(FLIGHT_CHANGE_FIELDS)}
+        return {"intent_info": Other_Intent, "content": result.content}
 
     def process(self, state):
-        print("===Intent Detection Begin===")
-        if state.messages[-1]["sender"] != "user":
-            return state  # 跳过系统消息
+        logger.debug("Intent detection begin")
+        if state.last_sender != "user":
+            return {}  # 跳过系统消息
         # 直接使用 state.messages 作为聊天历史
         messages = state.messages
         
-        # 调用链并记录原始输出
-        raw_output = self.chain.invoke({"messages": messages})
-        
-        # 确保结果包含所需的键
-        if "intent_info" not in raw_output:
-            logger.error(f"Missing intent_info in result: {raw_output}")
-            raw_output["intent_info"] = Other_Intent
+        # 调用链并校验输出
+        try:
+            raw_output = self._to_output(self.chain.invoke({"messages": messages}))
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse LLM output: {e}")
+            raw_output = {"content": "抱歉，我暂时无法处理您的请求", "intent_info": Other_Intent}
         
         # 动态创建消息对象
         if raw_output["intent_info"] == Search_Flight:
@@ -110,9 +83,8 @@ C) For other intents:
                 content=raw_output["content"],
                 intent_info=raw_output["intent_info"]
             )
-        print(f"IntentOutput message: {new_message.intent_info}")
+        logger.info(f"Intent detected: {new_message.intent_info}")
         return {
-            "messages": state.messages + [new_message.to_dict()], 
-            "collected_info": state.collected_info,
+            "messages": [new_message.to_dict()],
             "missing_info": raw_output.get("missing_info", [])
         }
\ No newline at end of file
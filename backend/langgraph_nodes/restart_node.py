@@ -1,7 +1,6 @@
 # restart_node.py
-import json
 from loguru import logger
-from schemas import GeneralMessage, MessageState
+from schemas import MessageState
 
 class RestartNode:
     def __init__(self):
@@ -9,14 +8,7 @@ class RestartNode:
         pass
 
     def process(self, state: MessageState) -> MessageState:
-        print("====== RestartNode Begin =====")
-        new_state = state.model_copy()
-
-        last_message = new_state.messages[-1].copy()
-            # 如果存在intent_info字段，则清除它
-        if "intent_info" in last_message:
-            last_message["intent_info"] = ""
-        new_state.messages = [last_message]
-            
+        logger.debug("RestartNode begin")
+        # 清空阶段与最新意图：下一条用户输入重新进入意图识别；消息历史保持不变
         logger.info("State has been reset successfully.")
-        return new_state
\ No newline at end of file
+        return {"phase": "", "last_intent": ""}
@@ -1,8 +1,12 @@
 #search_node.py
 from loguru import logger
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from schemas import FlightMessage, GeneralMessage, Search_Flight
+from logging_config import log_payload
+from prompt_layout import layered_prompt
+from request_context import budget_is_low
+from schemas import FlightMessage, GeneralMessage, Search_Flight, SearchOutput
+from structured_output import StructuredChain
+
+SEARCH_URL_TEMPLATE = "https://www.skyscanner.de/transport/flights/{departure_airport}/{arrival_airport}/{departure_date}/{return_date}/?adultsv2={adult_passengers}&cabinclass=economy"
 
 class SearchNode:
     def __init__(self, llm):
@@ -10,12 +14,7 @@ class SearchNode:
         url_template = """
         You are a professional flight ticketing assistant who answers all questions in the language of user input. Your task is to generate a valid flight search URL based on the collected information. Follow these rules strictly:
 
-1. **Input Information**:
-   - Departure Airport: {departure_airport}
-   - Arrival Airport: {arrival_airport}
-   - Departure Date: {departure_date}
-   - Return Date: {return_date}
-   - Adult Passengers: {adult_passengers}
+1. **Input Information**: Departure Airport, Arrival Airport, Departure Date, Return Date and Adult Passengers are given at the end.
 
 2. **Data Format Rules**:
    - `departure_airport`: IATA 3-letter code (e.g., FRA for Frankfurt).
@@ -32,7 +31,7 @@ class SearchNode:
    - If the URL is successfully generated, include the URL in the `flight_url` field and provide a natural language response in the `content` field.
 
 4. **URL Generation Rules**:
-   - Use the following URL format:
+   - Use the following URL format, replacing each placeholder with the corresponding input:
      ```
      https://www.skyscanner.de/transport/flights/{departure_airport}/{arrival_airport}/{departure_date}/{return_date}/?adultsv2={adult_passengers}&cabinclass=economy
      ```
@@ -40,19 +39,19 @@ class SearchNode:
 5. **Example Output**:
    - If the URL is generated successfully:
      ```json
-     {{
+     {
        "content": "Your flight search URL has been successfully generated. Click the link to view available flights.",
        "sender": "system",
        "flight_url": "https://www.skyscanner.de/transport/flights/FRA/PEK/250903/250925/?adultv2=1&cabinclass=economy"
-     }}
+     }
      ```
    - If the URL cannot be generated:
      ```json
-     {{
+     {
        "content": "Error: The return date is missing. Please provide a valid return date or set it to 'None'.",
        "sender": "system",
        "flight_url": null
-     }}
+     }
      ```
 
 6. **Instructions**:
@@ -60,31 +59,34 @@ class SearchNode:
    - If any required field is missing or invalid, return an error message in the `content` field and set `flight_url` to `null`.
    - Do not include any additional explanations or notes outside the JSON object.
         """
-        self.url_prompt = PromptTemplate.from_template(url_template)
-        self.parser = JsonOutputParser()
-        self.url_chain = self.url_prompt | llm | self.parser
+        # 固定规则在前（可命中服务端前缀缓存），本次搜索条件放在最后
+        self.url_prompt = layered_prompt(url_template, [
+            ("Departure Airport", "departure_airport"),
+            ("Arrival Airport", "arrival_airport"),
+            ("Departure Date", "departure_date"),
+            ("Return Date", "return_date"),
+            ("Adult Passengers", "adult_passengers"),
+        ])
+        self.url_chain = StructuredChain(self.url_prompt, llm, SearchOutput, "search_node")
 
     def process(self, state: dict) -> dict:
-        print("====== SearchNode Begin ======")
-        # 创建新状态副本
-        new_state = state.copy(deep=True)
-
+        logger.debug("SearchNode begin")
         # 准备URL生成所需信息
-        collected_info = new_state.collected_info
-        print(f"Collected Info: {collected_info}")
+        collected_info = state.collected_info
+        missing_info = list(state.missing_info)
+        log_payload("Collected Info", collected_info)
         required_fields = ['departure_airport', 'arrival_airport', 'departure_date']
         for field in required_fields:
           if not collected_info.get(field):  # 如果字段缺失或为空
-            if field not in new_state.missing_info:
-              new_state.missing_info.append(field)
+            if field not in missing_info:
+              missing_info.append(field)
         
-        if new_state.missing_info:
-            missing_info_msg = "Please provide the following missing information: " + ", ".join(new_state.missing_info)
-            new_state["messages"].append({
+        if missing_info:
+            missing_info_msg = "Please provide the following missing information: " + ", ".join(missing_info)
+            return {"messages": [{
                 "content": missing_info_msg,
                 "sender": "system"
-            })
-            return new_state
+            }], "missing_info": missing_info}
         url_input = {
             "departure_airport": collected_info['departure_airport'],
             "arrival_airport": collected_info['arrival_airport'],
@@ -94,14 +96,17 @@ class SearchNode:
         }
 
         try:
-            # 调用大模型生成URL
-            url_result = self.url_chain.invoke(url_input)
-            print(f"Generated URL Result: {url_result}")
+            if budget_is_low():
+                # 预算不足时直接按模板拼接URL
+                url_result = {
+                    "content": "Your flight search URL has been generated. Click the link to view available flights.",
+                    "flight_url": SEARCH_URL_TEMPLATE.format(**url_input)
+                }
+            else:
+                # 调用大模型生成URL
+                url_result = self.url_chain.invoke(url_input).model_dump()
+            log_payload("Generated URL Result", url_result)
 
-            # 检查URL生成结果
-            if not isinstance(url_result, dict) or "content" not in url_result or "flight_url" not in url_result:
-                raise ValueError("Invalid JSON response from the search node model.")
-            
             if url_result.get("flight_url"):
                 new_message = FlightMessage(
                     content=url_result.get("content"),
@@ -112,15 +117,12 @@ class SearchNode:
                 new_message = GeneralMessage(
                     content=url_result.get("content"),
             )
-            return {"messages": state.messages + [new_message.to_dict()],
-                    "collected_info": state.collected_info,
-                    "missing_info": state.missing_info}
+            return {"messages": [new_message.to_dict()]}
 
         except Exception as e:
             logger.error(f"URL generation failed: {str(e)}")
             # 添加错误信息到消息中
-            new_state["messages"].append({
+            return {"messages": [{
                 "content": f"Error: {str(e)}",
                 "sender": "system"
-            })
-            return new_state
\ No newline at end of file
+            }]}
\ No newline at end of file
@@ -3,20 +3,22 @@ import os
 from typing import Dict, List
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 import psycopg2
-from schemas import Flight_Change, MessageState
+from loguru import logger
+from db import get_db_pool, queries
+from dependencies import get_settings
+from prompt_layout import layered_prompt
+from request_context import budget_is_low
+from schemas import Flight_Change, MessageState, Search_Alternative, VerificationOutput
+from session_cache import get_session_cache, info_fingerprint
+from structured_output import StructuredChain
+
+VERIFY_FIELDS = ("ticket_number", "passenger_birthday", "passenger_name")
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
 
 class VerificationNode:
-    def __init__(self, llm, db_host, db_name, db_user, db_password, db_port=5432):
-        self.db_host = db_host
-        self.db_name = db_name
-        self.db_user = db_user
-        self.db_password = db_password
-        self.db_port = db_port
+    def __init__(self, llm):
         # llm = ChatOpenAI(
         #     model=os.getenv("CHAT_GPT_MODEL"),
         #     openai_api_key=os.getenv("CHAT_GPT_KEY"),
@@ -29,9 +31,7 @@ class VerificationNode:
 2. If verification successful, ask user to what they would like to change for the current ticket. (eg. date, time, airport, etc.)
 3. Structured details section after two newlines
 
-Analyze input data is as follows:
--Database results:{field_str}
--User's last message: "{user_message}"
+The input data (Database results, User's last message) is given at the end.
 
 Requirements:
 - If Database results does not contain flight ticket information, means Verification failed and No matching ticket found. Generate a message to inform user about the failure and ask user to re-input the "ticket_number", "passenger_birthday", "passenger_name" accordingly and ""intent_info"" should be "flight_change".
@@ -46,14 +46,17 @@ Requirements:
 - Use <br/> before each detail item instead of newlines
 
 Output JSON format:
-{{
+{
     "content": "Natural language confirmation message...<br/><br/>**Ticket Details**<br/>- Field1: Value1<br/>- Field2: Value2...",
     "sender": "system",
     "intent_info": "flight_change" or "search_alternative"
-}}"""
-        self.prompt = PromptTemplate.from_template(prompt_template)
-        self.parser = JsonOutputParser()
-        self.chain = self.prompt | self.llm | self.parser
+}"""
+        # 固定要求在前（可命中服务端前缀缓存），查询结果与用户消息放在最后
+        self.prompt = layered_prompt(prompt_template, [
+            ("Database results", "field_str"),
+            ("User's last message", "user_message"),
+        ])
+        self.chain = StructuredChain(self.prompt, self.llm, VerificationOutput, "verification_node")
 
     def _call_gpt(self, columns: List[str], result: tuple, user_message: str) -> Dict:
         """Call OpenAI API to generate single formatted message"""
@@ -62,18 +65,15 @@ Output JSON format:
             field_str = "\n".join([f"{col}: {val}" for col, val in zip(columns, result)])
         else:
             field_str = ""
+        if budget_is_low():
+            # 请求预算不足，跳过 LLM 润色，直接使用模板
+            return self._render_template(columns, result)
 
         try:
-            response = self.chain.invoke({
+            return self.chain.invoke({
                 "field_str": field_str,
                 "user_message": user_message
-            })
-            
-            # 验证必要字段
-            required_keys = ["content", "sender", "intent_info"]
-            if not all(k in response for k in required_keys):
-                raise ValueError(f"Missing required keys: {required_keys}")
-            return response
+            }).model_dump()
         except Exception as e:
             return {
                 "content": f"Verification successful. Display limited: {str(e)}",
@@ -81,77 +81,81 @@ Output JSON format:
                 "intent_info": Flight_Change
             }
 
+    def _render_template(self, columns: List[str], result: tuple) -> Dict:
+        """Templated verification message used when the request budget is low"""
+        if not result:
+            return {
+                "content": "Verification failed: no matching ticket found. Please re-enter your ticket number, birthday and full name.",
+                "sender": "system",
+                "intent_info": Flight_Change
+            }
+        details = "".join(f"<br/>- {col}: {val}" for col, val in zip(columns, result))
+        return {
+            "content": f"Verification successful. What would you like to change for this ticket (date, time, airport, etc.)?<br/><br/>**Ticket Details**{details}",
+            "sender": "system",
+            "intent_info": Search_Alternative
+        }
+
     def process(self, state: MessageState) -> MessageState:
         # 从 collected_info 中提取验证所需字段
-        print("====== VerificationNode Begin ======")
-        new_state = state.model_copy(deep=True)
+        logger.debug("VerificationNode begin")
+        collected_info = dict(state.collected_info)
+        missing_info = list(state.missing_info)
         required_fields = ["ticket_number", "passenger_birthday", "passenger_name"]
         for field in required_fields:
-            if not new_state.collected_info.get(field):
-                if field not in new_state.missing_info:
-                    new_state.missing_info.append(field)
-        if new_state.missing_info:
+            if not collected_info.get(field):
+                if field not in missing_info:
+                    missing_info.append(field)
+        if missing_info:
             new_message = {
                 "content": "Verification failed: Required information is missing.",
                 "sender": "system"
             }
-            return {"messages": new_state.messages.append(new_message),
-                    "collected_info": new_state.collected_info,
-                    "missing_info": new_state.missing_info}
-        ticket_number = new_state.collected_info["ticket_number"]
-        passenger_birthday = new_state.collected_info["passenger_birthday"]
-        passenger_name = new_state.collected_info["passenger_name"]
-        # 连接数据库
+            return {"messages": [new_message],
+                    "collected_info": collected_info,
+                    "missing_info": missing_info}
+        ticket_number = collected_info["ticket_number"]
+        passenger_birthday = collected_info["passenger_birthday"]
+        passenger_name = collected_info["passenger_name"]
+        # 本会话已核验过同一张票（例如未找到备选后回到核验）：复用查询结果与生成的消息
+        session_cache = get_session_cache(get_settings())
+        triple = (ticket_number, passenger_birthday, passenger_name)
+        fingerprint = info_fingerprint(collected_info, VERIFY_FIELDS)
+        cached = session_cache.get("verified_ticket", triple, fingerprint)
+        if cached is not None:
+            columns, result, gpt_message = cached
+            collected_info.update({col: val for col, val in zip(columns, result)})
+            return {"messages": [dict(gpt_message)],
+                    "collected_info": collected_info,
+                    "missing_info": missing_info}
+        # 查询票务表（连接池 + 预编译语句），LLM 生成消息前即归还连接
         try:
-            connection = psycopg2.connect(
-                host=self.db_host,
-                database=self.db_name,
-                user=self.db_user,
-                password=self.db_password,
-                port=self.db_port
-            )
-        except Exception as e:
+            with get_db_pool(get_settings()).connection() as conn:
+                with conn.cursor() as cursor:
+                    queries.execute(cursor, "verify_ticket", (ticket_number, passenger_birthday, passenger_name))
+                    result = cursor.fetchone()
+                    # Get column names from cursor description
+                    columns = [desc[0] for desc in cursor.description]
+        except psycopg2.OperationalError as e:
             error_msg = {"content": f"Database connection error: {str(e)}", "sender": "system"}
-            new_state.messages.append(error_msg)
-            return new_state
-
-        cursor = connection.cursor()
-
-        # 根据提供的信息查询票务表
-        query = """
-        SELECT ticket_number, passenger_name, passenger_birthday, airline_code,
-               departure_airport, arrival_airport, departure_date, departure_time,
-               arrival_date, arrival_time, return_departure_airport, return_arrival_airport,
-               return_date, return_departure_time, return_arrival_date, return_arrival_time,
-               price_usd
-        FROM tickets
-        WHERE ticket_number = %s AND passenger_birthday = %s AND passenger_name = %s;
-        """
-        try:
-            cursor.execute(query, (ticket_number, passenger_birthday, passenger_name))
-            result = cursor.fetchone()
-                # Get column names from cursor description
-            columns = [desc[0] for desc in cursor.description]
-                # Get last user message
-            user_messages = [msg for msg in new_state.messages if msg["sender"] == "user"]
-            last_user_msg = user_messages[-1]["content"] if user_messages else ""
-                # Generate complete message through GPT
-            gpt_message = self._call_gpt(columns, result, last_user_msg)               
-                # Directly append the generated message
-            new_state.messages.append(gpt_message)
-            if result:
-                new_state.collected_info.update(
-                {col: val for col, val in zip(columns, result)})
-            else:
-                new_state.missing_info = ["ticket_number", "passenger_birthday", "passenger_name"]
-                new_state.collected_info = {}
+            return {"messages": [error_msg]}
         except Exception as e:
-            new_state.messages.append({"content": f"Database query error: {str(e)}", "sender": "system"})
-            new_state.missing_info = ["ticket_number", "passenger_birthday", "passenger_name"]
-            new_state.collected_info = {}
+            error_msg = {"content": f"Database query error: {str(e)}", "sender": "system"}
+            return {"messages": [error_msg],
+                    "collected_info": {},
+                    "missing_info": ["ticket_number", "passenger_birthday", "passenger_name"]}
 
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'connection' in locals(): connection.close()
+        # Generate complete message through GPT（最近一条用户输入由路由字段维护，无需扫描历史）
+        gpt_message = self._call_gpt(columns, result, state.last_user_message or "")
+        if result:
+            collected_info.update({col: val for col, val in zip(columns, result)})
+            if gpt_message.get("intent_info") == Search_Alternative:
+                # 只备忘核验成功且消息可用的结果；LLM 出错时的降级消息不缓存
+                session_cache.put("verified_ticket", triple, fingerprint, (columns, result, gpt_message))
+        else:
+            missing_info = ["ticket_number", "passenger_birthday", "passenger_name"]
+            collected_info = {}
 
-        return new_state
+        return {"messages": [gpt_message],
+                "collected_info": collected_info,
+                "missing_info": missing_info}
@@ -0,0 +1,14 @@
+# llm/__init__.py
+
+from .http_pool import (
+    LLM_UNAVAILABLE_MESSAGE,
+    CircuitOpenError,
+    close_http_pool,
+    find_circuit_open,
+    get_http_pool,
+)
+from .hedging import HedgedChatModel, HedgePolicy, get_hedge_policy
+from .scheduler import LLMScheduler, ScheduledChatModel, get_llm_scheduler
+from .cassette import RECORD, REPLAY, CassetteChatModel, CassetteStore, get_cassette_store
+from .process_local import ProcessLocalChatModel
+from .usage import UsageTrackingChatOpenAI, cached_prompt_tokens, token_usage
@@ -0,0 +1,198 @@
+# llm/cassette.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from loguru import logger
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from metrics import metrics
+from request_context import current_node, current_session
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+def _safe_name(session_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)
+
+
+class CassetteStore:
+    """每个会话一个 JSONL 文件：用户输入（turn）与 LLM 调用（llm）按发生顺序记录"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{_safe_name(session_id)}.jsonl")
+
+    def append(self, session_id: str, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(session_id), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def record_turn(self, session_id: str, message: str, resumed: bool = False):
+        # resumed: 该轮只是继续上一轮超时的执行，用户输入未进入图
+        self.append(session_id, {
+            "type": "turn", "session_id": session_id, "message": message, "resumed": resumed, "ts": time.time()
+        })
+
+    def load(self, session_id: str) -> List[Dict[str, Any]]:
+        path = self.path(session_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def sessions(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        sessions = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".jsonl"):
+                entries = self.load(name[:-len(".jsonl")])
+                first = next((e for e in entries if e.get("session_id")), None)
+                sessions.append(first["session_id"] if first else name[:-len(".jsonl")])
+        return sessions
+
+
+def _serialize_prompt(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    return [{"role": m.type, "content": m.content} for m in messages]
+
+
+def _prompt_hash(prompt: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(prompt, ensure_ascii=False, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _usage(result: ChatResult) -> Dict[str, Any]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    if not usage and result.generations:
+        usage = getattr(result.generations[0].message, "usage_metadata", None) or {}
+    return dict(usage)
+
+
+class CassetteChatModel(BaseChatModel):
+    """录制/回放 LLM 调用
+
+    record: 透传给 inner，并把提示词、输出、token 用量与延迟写入会话的 cassette
+    replay: 不访问网络，按 (会话, 节点) 的调用顺序返回录制的输出，可按比例模拟原始延迟
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: Optional[BaseChatModel] = None
+    store: Any = Field(default=None, exclude=True)
+    mode: str = RECORD
+    latency_scale: float = 1.0
+
+    _cursors: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = PrivateAttr(default_factory=dict)
+    _loaded: set = PrivateAttr(default_factory=set)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-{self.mode}"
+
+    def _key(self) -> Tuple[str, str]:
+        return current_session() or "default", current_node() or "unknown"
+
+    def _next_entry(self, session_id: str, node: str) -> Dict[str, Any]:
+        with self._lock:
+            if session_id not in self._loaded:
+                by_node = defaultdict(deque)
+                for entry in self.store.load(session_id):
+                    if entry.get("type") == "llm":
+                        by_node[entry["node"]].append(entry)
+                for entry_node, entries in by_node.items():
+                    self._cursors[(session_id, entry_node)] = entries
+                self._loaded.add(session_id)
+            entries = self._cursors.get((session_id, node))
+            if not entries:
+                metrics.inc("llm_cassette_misses_total", node=node)
+                raise LookupError(f"No recorded completion left for session={session_id} node={node}")
+            return entries.popleft()
+
+    def _replay_result(self, entry: Dict[str, Any], prompt) -> ChatResult:
+        if entry.get("prompt_hash") != _prompt_hash(prompt):
+            # 提示词已变化：仍按顺序回放，但记录下来便于定位
+            metrics.inc("llm_cassette_prompt_mismatch_total", node=entry["node"])
+            logger.debug(f"Cassette prompt mismatch at node {entry['node']}")
+        usage = entry.get("usage") or {}
+        message = AIMessage(content=entry["completion"])
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage})
+
+    def _record(self, session_id: str, node: str, prompt, result: ChatResult, latency: float):
+        self.store.append(session_id, {
+            "type": "llm",
+            "session_id": session_id,
+            "node": node,
+            "model": getattr(self.inner, "model_name", None),
+            "prompt": prompt,
+            "prompt_hash": _prompt_hash(prompt),
+            "completion": result.generations[0].message.content if result.generations else "",
+            "usage": _usage(result),
+            "latency": latency,
+            "ts": time.time(),
+        })
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        session_id, node = self._key()
+        prompt = _serialize_prompt(messages)
+        if self.mode == REPLAY:
+            entry = self._next_entry(session_id, node)
+            if self.latency_scale > 0:
+                time.sleep(entry.get("latency", 0) * self.latency_scale)
+            return self._replay_result(entry, prompt)
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop, None, **kwargs)
+        self._record(session_id, node, prompt, result, time.perf_counter() - started)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        session_id, node = self._key()
+        prompt = _serialize_prompt(messages)
+        if self.mode == REPLAY:
+            entry = self._next_entry(session_id, node)
+            if self.latency_scale > 0:
+                await asyncio.sleep(entry.get("latency", 0) * self.latency_scale)
+            return self._replay_result(entry, prompt)
+        started = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop, None, **kwargs)
+        self._record(session_id, node, prompt, result, time.perf_counter() - started)
+        return result
+
+
+_store: Optional[CassetteStore] = None
+_store_lock = threading.Lock()
+
+
+def get_cassette_store(settings) -> CassetteStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CassetteStore(settings.llm_cassette_dir)
+        return _store
@@ -0,0 +1,209 @@
+# llm/hedging.py
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import ConfigDict, Field
+
+from metrics import metrics
+from request_context import current_deadline, current_node
+
+# 同步调用的主请求与对冲请求都在独立线程池中执行，调用方线程只负责等待先完成的一方；
+# 线程无法被强制取消：落败的请求会在后台跑完后把连接还给连接池
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+class HedgePolicy:
+    """对冲策略：主请求超过延迟分位数仍未返回时，向备用端点发出重复请求
+
+    延迟窗口按 key（模型、节点）分别统计，不同模型与节点的延迟分布不会互相干扰；
+    对冲配额（max_ratio）在全部请求上共享。
+    """
+
+    def __init__(self, percentile: float = 95.0, min_delay: float = 2.0,
+                 max_ratio: float = 0.1, window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.window = window
+        self.min_samples = min_samples
+        self.latencies: Dict[Hashable, Deque[float]] = {}
+        self.requests = 0
+        self.hedges = 0
+        self.secondary_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self, key: Hashable = None) -> float:
+        with self._lock:
+            latencies = self.latencies.get(key, ())
+            if len(latencies) < self.min_samples:
+                return self.min_delay
+            ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_latency(self, key: Hashable, seconds: float):
+        with self._lock:
+            window = self.latencies.get(key)
+            if window is None:
+                window = self.latencies[key] = deque(maxlen=self.window)
+            window.append(seconds)
+
+    def try_acquire_hedge(self) -> bool:
+        """对冲请求数不超过总请求数的 max_ratio"""
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.requests:
+                metrics.inc("llm_hedge_skipped_total", reason="ratio_cap")
+                return False
+            self.hedges += 1
+        metrics.inc("llm_hedged_requests_total")
+        return True
+
+    def record_winner(self, winner: str):
+        metrics.inc("llm_hedge_wins_total", winner=winner)
+        if winner == "secondary":
+            with self._lock:
+                self.secondary_wins += 1
+
+    def collect(self) -> dict:
+        with self._lock:
+            requests, hedges, wins = self.requests, self.hedges, self.secondary_wins
+        return {
+            "llm_hedge_rate": hedges / requests if requests else 0.0,
+            "llm_hedge_secondary_win_rate": wins / hedges if hedges else 0.0,
+        }
+
+
+class HedgedChatModel(BaseChatModel):
+    """在主模型之上增加对冲
+
+    同步与异步调用都是先到先得：返回最先成功的结果，另一个请求被取消（同步调用中
+    已在运行的线程无法取消，只是不再等待其结果）。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    primary: BaseChatModel
+    secondary: BaseChatModel
+    policy: Any = Field(default=None, exclude=True)
+    model_name: str = ""  # 延迟窗口按模型与节点区分
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-chat"
+
+    def _window_key(self) -> Hashable:
+        return self.model_name, current_node()
+
+    def _hedge_delay(self, key: Hashable) -> float:
+        delay = self.policy.delay(key)
+        deadline = current_deadline()
+        if deadline is not None:
+            delay = min(delay, deadline.remaining())
+        return delay
+
+    def _submit(self, model: BaseChatModel, messages, stop, kwargs) -> Future:
+        # 复制上下文，让线程池中的请求也能看到当前请求的预算与节点
+        return _executor.submit(copy_context().run, model._generate, messages, stop, None, **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self._window_key()
+        self.policy.record_request()
+        started = time.perf_counter()
+        primary = self._submit(self.primary, messages, stop, kwargs)
+        primary.add_done_callback(
+            lambda f: not f.cancelled() and f.exception() is None
+            and self.policy.record_latency(key, time.perf_counter() - started)
+        )
+        done, _ = wait([primary], timeout=self._hedge_delay(key))
+        if done or not self.policy.try_acquire_hedge():
+            return primary.result()
+
+        secondary = self._submit(self.secondary, messages, stop, kwargs)
+        futures = {primary: "primary", secondary: "secondary"}
+        pending = set(futures)
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self.policy.record_winner(futures[future])
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self._window_key()
+        self.policy.record_request()
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(self.primary._agenerate(messages, stop, None, **kwargs))
+        primary.add_done_callback(
+            lambda t: not t.cancelled() and t.exception() is None
+            and self.policy.record_latency(key, time.perf_counter() - started)
+        )
+        done, _ = await asyncio.wait([primary], timeout=self._hedge_delay(key))
+        if done or not self.policy.try_acquire_hedge():
+            return await primary
+
+        secondary = asyncio.ensure_future(self.secondary._agenerate(messages, stop, None, **kwargs))
+        tasks = {primary: "primary", secondary: "secondary"}
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.policy.record_winner(tasks[task])
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy(settings) -> HedgePolicy:
+    """进程级共享的对冲策略（各模型、节点的延迟窗口与对冲配额跨请求累计）"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = HedgePolicy(
+                percentile=settings.llm_hedge_percentile,
+                min_delay=settings.llm_hedge_min_delay,
+                max_ratio=settings.llm_hedge_max_ratio,
+                window=settings.llm_hedge_window,
+            )
+            metrics.register_collector(_policy.collect)
+        return _policy
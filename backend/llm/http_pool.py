@@ -0,0 +1,325 @@
+# llm/http_pool.py
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from metrics import metrics
+from request_context import DeadlineExceeded, current_deadline
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+LLM_UNAVAILABLE_MESSAGE = "AI service is temporarily busy, please try again in a moment."
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def find_circuit_open(exc: BaseException) -> Optional[CircuitOpenError]:
+    """沿异常链查找 CircuitOpenError（OpenAI SDK 会把它包装成 APIConnectionError）"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, CircuitOpenError):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None  # 半开状态下探测请求的开始时间
+        self._lock = threading.Lock()
+
+    def before_request(self) -> Optional[float]:
+        """放行时返回探测令牌（非探测请求为 None），请求结束后交给 release_probe"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                elapsed = now - self.opened_at
+                if elapsed < self.reset_timeout:
+                    metrics.inc("llm_circuit_rejected_total")
+                    raise CircuitOpenError(self.reset_timeout - elapsed)
+                self.state = self.HALF_OPEN
+                self.probe_started = None
+            if self.state == self.HALF_OPEN:
+                # 半开状态只放行一个探测请求；超过 reset_timeout 仍未结束的探测视为丢失，允许重新探测
+                if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                    metrics.inc("llm_circuit_rejected_total")
+                    raise CircuitOpenError(self.reset_timeout - (now - self.probe_started))
+                self.probe_started = now
+                return now
+            return None
+
+    def release_probe(self, probe: Optional[float]):
+        """探测请求未记录结果就结束时（超过截止时间、被取消）释放探测名额"""
+        if probe is None:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.probe_started == probe:
+                self.probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.probe_started = None
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"LLM circuit opened after {self.consecutive_failures} failures")
+                    metrics.inc("llm_circuit_opened_total")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def collect(self) -> dict:
+        state_value = {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self.state]
+        return {
+            "llm_circuit_state": state_value,
+            "llm_circuit_consecutive_failures": self.consecutive_failures,
+        }
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full jitter 指数退避；服务端给出 Retry-After 时优先使用"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+def _apply_deadline(request: httpx.Request):
+    """把单次调用的超时收紧到请求剩余预算以内"""
+    deadline = current_deadline()
+    if deadline is None:
+        return
+    deadline.check("llm call")
+    remaining = deadline.remaining()
+    timeout = request.extensions.get("timeout", {})
+    request.extensions["timeout"] = {
+        key: min(value, remaining) if value is not None else remaining
+        for key, value in timeout.items()
+    }
+
+
+def _deadline_allows(delay: float) -> bool:
+    deadline = current_deadline()
+    return deadline is None or deadline.remaining() > delay
+
+
+class _ResilienceMixin:
+    def _init_resilience(self, policy: RetryPolicy, breaker: CircuitBreaker):
+        self.policy = policy
+        self.breaker = breaker
+
+    def _should_retry(self, attempt: int) -> bool:
+        return attempt < self.policy.max_retries and not self.breaker.is_open()
+
+    def _on_timeout(self):
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            deadline.tripped = True
+            raise DeadlineExceeded("Deadline exceeded while waiting for LLM response")
+
+    def _on_status(self, status_code: int):
+        # 所有 5xx（含不重试的 501、505 等）计入熔断失败；429 只重试，既不计入失败（限流不代表服务故障），
+        # 也不计入成功（半开状态下被限流的探测不能关闭熔断，探测名额由 release_probe 释放）
+        if status_code >= 500:
+            self.breaker.record_failure()
+        elif status_code not in RETRY_STATUS_CODES:
+            self.breaker.record_success()
+
+    def _retry_after_error(self, error: httpx.TransportError, attempt: int) -> Optional[float]:
+        """记录传输错误；返回重试前的等待秒数，不再重试时返回 None"""
+        timed_out = isinstance(error, httpx.TimeoutException)
+        if timed_out:
+            self._on_timeout()
+        self.breaker.record_failure()
+        delay = self.policy.delay(attempt)
+        if not (self._should_retry(attempt) and _deadline_allows(delay)):
+            return None
+        metrics.inc("llm_retries_total", reason="timeout" if timed_out else "transport")
+        return delay
+
+    def _retry_after_response(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """记录响应状态；返回重试前的等待秒数，直接返回该响应时为 None"""
+        self._on_status(response.status_code)
+        if response.status_code not in RETRY_STATUS_CODES or not self._should_retry(attempt):
+            return None
+        delay = self.policy.delay(attempt, response.headers.get("retry-after"))
+        if not _deadline_allows(delay):
+            return None
+        metrics.inc("llm_retries_total", reason=str(response.status_code))
+        return delay
+
+
+class ResilientTransport(_ResilienceMixin, httpx.BaseTransport):
+    """同步传输层：重试 + 熔断，包裹带连接池的 HTTPTransport"""
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy, breaker: CircuitBreaker):
+        self._transport = transport
+        self._init_resilience(policy, breaker)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            probe = self.breaker.before_request()
+            try:
+                _apply_deadline(request)
+                try:
+                    response = self._transport.handle_request(request)
+                except httpx.TransportError as e:
+                    delay = self._retry_after_error(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_after_response(response, attempt)
+                    if delay is None:
+                        return response
+                    response.close()
+            finally:
+                self.breaker.release_probe(probe)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncResilientTransport(_ResilienceMixin, httpx.AsyncBaseTransport):
+    """异步传输层：与 ResilientTransport 共享重试策略与熔断器"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy, breaker: CircuitBreaker):
+        self._transport = transport
+        self._init_resilience(policy, breaker)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            probe = self.breaker.before_request()
+            try:
+                _apply_deadline(request)
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except httpx.TransportError as e:
+                    delay = self._retry_after_error(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_after_response(response, attempt)
+                    if delay is None:
+                        return response
+                    await response.aclose()
+            finally:
+                self.breaker.release_probe(probe)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class LLMHttpPool:
+    """进程级共享的 keep-alive HTTP 客户端（同步 + 异步）"""
+
+    def __init__(self, settings):
+        self.limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(
+            connect=settings.llm_connect_timeout,
+            read=settings.llm_read_timeout,
+            write=settings.llm_write_timeout,
+            pool=settings.llm_pool_timeout,
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            reset_timeout=settings.llm_breaker_reset_timeout,
+        )
+        policy = RetryPolicy(
+            max_retries=settings.llm_max_retries,
+            backoff_base=settings.llm_backoff_base,
+            backoff_max=settings.llm_backoff_max,
+        )
+        self.client = httpx.Client(
+            transport=ResilientTransport(httpx.HTTPTransport(limits=self.limits), policy, self.breaker),
+            timeout=self.timeout,
+        )
+        self.async_client = httpx.AsyncClient(
+            transport=AsyncResilientTransport(httpx.AsyncHTTPTransport(limits=self.limits), policy, self.breaker),
+            timeout=self.timeout,
+        )
+
+    def collect(self) -> dict:
+        return self.breaker.collect()
+
+    async def aclose(self):
+        self.client.close()
+        await self.async_client.aclose()
+
+
+_pool: Optional[LLMHttpPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_http_pool(settings) -> LLMHttpPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMHttpPool(settings)
+            logger.info("LLM HTTP 连接池初始化成功")
+        return _pool
+
+
+def _collect_pool_metrics() -> dict:
+    pool = _pool
+    return pool.collect() if pool else {}
+
+
+metrics.register_collector(_collect_pool_metrics)
+
+
+async def close_http_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        await pool.aclose()
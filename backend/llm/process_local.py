@@ -0,0 +1,76 @@
+# llm/process_local.py
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field, PrivateAttr
+
+
+class ProcessLocalChatModel(BaseChatModel):
+    """每个进程首次调用时才用 factory 创建真正的模型
+
+    多进程服务在 fork 前构建工作流（节点、提示词模板、结构化输出链），由各 worker 以
+    写时复制方式共享；模型及其 HTTP 连接池、调度器不能跨进程共享，按进程 id 懒创建。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    factory: Callable[[], BaseChatModel] = Field(exclude=True)
+    _inner: Optional[BaseChatModel] = PrivateAttr(default=None)
+    _pid: Optional[int] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "process-local"
+
+    @property
+    def inner(self) -> BaseChatModel:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._inner, self._pid = self.factory(), pid
+        return self._inner
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.inner._generate(messages, stop, None, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await self.inner._agenerate(messages, stop, None, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # 经公开的 stream()：内层不支持流式（对冲、录制回放）时自动退回完整响应
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,222 @@
+# llm/scheduler.py
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field
+
+from config import DEFAULT_PRIORITY_CLASS, NODE_PRIORITY_CLASSES, PRIORITY_CLASS_LEVELS
+from metrics import metrics
+from request_context import DeadlineExceeded, current_deadline, current_node
+
+
+class _Ticket:
+    __slots__ = ("key", "priority_class", "enqueued_at")
+
+    def __init__(self, key, priority_class: str, enqueued_at: float):
+        self.key = key
+        self.priority_class = priority_class
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return self.key < other.key
+
+
+class LLMScheduler:
+    """全局 LLM 并发上限 + 按优先级出队
+
+    排序键 = 入队时间 / aging_seconds - 优先级：等待每满 aging_seconds，相当于提升一个优先级，
+    低优先级请求最多比后到的高优先级请求多等 (级差 × aging_seconds)，不会饿死。
+    所有等待者老化速度相同，键在入队时即可确定，堆无需重排。
+    """
+
+    def __init__(self, max_concurrency: int, aging_seconds: float = 5.0,
+                 class_levels: Optional[Dict[str, int]] = None,
+                 node_classes: Optional[Dict[str, str]] = None):
+        self.max_concurrency = max_concurrency
+        self.aging_seconds = aging_seconds
+        self.class_levels = class_levels or PRIORITY_CLASS_LEVELS
+        self.node_classes = {**NODE_PRIORITY_CLASSES, **(node_classes or {})}
+        self._cond = threading.Condition()
+        self._heap: List[_Ticket] = []
+        self._seq = itertools.count()
+        self.active = 0
+
+    def classify(self, node_id: Optional[str]) -> str:
+        return self.node_classes.get(node_id, DEFAULT_PRIORITY_CLASS)
+
+    def _try_grant(self, ticket: _Ticket) -> bool:
+        if self._heap and self._heap[0] is ticket and self.active < self.max_concurrency:
+            heapq.heappop(self._heap)
+            self.active += 1
+            # 后面的等待者可能也能拿到空闲槽位
+            self._cond.notify_all()
+            return True
+        return False
+
+    def acquire(self, priority_class: str, timeout: Optional[float] = None):
+        """阻塞直到拿到执行槽位；超时抛 TimeoutError"""
+        started = time.monotonic()
+        with self._cond:
+            if not self._heap and self.active < self.max_concurrency:
+                self.active += 1
+                metrics.observe("llm_scheduler_wait_seconds", 0.0, priority=priority_class)
+                return
+            level = self.class_levels.get(priority_class, 0)
+            ticket = _Ticket((started / self.aging_seconds - level, next(self._seq)), priority_class, started)
+            heapq.heappush(self._heap, ticket)
+            while not self._try_grant(ticket):
+                remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                if remaining is not None and remaining <= 0:
+                    self._heap.remove(ticket)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                    metrics.inc("llm_scheduler_timeouts_total", priority=priority_class)
+                    raise TimeoutError(f"Timed out waiting for an LLM slot ({priority_class})")
+                self._cond.wait(remaining)
+        metrics.observe("llm_scheduler_wait_seconds", time.monotonic() - started, priority=priority_class)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def _wait_timeout(self) -> Optional[float]:
+        deadline = current_deadline()
+        if deadline is None:
+            return None
+        deadline.check("llm queue")
+        return deadline.remaining()
+
+    def _on_timeout(self):
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.tripped = True
+        raise DeadlineExceeded("Deadline exceeded while queued for an LLM slot")
+
+    @contextmanager
+    def slot(self):
+        priority_class = self.classify(current_node())
+        try:
+            self.acquire(priority_class, self._wait_timeout())
+        except TimeoutError:
+            self._on_timeout()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        # 在线程中等待，避免阻塞事件循环；等待期间被取消时，拿到的槽位立即归还
+        priority_class = self.classify(current_node())
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self.acquire, priority_class, self._wait_timeout()
+        )
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(lambda f: f.exception() is None and self.release())
+            raise
+        except TimeoutError:
+            self._on_timeout()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def collect(self) -> dict:
+        with self._cond:
+            depth = {name: 0 for name in self.class_levels}
+            for ticket in self._heap:
+                depth[ticket.priority_class] = depth.get(ticket.priority_class, 0) + 1
+            active = self.active
+        gauges = {f"llm_scheduler_queue_depth{{priority={name}}}": count for name, count in depth.items()}
+        gauges["llm_scheduler_active"] = active
+        return gauges
+
+
+class ScheduledChatModel(BaseChatModel):
+    """每次调用先向 LLMScheduler 申请槽位，调用结束（含传输层重试）后归还"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    scheduler: Any = Field(default=None, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.inner._llm_type}"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with self.scheduler.slot():
+            return self.inner._generate(messages, stop, None, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with self.scheduler.aslot():
+            return await self.inner._agenerate(messages, stop, None, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # 流式输出期间一直占用槽位；调用方中途放弃时生成器关闭，槽位随之归还
+        with self.scheduler.slot():
+            yield from self.inner._stream(messages, stop, None, **kwargs)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with self.scheduler.aslot():
+            async for chunk in self.inner._astream(messages, stop, None, **kwargs):
+                yield chunk
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler(settings) -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_concurrency=settings.llm_max_concurrency,
+                aging_seconds=settings.llm_priority_aging_seconds,
+                node_classes=settings.node_priority_classes,
+            )
+        return _scheduler
+
+
+def _collect_scheduler_metrics() -> dict:
+    scheduler = _scheduler
+    return scheduler.collect() if scheduler else {}
+
+
+metrics.register_collector(_collect_scheduler_metrics)
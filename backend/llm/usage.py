@@ -0,0 +1,74 @@
+# llm/usage.py
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Type
+
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from loguru import logger
+
+from archive import conversation_stats
+from metrics import metrics
+from request_context import current_node, current_session
+
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """服务端返回的缓存命中 token 数：OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens"""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0)
+
+
+class TokenUsage:
+    """按节点累计输入 / 缓存命中 / 输出 token，导出各节点的缓存命中率"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {"prompt": 0, "cached": 0})
+
+    def record(self, usage: Optional[Dict[str, Any]], model: str):
+        if not usage:
+            return
+        node = current_node() or "-"
+        prompt = int(usage.get("prompt_tokens") or 0)
+        cached = cached_prompt_tokens(usage)
+        completion = int(usage.get("completion_tokens") or 0)
+        metrics.inc("llm_prompt_tokens_total", prompt, node=node, model=model)
+        metrics.inc("llm_cached_prompt_tokens_total", cached, node=node, model=model)
+        metrics.inc("llm_completion_tokens_total", completion, node=node, model=model)
+        with self._lock:
+            totals = self._totals[node]
+            totals["prompt"] += prompt
+            totals["cached"] += cached
+        conversation_stats.record_tokens(current_session(), prompt, cached, completion)
+        logger.debug(f"LLM usage: prompt={prompt} cached={cached} completion={completion} model={model}")
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {
+                f"llm_prompt_cache_hit_ratio{{node={node}}}": totals["cached"] / totals["prompt"]
+                for node, totals in self._totals.items() if totals["prompt"]
+            }
+
+
+token_usage = TokenUsage()
+metrics.register_collector(token_usage.collect)
+
+
+class UsageTrackingChatOpenAI(ChatOpenAI):
+    """在解析服务端响应时记录 usage（同步/异步路径都会经过 _create_chat_result，流式路径见下）
+
+    记录发生在真正访问网络的模型上：对冲的两路请求都计入，录制回放不计入。
+    """
+
+    def _create_chat_result(self, response, generation_info: Optional[Dict] = None) -> ChatResult:
+        result = super()._create_chat_result(response, generation_info)
+        llm_output = result.llm_output or {}
+        token_usage.record(llm_output.get("token_usage"), llm_output.get("model_name") or self.model_name)
+        return result
+
+    def _convert_chunk_to_generation_chunk(self, chunk: dict, default_chunk_class: Type,
+                                           base_generation_info: Optional[Dict]) -> Optional[ChatGenerationChunk]:
+        # 流式响应的 usage 在最后一个分块中（需 stream_usage）；response_format 流式时由最终结果记录
+        if chunk.get("usage"):
+            token_usage.record(chunk["usage"], chunk.get("model") or self.model_name)
+        return super()._convert_chunk_to_generation_chunk(chunk, default_chunk_class, base_generation_info)
@@ -0,0 +1,90 @@
+# logging_config.py
+import logging
+import os
+import random
+import sys
+
+from loguru import logger
+
+from request_context import current_node, current_session
+
+
+class InterceptHandler(logging.Handler):
+    """把标准库 logging（uvicorn、dependencies.py 等）转发到 loguru"""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        frame, depth = logging.currentframe(), 2
+        while frame and frame.f_code.co_filename == logging.__file__:
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+def _add_context(record):
+    # 每条日志带上会话关联 id 与当前节点
+    record["extra"].setdefault("session_id", current_session() or "-")
+    record["extra"].setdefault("node", current_node() or "-")
+
+
+_payload_sample_rate = 0.1
+_payload_max_chars = 2000
+_payload_min_level = 0  # 未调用 configure_logging 时沿用 loguru 默认输出，全部记录
+
+
+def log_payload(label: str, payload, level: str = "DEBUG"):
+    """记录大体积内容（LLM 输出、SQL 等）：按采样率记录截断后的全文，其余只记录长度
+
+    级别未开启时直接返回，不做字符串化；超过 max_chars 的字符串按长度成比例降低采样率；
+    只有抽中的内容才转换为字符串（未抽中的非字符串内容不记录长度）。
+    """
+    if logger.level(level).no < _payload_min_level:
+        return
+    size = len(payload) if isinstance(payload, str) else None
+    rate = _payload_sample_rate
+    if size is not None and size > _payload_max_chars:
+        rate *= _payload_max_chars / size
+    if random.random() < rate:
+        text = str(payload)
+        truncated = text if len(text) <= _payload_max_chars else text[:_payload_max_chars] + "...<truncated>"
+        logger.bind(payload_chars=len(text)).log(level, "{}: {}", label, truncated)
+    elif size is not None:
+        logger.bind(payload_chars=size).log(level, "{} ({} chars, not sampled)", label, size)
+    else:
+        logger.log(level, "{} (not sampled)", label)
+
+
+def configure_logging(settings):
+    """后台队列写入 JSON 行日志（按大小轮转并压缩），控制台只保留简洁输出"""
+    global _payload_sample_rate, _payload_max_chars, _payload_min_level
+    _payload_sample_rate = settings.log_payload_sample_rate
+    _payload_max_chars = settings.log_payload_max_chars
+    _payload_min_level = logger.level(settings.log_level).no
+
+    logger.remove()
+    logger.configure(patcher=_add_context)
+    if settings.log_console:
+        logger.add(
+            sys.stderr,
+            level=settings.log_level,
+            enqueue=True,
+            format="<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+                   "{extra[session_id]} | {extra[node]} | {message}",
+        )
+    os.makedirs(settings.log_dir, exist_ok=True)
+    logger.add(
+        os.path.join(settings.log_dir, "flight_ai.jsonl"),
+        level=settings.log_level,
+        serialize=True,
+        enqueue=True,
+        rotation=settings.log_rotation,
+        retention=settings.log_retention,
+        compression="gz",
+    )
+    # 根 logger 使用与 loguru sink 相同的级别，低于该级别的标准库日志在转发前就被丢弃
+    logging.basicConfig(handlers=[InterceptHandler()], level=logger.level(settings.log_level).no, force=True)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = [InterceptHandler()]
@@ -1,15 +1,28 @@
 # backend/main.py
+import asyncio
+from contextlib import contextmanager
 from datetime import datetime
-import os
+import hashlib
+import math
+import re
+import threading
 from uuid import uuid4
-from typing import Dict, Optional
-from fastapi import FastAPI, HTTPException, Request, Depends
+import anyio
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi import FastAPI, Header, HTTPException, Request, Response, Depends, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from langgraph.graph import END, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from checkpointer import SharedLogMemorySaver
 from langgraph.types import Command
 from IPython.display import Image, display
 from auth import get_current_user, router as auth_router
+from tickets import router as tickets_router
+from disruption import router as disruption_router
+from admission import AdmissionRejected, get_admission_controller
+from archive import CHANGE_CONFIRMED, HUMAN_ASSISTANT, ConversationArchiver
+from idempotency import IdempotencyInProgress, IdempotencyKeyMismatch, get_idempotency_cache
 
 from langgraph_nodes.restart_node import RestartNode
 from langgraph_nodes.confirmation_node import ConfirmationNode
@@ -19,22 +32,66 @@ from langgraph_nodes.await_input_node import AwaitingUserInputNode
 from langgraph_nodes.collect_info_node import InfoCollectionNode
 from langgraph_nodes.intent_detection_node import IntentDetectionNode
 from langgraph_nodes.search_node import SearchNode
-from schemas import Alternative_Found, Change_Confirmed, ChatRequest, ChatResponse, Flight_Change, MessageState, No_Alternative, Search_Alternative, Search_Flight
-from dependencies import get_llm
+from schemas import Alternative_Found, Change_Confirmed, ChatRequest, ChatResponse, Flight_Change, MessageState, No_Alternative, Search_Alternative, Search_Flight, track_phase
+from dependencies import get_llm, get_node_llms, get_settings
 from chains.response import create_final_chain
+from db import close_db_pool
+from llm import LLM_UNAVAILABLE_MESSAGE, RECORD, close_http_pool, find_circuit_open, get_cassette_store, get_http_pool
+from loguru import logger
+from logging_config import configure_logging
+from metrics import metrics
+from profiling import current_profile, profile_reason, profile_request
+from session_cache import get_session_cache
+from request_context import DeadlineExceeded, bind_node_context, new_deadline, session_scope
+from warmup import run_warmup, warmup_state
 
 app = FastAPI()
 app.include_router(auth_router)
-db_host = os.getenv("DB_HOST", "localhost")
-db_name = os.getenv("DB_NAME", "flight_ticket_db")
-db_user = os.getenv("DB_USER", "postgres")
-db_password = os.getenv("DB_PASSWORD", "")
-db_port = int(os.getenv("DB_PORT", 5432))
+app.include_router(tickets_router)
+app.include_router(disruption_router)
 
 @app.get("/")
 def read_root():
     return {"message": "Service is up!"}
 
+@app.get("/healthz")
+def healthz():
+    """存活检查：进程能响应即可，不依赖下游"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """就绪检查：预热完成且必需组件就绪前返回 503，负载均衡据此暂不导流"""
+    report = warmup_state.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
+
+@app.exception_handler(AdmissionRejected)
+def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, please retry later.", "reason": exc.reason},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(IdempotencyInProgress)
+def idempotency_in_progress_handler(request: Request, exc: IdempotencyInProgress):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "The same request is still being processed, please retry later."},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(IdempotencyKeyMismatch)
+def idempotency_key_mismatch_handler(request: Request, exc: IdempotencyKeyMismatch):
+    return JSONResponse(
+        status_code=422,
+        content={"detail": "The idempotency key was already used for a different request."}
+    )
+
 # CORS 配置
 app.add_middleware(
     CORSMiddleware,
@@ -44,40 +101,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+DEADLINE_MESSAGE = "This is taking longer than expected. Your progress has been saved, please send any message to continue."
+
 # 会话存储（生产环境建议使用 Redis）
 class SessionStore:
+    """会话状态；正在执行的轮次与归档线程互斥：归档中的会话，新一轮等待归档完成后再开始"""
+
     def __init__(self):
         self.sessions: Dict[str, dict] = {}
+        self._cond = threading.Condition()
+        self._active: Dict[str, int] = {}
+        self._archiving: set = set()
+
+    @contextmanager
+    def turn(self, session_id: str):
+        """一轮对话执行期间占用会话，归档线程不会认领"""
+        with self._cond:
+            self._cond.wait_for(lambda: session_id not in self._archiving)
+            self._active[session_id] = self._active.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if self._active[session_id] == 1:
+                    del self._active[session_id]
+                else:
+                    self._active[session_id] -= 1
+
+    def entries(self) -> List[Tuple[str, dict]]:
+        with self._cond:
+            return list(self.sessions.items())
+
+    def claim(self, session_id: str, entry: dict) -> bool:
+        """归档线程认领会话：状态未被更新且没有进行中的轮次时成功"""
+        with self._cond:
+            if self.sessions.get(session_id) is not entry or session_id in self._active:
+                return False
+            self._archiving.add(session_id)
+            return True
+
+    def release(self, session_ids: Iterable[str], remove: bool):
+        """结束认领；remove 时一并删除会话状态（已归档），否则保留（写入失败）"""
+        with self._cond:
+            for session_id in session_ids:
+                if remove:
+                    self.sessions.pop(session_id, None)
+                self._archiving.discard(session_id)
+            self._cond.notify_all()
 
     def get(self, session_id: str) -> Optional[MessageState]:
         if session_data := self.sessions.get(session_id):
             return MessageState(**session_data["state"])
         return None
 
-    def save(self, session_id: str, state: MessageState):
-        self.sessions[session_id] = {
+    def save(self, session_id: str, state: MessageState, pending: bool = False, outcome: Optional[str] = None):
+        # outcome：会话已走到 END（改签确认 / 转人工），由归档线程写出并释放
+        entry = {
             "state": state.dict(),
-            "timestamp": datetime.now()
+            "timestamp": datetime.now(),
+            "pending": pending,
+            "outcome": outcome
         }
+        with self._cond:
+            self.sessions[session_id] = entry
+
+    def is_pending(self, session_id: str) -> bool:
+        """上一轮因超时中断，图停在某个节点之前等待继续执行"""
+        return bool(self.sessions.get(session_id, {}).get("pending"))
 
 session_store = SessionStore()
 
-def create_workflow(llm):
+def create_workflow(llm, node_llms: Optional[Dict] = None, checkpointer=None, render_graph: bool = True):
     builder = StateGraph(MessageState)
-    memory = MemorySaver()
+    # 消息日志按引用保存在检查点中，每步只新增本步的消息
+    memory = checkpointer or SharedLogMemorySaver()
+    # 按节点选择模型，未配置的节点使用默认 llm
+    node_llms = node_llms or {}
+    def llm_for(node_id: str):
+        return node_llms.get(node_id, llm)
     # 添加节点
     nodes = {
-        "intent_detection_node": IntentDetectionNode(llm).process,
-        "search_node": SearchNode(llm).process,
-        "info_collection_node": InfoCollectionNode(llm).process,
+        "intent_detection_node": IntentDetectionNode(llm_for("intent_detection_node")).process,
+        "search_node": SearchNode(llm_for("search_node")).process,
+        "info_collection_node": InfoCollectionNode(llm_for("info_collection_node")).process,
         "awaiting_user_input": AwaitingUserInputNode().process,
-        "verification_node": VerificationNode(llm, db_host, db_name, db_user, db_password, db_port).process,
-        "alternative_ticket_node": AlternativeTicketNode(llm, db_host, db_name, db_user, db_password, db_port).process,
-        "confirmation_node": ConfirmationNode(llm).process,
+        "verification_node": VerificationNode(llm_for("verification_node")).process,
+        "alternative_ticket_node": AlternativeTicketNode(
+            llm_for("alternative_ticket_node"),
+            interpretation_llm=llm_for("alternative_interpretation")
+        ).process,
+        "confirmation_node": ConfirmationNode(llm_for("confirmation_node")).process,
         "restart_node": RestartNode().process
     }
     for node_id, node_func in nodes.items():
-        builder.add_node(node_id, node_func)
+        builder.add_node(node_id, bind_node_context(node_id, track_phase(node_func)))
 
     # 设置入口点
     builder.set_entry_point("intent_detection_node")
@@ -85,13 +202,12 @@ def create_workflow(llm):
     builder.add_edge("alternative_ticket_node", "awaiting_user_input")
     builder.add_edge("search_node", "restart_node")
     builder.add_edge("restart_node", "awaiting_user_input")
-    # 条件路由逻辑
+    # 条件路由逻辑：只读取节点维护的路由字段（phase / last_intent 等），不扫描消息历史
     def after_intent_detection(state: MessageState):
-        if state.messages[-1]["sender"] != "user":
+        if state.last_sender != "user":
             return "awaiting_user_input"
-        last_message = state.messages[-1] if state.messages else None
-        intent_info = last_message.get("intent_info", "") if last_message else ""
-        print(f"Intent Detection: {intent_info}")
+        intent_info = state.last_intent
+        logger.debug(f"Intent Detection: {intent_info}")
         if intent_info == Search_Flight:
             if state.missing_info:
                 return "info_collection_node"
@@ -108,8 +224,7 @@ def create_workflow(llm):
     )
     
     def info_collection_complete(state: MessageState):
-        last_message = state.messages[-1] if state.messages else None
-        intent_info = last_message.get("intent_info", "") if last_message else ""
+        intent_info = state.last_intent
         if not state.missing_info:
             if intent_info == Search_Flight:
                 return "search_node"
@@ -128,19 +243,10 @@ def create_workflow(llm):
     )
 
     def after_user_input_logic(state: MessageState):
-        last_sys_message = next(
-            (message for message in reversed(state.messages) if message.get('sender') in {'system', 'assistant'}),
-            None
-        )
-        last_user_message = next(
-            (message for message in reversed(state.messages) if message.get('sender') in {'user'}),
-            None
-        )
-        if last_sys_message:
-            intent_info = last_sys_message.get("intent_info", "")
-        if last_user_message:
-            user_message = last_user_message.get("content", "")
-            print(f"User Message: {user_message}")
+        # 最近一条系统回复的意图即当前阶段
+        intent_info = state.phase
+        user_message = state.last_user_message
+        logger.debug("User message received")
         if intent_info == Search_Flight or intent_info == Flight_Change and user_message != "Human Assistant":      
             # intent is to change flight or search for a flight
             if state.missing_info:
@@ -159,7 +265,7 @@ def create_workflow(llm):
             #when there is no alternative ticket found, return to get further user input
             return "verification_node"
         elif user_message == "Human Assistant":
-            print("===End of conversation===")
+            logger.info("End of conversation, handing over to human assistant")
             return END
         else:
             return "intent_detection_node"
@@ -178,8 +284,7 @@ def create_workflow(llm):
     )
 
     def after_confirmation(state: MessageState):
-        last_message = state.messages[-1] if state.messages else None
-        intent_info = last_message.get("intent_info", "") if last_message else ""
+        intent_info = state.last_intent
         if intent_info == Flight_Change:
             return "awaiting_user_input"
         elif intent_info == Change_Confirmed:
@@ -194,45 +299,116 @@ def create_workflow(llm):
     )
     
     workflow = builder.compile(checkpointer=memory)
+    # 节点实例供启动预热使用（渲染提示词模板等）
+    workflow.node_objects = {node_id: node_func.__self__ for node_id, node_func in nodes.items()}
+    if not render_graph:
+        return workflow
     try:
         graph = workflow.get_graph().draw_mermaid_png()
         with open("workflow_graph.png", "wb") as f:
             f.write(graph)
         display(Image(graph))
     except Exception:
-        print("Error drawing graph")
+        logger.warning("Error drawing graph")
     return workflow
 
-@app.post("/chat", response_model=ChatResponse)
+async def chat_admission(current_user: dict = Depends(get_current_user)):
+    """在事件循环上、进入线程池之前占用准入名额：执行中与排队中的请求已满时直接返回 429"""
+    with get_admission_controller(get_settings()).reserve(current_user["username"]):
+        yield
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(chat_admission)])
 def chat_endpoint(
     request: ChatRequest,
-    current_user: dict = Depends(get_current_user)  # 验证令牌
+    response: Response,
+    current_user: dict = Depends(get_current_user),  # 验证令牌
+    idempotency_key: Optional[str] = Header(default=None),
+    x_profile: Optional[str] = Header(default=None),
+    profile: bool = False
 ):
-    try:
+    def admitted_turn() -> ChatResponse:
         # 会话管理
         session_id = request.session_id or str(uuid4())
+        settings = get_settings()
+        admission = get_admission_controller(settings)
+        # 管理员显式请求（X-Profile 头或 ?profile=1）或按全局采样率抽中时，本轮在采样剖析下执行
+        reason = profile_reason(settings, profile or bool(x_profile), current_user["username"])
+        label = re.sub(r"[^A-Za-z0-9-]", "", session_id)[:36]
+        # 本轮所有日志（含节点内部）都带上会话 id，便于按会话检索；
+        # 准入失败（限流 / 等待超时）直接返回 429，不进入图执行；排队已满在 chat_admission 中已拒绝
+        with session_scope(session_id), admission.admit(current_user["username"], request.session_id):
+            with profile_request(settings, reason, label) as request_profile:
+                if request_profile is not None:
+                    response.headers["X-Profile-Id"] = request_profile.name
+                return run_chat_turn(session_id, request.message, "/chat")
+
+    key = idempotency_key or request.client_message_id
+    if not key:
+        return admitted_turn()
+    # 客户端重试：同一会话（首轮按用户）内相同的键直接返回已有结果，或等待正在执行的同一请求；
+    # 相同的键配上不同的消息内容时拒绝（422），不返回首个请求的结果
+    scope = (current_user["username"], request.session_id)
+    fingerprint = hashlib.sha256(request.message.encode()).hexdigest()
+    result, replayed = get_idempotency_cache(get_settings()).run(scope, key, admitted_turn, fingerprint)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def _run_graph(graph_input, config: dict, on_event: Optional[Callable[[dict], None]]) -> dict:
+    """执行工作流；提供 on_event 时逐节点推送进度事件，节点内的 LLM 输出也以流式事件推送"""
+    if (request_profile := current_profile()) is not None:
+        config["configurable"]["profile"] = request_profile
+    if on_event is None:
+        return app.state.workflow.invoke(graph_input, config=config)
+    config["configurable"]["on_event"] = on_event
+    for update in app.state.workflow.stream(graph_input, config=config, stream_mode="updates"):
+        for node in update:
+            if node != "__interrupt__":
+                on_event({"type": "node", "node": node})
+    return app.state.workflow.get_state({"configurable": {"thread_id": config["configurable"]["thread_id"]}}).values
+
+def run_chat_turn(session_id: str, message: str, endpoint: str,
+                  on_event: Optional[Callable[[dict], None]] = None) -> ChatResponse:
+    """执行一轮对话（/chat 与 /ws/chat 共用，MessageState 语义一致）；执行期间会话不会被归档"""
+    with session_store.turn(session_id):
+        return _chat_turn(session_id, message, endpoint, on_event)
+
+def _chat_turn(session_id: str, message: str, endpoint: str,
+               on_event: Optional[Callable[[dict], None]]) -> ChatResponse:
+    try:
+        # LLM 服务熔断时快速失败，不消耗本轮用户输入
+        if get_http_pool(get_settings()).breaker.is_open():
+            metrics.inc("chat_fast_fail_total", reason="circuit_open")
+            return ChatResponse(response=LLM_UNAVAILABLE_MESSAGE, session_id=session_id)
         state = session_store.get(session_id) or MessageState()
+        settings = get_settings()
+        deadline = new_deadline(endpoint, settings)
+        if settings.llm_cassette_mode == RECORD:
+            # 录制用户输入，离线回放时按原顺序重放整段对话
+            get_cassette_store(settings).record_turn(session_id, message, resumed=session_store.is_pending(session_id))
 
-        if not state.messages:
-            state = MessageState(
-                messages=[{
-                    "content": request.message,
-                    "sender": "user"
-                }],
-                collected_info={},
-                missing_info=[],
+        if session_store.is_pending(session_id):
+            # 上一轮超时：从最近的检查点继续执行，而不是重新提交用户消息
+            result = _run_graph(
+                None,
+                {"configurable": {"thread_id": session_id, "deadline": deadline}},
+                on_event
             )
-            result = app.state.workflow.invoke(
-                state.dict(),
-                config={"configurable": {"thread_id": session_id, "recursion_limit": 20}}
+        elif not state.messages:
+            result = _run_graph(
+                initial_state(message).dict(),
+                {"configurable": {"thread_id": session_id, "recursion_limit": 20, "deadline": deadline}},
+                on_event
             )
         else:
-            result = app.state.workflow.invoke(
-                Command(resume=request.message),
-                config={"configurable": {"thread_id": session_id}}
+            result = _run_graph(
+                Command(resume=message),
+                {"configurable": {"thread_id": session_id, "deadline": deadline}},
+                on_event
             )
         new_state = MessageState(**result)
-        session_store.save(session_id, new_state)
+        session_store.save(session_id, new_state,
+                           outcome=CHANGE_CONFIRMED if new_state.last_intent == Change_Confirmed else None)
         return ChatResponse(
             response=new_state.messages[-1]["content"],
             session_id=session_id,
@@ -240,21 +416,174 @@ def chat_endpoint(
         )
     except Exception as e:
         if isinstance(e, KeyError) and len(e.args) > 0 and e.args[0] == '__end__':
+            save_finished_state(session_id, HUMAN_ASSISTANT, message)
             return ChatResponse(response="A human assistant will be with you shortly.",
                 session_id=session_id)
+        elif isinstance(e, DeadlineExceeded):
+            metrics.inc("chat_deadline_exceeded_total")
+            return save_partial_response(session_id)
+        elif find_circuit_open(e):
+            metrics.inc("chat_fast_fail_total", reason="circuit_open")
+            return ChatResponse(response=LLM_UNAVAILABLE_MESSAGE, session_id=session_id)
         else:
-            print(f"Chat error: {str(e)}")
+            logger.opt(exception=e).error(f"Chat error: {str(e)}")
             raise HTTPException(500, detail=str(e))
-    
+
+@app.websocket("/ws/chat")
+async def chat_websocket(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    session_id: Optional[str] = None
+):
+    """长连接对话：连接时验证一次令牌并绑定会话，之后每条消息作为一轮对话执行
+
+    客户端发送 {"type": "message", "message": "..."} / {"type": "ping"}；
+    服务端推送 session、node（节点进度）、reply、error、ping/pong 事件，以及模型生成过程中的
+    field（intent_info 等路由字段完整到达）、delta（content 文本片段）、reset（重新询问，丢弃已收到的片段）；
+    最终以 reply 为准。
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = token or (authorization[7:] if authorization.lower().startswith("bearer ") else None)
+    try:
+        current_user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    session_id = session_id or str(uuid4())
+    settings = get_settings()
+    admission = get_admission_controller(settings)
+    loop = asyncio.get_running_loop()
+    metrics.inc("ws_connections_total")
+    try:
+        await websocket.send_json({"type": "session", "session_id": session_id})
+        last_activity = loop.time()
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_json(), settings.ws_heartbeat_interval)
+            except asyncio.TimeoutError:
+                if loop.time() - last_activity >= settings.ws_idle_timeout:
+                    await websocket.close(code=status.WS_1000_NORMAL_CLOSURE, reason="idle timeout")
+                    return
+                await websocket.send_json({"type": "ping"})
+                continue
+            except ValueError:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "invalid JSON"})
+                continue
+            if not isinstance(data, dict):
+                # 合法 JSON 但不是对象（[]、"hi"、1）同样按无效帧处理
+                await websocket.send_json({"type": "error", "status": 400, "detail": "invalid JSON"})
+                continue
+            last_activity = loop.time()
+            kind = data.get("type", "message")
+            if kind == "ping":
+                await websocket.send_json({"type": "pong"})
+                continue
+            if kind == "pong":
+                continue
+            if kind != "message" or not data.get("message"):
+                await websocket.send_json({"type": "error", "status": 400, "detail": "expected a message"})
+                continue
+
+            events: asyncio.Queue = asyncio.Queue()
+
+            def on_event(event: Optional[dict]):
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+            def turn(message: str) -> ChatResponse:
+                try:
+                    with session_scope(session_id), admission.admit(current_user["username"], session_id):
+                        return run_chat_turn(session_id, message, "/ws/chat", on_event)
+                finally:
+                    on_event(None)
+
+            try:
+                with admission.reserve(current_user["username"]):
+                    task = asyncio.ensure_future(run_in_threadpool(turn, data["message"]))
+                    while (event := await events.get()) is not None:
+                        await websocket.send_json(event)
+                    reply = await task
+            except AdmissionRejected as e:
+                await websocket.send_json({"type": "error", "status": 429, "detail": e.reason,
+                                           "retry_after": max(1, math.ceil(e.retry_after))})
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+            else:
+                await websocket.send_json({"type": "reply", **reply.dict()})
+            last_activity = loop.time()
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
+
+def initial_state(message: str) -> MessageState:
+    """新会话首轮的输入状态（离线回放与基准也用它构造首轮，保证与线上一致）"""
+    return MessageState(
+        messages=[{
+            "content": message,
+            "sender": "user"
+        }],
+        collected_info={},
+        missing_info=[],
+    )
+
+def save_partial_response(session_id: str) -> ChatResponse:
+    """超时时保存已完成节点的状态，返回可继续的部分响应"""
+    snapshot = app.state.workflow.get_state({"configurable": {"thread_id": session_id}})
+    partial_state = MessageState(**snapshot.values) if snapshot.values else MessageState()
+    session_store.save(session_id, partial_state, pending=bool(snapshot.next))
+    return ChatResponse(response=DEADLINE_MESSAGE, session_id=session_id)
+
+def save_finished_state(session_id: str, outcome: str, message: str):
+    """会话转人工结束：最近检查点的状态加上触发结束的用户消息，标记结果后等待归档"""
+    snapshot = app.state.workflow.get_state({"configurable": {"thread_id": session_id}})
+    previous = session_store.get(session_id)
+    values = snapshot.values or (previous.dict() if previous else {})
+    messages = [*values.get("messages", []), {"content": message, "sender": "user"}]
+    session_store.save(session_id, MessageState(**{**values, "messages": messages}), outcome=outcome)
+
+def init_app_state(llm, node_llms: Dict, render_graph: bool = True):
+    """构建工作流与最终回复链；多进程基准服务（benchmarks/prefork_server.py）在 fork 前调用，worker 启动时直接使用"""
+    app.state.llm = llm
+    app.state.node_llms = node_llms
+    app.state.workflow = create_workflow(llm, node_llms, render_graph=render_graph)
+    app.state.response_chain = create_final_chain(llm)
+
 @app.on_event("startup")
 async def startup_event():
+    configure_logging(get_settings())
     from fastapi.routing import APIRoute
     for route in app.routes:
         if hasattr(route, "path"):
-            print(f"Path: {route.path}, Methods: {route.methods}")
-    app.state.llm = get_llm()
-    app.state.workflow = create_workflow(app.state.llm)
-    app.state.response_chain = create_final_chain(app.state.llm)
+            logger.debug(f"Path: {route.path}, Methods: {getattr(route, 'methods', None)}")
+    if getattr(app.state, "workflow", None) is None:
+        init_app_state(get_llm(), get_node_llms())
+    # 同步端点共用 anyio 的默认线程池：已准入（执行中 + 排队中）的对话请求都要有线程可用
+    settings = get_settings()
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    required = settings.chat_max_in_flight + settings.chat_max_queue + settings.chat_threadpool_headroom
+    if limiter.total_tokens < required:
+        logger.info(f"Raising threadpool size from {limiter.total_tokens} to {required} for chat admission")
+        limiter.total_tokens = required
+    # 预热在后台线程中执行，/healthz 立即可用，/readyz 在预热完成后才返回 200
+    warmup_context = {"prompt_owners": [*app.state.workflow.node_objects.values(), app.state.response_chain]}
+    app.state.warmup_stop = threading.Event()
+    app.state.warmup_task = asyncio.create_task(
+        asyncio.to_thread(run_warmup, get_settings(), warmup_context, app.state.warmup_stop))
+    # 后台归档线程在启动时创建（多进程服务中每个 worker 各自一个）
+    if settings.archive_interval_seconds > 0:
+        app.state.archiver = ConversationArchiver(settings, session_store, app.state.workflow.checkpointer,
+                                                  get_session_cache(settings))
+        app.state.archiver.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if (warmup_stop := getattr(app.state, "warmup_stop", None)) is not None:
+        # 停止后台的预热重试
+        warmup_stop.set()
+    if (archiver := getattr(app.state, "archiver", None)) is not None:
+        # 进程退出前把内存中的会话全部写出
+        await asyncio.to_thread(archiver.stop)
+    await close_http_pool()
+    close_db_pool()
 
 if __name__ == "__main__":
     import uvicorn
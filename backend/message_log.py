@@ -0,0 +1,192 @@
+# message_log.py
+from dataclasses import dataclass, fields
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic_core import core_schema
+
+
+@dataclass(frozen=True, slots=True)
+class MessageRecord:
+    """紧凑、不可变的单条消息；兼容原先 dict 的读取方式（msg["sender"] / msg.get(...)）"""
+    content: Any = ""
+    sender: str = "system"
+    intent_info: Optional[str] = None
+    missing_info: Optional[Tuple[str, ...]] = None
+    flight_url: Optional[str] = None
+
+    @classmethod
+    def from_value(cls, value) -> "MessageRecord":
+        if isinstance(value, MessageRecord):
+            return value
+        if hasattr(value, "to_dict"):
+            value = value.to_dict()
+        missing_info = value.get("missing_info")
+        return cls(
+            content=value.get("content", ""),
+            sender=value.get("sender", "system"),
+            intent_info=value.get("intent_info"),
+            missing_info=tuple(missing_info) if missing_info is not None else None,
+            flight_url=value.get("flight_url"),
+        )
+
+    def to_dict(self) -> dict:
+        data = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value is not None:
+                data[field.name] = list(value) if field.name == "missing_info" else value
+        return data
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in _RECORD_FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __repr__(self) -> str:
+        # 与原 dict 的 repr 保持一致，提示词中的对话历史格式不变
+        return repr(self.to_dict())
+
+
+_RECORD_FIELDS = frozenset(f.name for f in fields(MessageRecord))
+
+
+class MessageLog(Sequence):
+    """只追加、结构共享的消息日志
+
+    每次追加只新建一个指向旧日志的节点，旧版本（检查点、会话快照）与新版本共享前缀，
+    追加代价与历史长度无关。链过深时合并为单个节点，保证遍历与索引开销有界。
+    """
+
+    __slots__ = ("_parent", "_entries", "_length", "_depth")
+    MAX_DEPTH = 32
+
+    def __init__(self, entries: Iterable = (), parent: Optional["MessageLog"] = None):
+        if parent is not None and not len(parent):
+            parent = None
+        self._parent = parent
+        self._entries: Tuple[MessageRecord, ...] = tuple(MessageRecord.from_value(e) for e in entries)
+        self._length = len(self._entries) + (len(parent) if parent is not None else 0)
+        self._depth = parent._depth + 1 if parent is not None else 0
+
+    @classmethod
+    def coerce(cls, value) -> "MessageLog":
+        if isinstance(value, MessageLog):
+            return value
+        return cls(value or ())
+
+    def concat(self, items: Iterable) -> "MessageLog":
+        """返回追加了 items 的新日志（自身不变）"""
+        items = tuple(items)
+        if not items:
+            return self
+        if self._depth >= self.MAX_DEPTH:
+            return MessageLog(tuple(self) + items)
+        return MessageLog(items, parent=self)
+
+    def extends(self, other: "MessageLog") -> bool:
+        """self 是否由 other 追加而来（共享同一前缀对象）"""
+        node = self
+        while node is not None:
+            if node is other:
+                return True
+            if len(node) < len(other):
+                return False
+            node = node._parent
+        return False
+
+    def copy(self) -> "MessageLog":
+        return self
+
+    def _chain(self) -> List["MessageLog"]:
+        chain, node = [], self
+        while node is not None:
+            chain.append(node)
+            node = node._parent
+        chain.reverse()
+        return chain
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        for node in self._chain():
+            yield from node._entries
+
+    def __reversed__(self) -> Iterator[MessageRecord]:
+        node = self
+        while node is not None:
+            yield from reversed(node._entries)
+            node = node._parent
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1 and start >= self._length - len(self._entries):
+                offset = self._length - len(self._entries)
+                return list(self._entries[start - offset:stop - offset])
+            return list(self)[index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("MessageLog index out of range")
+        node = self
+        while True:
+            offset = node._length - len(node._entries)
+            if index >= offset:
+                return node._entries[index - offset]
+            node = node._parent
+
+    def __add__(self, other) -> "MessageLog":
+        return self.concat(other)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (MessageLog, list, tuple)):
+            return len(self) == len(other) and all(
+                MessageRecord.from_value(b) == a for a, b in zip(self, other)
+            )
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def to_list(self) -> List[dict]:
+        return [record.to_dict() for record in self]
+
+    def _asdict(self) -> dict:
+        # LangGraph 序列化器按 namedtuple 协议处理：MessageLog(entries=[...])
+        return {"entries": self.to_list()}
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls.coerce,
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda log: log.to_list()),
+        )
+
+
+def append_messages(left, right) -> MessageLog:
+    """MessageState.messages 的 LangGraph reducer：节点只返回新增消息"""
+    left = MessageLog.coerce(left)
+    if right is None:
+        return left
+    if isinstance(right, MessageLog):
+        # 兼容返回完整历史的节点：若 right 由 left 追加而来，直接采用
+        if right.extends(left):
+            return right
+        if not len(left):
+            return right
+        return left.concat(right)
+    if isinstance(right, (dict, MessageRecord)) or hasattr(right, "to_dict"):
+        right = [right]
+    return left.concat(right)
@@ -0,0 +1,56 @@
+# metrics.py
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """进程内指标注册表（计数器 / 仪表 / 摘要），通过 /metrics 暴露"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """注册在导出时才计算的指标（例如熔断器状态）"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {k: dict(v) for k, v in self._summaries.items()}
+            collectors = list(self._collectors)
+        for collector in collectors:
+            gauges.update(collector())
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+
+metrics = MetricsRegistry()
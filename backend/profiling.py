@@ -0,0 +1,199 @@
+# profiling.py
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from metrics import metrics
+
+Frame = Tuple[str, str, int]  # (函数名, 文件, 定义行号)
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _short_path(path: str) -> str:
+    """本项目文件显示相对路径，第三方库从 site-packages 之后开始显示"""
+    if path.startswith(_BACKEND_DIR):
+        return os.path.relpath(path, _BACKEND_DIR)
+    marker = "site-packages" + os.sep
+    return path.split(marker, 1)[1] if marker in path else path
+
+
+class RequestProfile:
+    """单个请求的采样剖析：后台线程按固定间隔抓取被登记线程的调用栈
+
+    请求线程在开始时登记；LangGraph 在其他线程执行节点时，节点包装器也会登记该线程。
+    采样只读取 sys._current_frames()，不设置 trace 钩子，被剖析代码本身不变慢。
+    """
+
+    def __init__(self, name: str, reason: str, interval: float):
+        self.name = name
+        self.reason = reason
+        self.interval = interval
+        self.frames: Dict[Frame, int] = {}
+        self.samples: List[Tuple[int, ...]] = []
+        self.weights: List[float] = []
+        self.node_timings: List[Dict] = []
+        self._threads = {threading.get_ident()}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{name}", daemon=True)
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_thread(self, ident: int):
+        with self._lock:
+            self._threads.add(ident)
+
+    def record_node(self, node: str, started: float, seconds: float):
+        with self._lock:
+            self.node_timings.append({"node": node, "start": started - self.started_at, "seconds": seconds})
+
+    def _frame_index(self, frame: Frame) -> int:
+        index = self.frames.get(frame)
+        if index is None:
+            index = self.frames[frame] = len(self.frames)
+        return index
+
+    def _run(self):
+        previous = time.perf_counter()
+        sampler = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            with self._lock:
+                threads = set(self._threads)
+            for ident, frame in sys._current_frames().items():
+                if ident not in threads or ident == sampler:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(self._frame_index((code.co_name, code.co_filename, code.co_firstlineno)))
+                    frame = frame.f_back
+                self.samples.append(tuple(reversed(stack)))
+                self.weights.append(now - previous)
+            previous = now
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _frame_name(self, frame: Frame) -> str:
+        name, path, line = frame
+        return f"{name} ({_short_path(path)}:{line})"
+
+    def speedscope(self) -> dict:
+        """speedscope 文件格式（https://www.speedscope.app 直接打开，按时间顺序或火焰图查看）"""
+        frames = sorted(self.frames, key=self.frames.get)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name, "file": _short_path(path), "line": line} for name, path, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": [list(stack) for stack in self.samples],
+                "weights": self.weights,
+            }],
+            "name": self.name,
+            "exporter": "flight-ticket-backend profiling.py",
+        }
+
+    def folded(self) -> str:
+        """折叠栈格式（flamegraph.pl / inferno 输入），每行：栈;…;叶 权重（微秒）"""
+        frames = sorted(self.frames, key=self.frames.get)
+        totals: Counter = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            totals[";".join(self._frame_name(frames[i]) for i in stack)] += weight
+        return "".join(f"{stack} {round(weight * 1e6)}\n" for stack, weight in totals.most_common())
+
+    def summary(self, top: int = 20) -> dict:
+        """各节点耗时与采样中最常出现在栈顶的函数（自身耗时）"""
+        frames = sorted(self.frames, key=self.frames.get)
+        leaf: Counter = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            if stack:
+                leaf[stack[-1]] += weight
+        sampled = sum(self.weights) or 1.0
+        per_node: Dict[str, float] = {}
+        for timing in self.node_timings:
+            per_node[timing["node"]] = per_node.get(timing["node"], 0.0) + timing["seconds"]
+        return {
+            "name": self.name,
+            "reason": self.reason,
+            "elapsed_seconds": self.elapsed,
+            "samples": len(self.samples),
+            "interval_seconds": self.interval,
+            "nodes": self.node_timings,
+            "node_totals": dict(sorted(per_node.items(), key=lambda item: -item[1])),
+            "graph_overhead_seconds": max(0.0, self.elapsed - sum(per_node.values())),
+            "top_self": [
+                {"frame": self._frame_name(frames[index]), "seconds": weight, "share": weight / sampled}
+                for index, weight in leaf.most_common(top)
+            ],
+        }
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name)
+        with open(f"{base}.speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f)
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        with open(f"{base}.summary.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return base
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def profile_reason(settings, requested: bool, username: str) -> Optional[str]:
+    """本次请求是否剖析：管理员显式请求，或按全局采样率抽样"""
+    if requested:
+        if username in settings.profile_admin_users:
+            return "requested"
+        logger.warning(f"Ignoring profiling request from non-admin user {username}")
+    if settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate:
+        return "sampled"
+    return None
+
+
+@contextmanager
+def profile_request(settings, reason: Optional[str], label: str):
+    """在剖析模式下执行请求，结束后把 speedscope / 折叠栈 / 节点耗时写入 settings.profile_dir"""
+    if reason is None:
+        yield None
+        return
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label}"
+    profile = RequestProfile(name, reason, settings.profile_interval_ms / 1000)
+    token = _current_profile.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _current_profile.reset(token)
+        try:
+            base = profile.save(settings.profile_dir)
+            metrics.inc("profiles_captured_total", reason=reason)
+            logger.info(f"Request profile ({reason}, {profile.elapsed:.2f}s, {len(profile.samples)} samples) saved to {base}.*")
+        except OSError as e:
+            logger.error(f"Failed to save request profile {name}: {e}")
@@ -0,0 +1,19 @@
+# prompt_layout.py
+from typing import Sequence, Tuple
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+
+def layered_prompt(instructions: str, sections: Sequence[Tuple[str, str]], closing: str = "") -> ChatPromptTemplate:
+    """静态指令在前、会话数据在后的提示词
+
+    OpenAI 兼容服务端的提示词缓存按前缀匹配：instructions（角色、规则、表结构、输出格式）
+    作为 system 消息原样发送，不做变量替换，所有会话逐字相同，可以命中缓存；
+    sections 为 (标题, 变量名)，依次放进最后一条 user 消息；closing 追加在其后，可以包含变量。
+    instructions 中的花括号按普通文本发送，无需转义。
+    """
+    body = "\n\n".join(f"# {title}:\n{{{variable}}}" for title, variable in sections)
+    if closing:
+        body = f"{body}\n\n{closing}"
+    return ChatPromptTemplate.from_messages([SystemMessage(content=instructions), ("human", body)])
@@ -0,0 +1,191 @@
+# ranking.py
+import datetime
+from dataclasses import dataclass, field as dataclass_field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 排序准则及默认权重；用户明确强调的准则由 SQL 生成时输出的 priorities 覆盖（0 表示不考虑）
+CRITERIA = ("price", "departure_time", "date", "airline", "return_leg")
+DEFAULT_WEIGHTS = {"price": 1.0, "departure_time": 1.0, "date": 1.0, "airline": 0.5, "return_leg": 0.5}
+# 日期差达到该天数时惩罚为 0.5（d / (d + scale)，越远越接近 1）
+DATE_SCALE_DAYS = 3.0
+
+
+@dataclass
+class RankedAlternative:
+    """排序结果：score 为 0~1 的匹配度（越高越好），penalties / explanations 按准则给出"""
+    row: Dict[str, Any]
+    score: float
+    penalties: Dict[str, float] = dataclass_field(default_factory=dict)
+    explanations: Dict[str, str] = dataclass_field(default_factory=dict)
+
+    def to_prompt(self) -> Dict[str, Any]:
+        return {"score": round(self.score, 3), "why": self.explanations,
+                "ticket": {k: str(v) for k, v in self.row.items() if v is not None}}
+
+
+def _column(columns: Sequence[str], table: List[Sequence], name: str) -> Optional[Sequence]:
+    return table[columns.index(name)] if name in columns else None
+
+
+def _numbers(values: Sequence) -> np.ndarray:
+    return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=float, count=len(values))
+
+
+def _minutes(values: Sequence) -> np.ndarray:
+    """TIME 列（datetime.time 或 "HH:MM[:SS]" 文本）→ 当日分钟数，无法识别为 NaN"""
+    def convert(v):
+        if isinstance(v, datetime.time):
+            return v.hour * 60 + v.minute
+        if isinstance(v, str) and len(v) >= 5 and v[2] == ":":
+            return int(v[:2]) * 60 + int(v[3:5])
+        return np.nan
+    return np.fromiter((convert(v) for v in values), dtype=float, count=len(values))
+
+
+def _days(values: Sequence) -> np.ndarray:
+    """DDMMYYYY 文本列 → 自 1970-01-01 起的天数，整列按字符向量化解析，非法值为 NaN"""
+    text = np.asarray(values, dtype="U8")
+    digits = text.view(np.uint32).reshape(-1, 8).astype(np.int64) - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    digits = np.where(valid[:, None], digits, 0)
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & (year >= 1970)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    dates = months.astype("datetime64[D]") + np.where(valid, day - 1, 0)
+    return np.where(valid, dates.astype(np.int64), np.nan)
+
+
+def _scalar_days(value) -> float:
+    return float(_days([value or ""])[0])
+
+
+def _scalar_minutes(value) -> float:
+    return float(_minutes([value])[0])
+
+
+def _signed(value: float, unit: str) -> str:
+    return f"{value:+.0f} {unit}"
+
+
+def _shift_text(minutes: float) -> str:
+    if minutes == 0:
+        return "same departure time"
+    hours, mins = divmod(abs(int(minutes)), 60)
+    return f"departs {hours}h{mins:02d}m {'later' if minutes > 0 else 'earlier'}"
+
+
+def _price_text(diff: float) -> str:
+    if diff == 0:
+        return "same price"
+    return f"${abs(diff):,.2f} {'cheaper' if diff < 0 else 'more expensive'}"
+
+
+def rank_alternatives(columns: Sequence[str], rows: Sequence[Sequence], original: Dict[str, Any],
+                      priorities: Optional[Dict[str, float]] = None, top_k: int = 3) -> List[RankedAlternative]:
+    """按多准则为备选航班打分并返回前 top_k 个（最优在前）
+
+    每个准则按列向量化计算 0~1 的惩罚（未知值按最差计）：
+      price           与原票的差价 / 原票价，便宜为负，截断到 [-1, 1] 后映射到 [0, 1]
+      departure_time  与原出发时刻的差（按 24 小时循环），12 小时为 1
+      date            与原出发日期相差的天数，d / (d + DATE_SCALE_DAYS)
+      airline         航司代码（航班号前两位）不同为 1
+      return_leg      原票有返程时：返程日期差（同上）与返程机场是否一致各占一半，缺少返程为 1
+    结果集中没有的列、原票中没有的值对应的准则不参与计算。总惩罚为加权平均，score = 1 - 总惩罚。
+    """
+    if not rows:
+        return []
+    columns = list(columns)
+    table = list(zip(*rows))
+    count = len(rows)
+    weights = dict(DEFAULT_WEIGHTS)
+    for name, weight in (priorities or {}).items():
+        if name in weights:
+            weights[name] = max(0.0, float(weight))
+
+    penalties: Dict[str, np.ndarray] = {}
+    details: Dict[str, np.ndarray] = {}
+
+    prices = _column(columns, table, "price_usd")
+    original_price = original.get("price_usd")
+    if prices is not None and original_price is not None:
+        diff = _numbers(prices) - float(original_price)
+        ratio = np.clip(diff / max(float(original_price), 1.0), -1.0, 1.0)
+        penalties["price"] = np.where(np.isnan(diff), 1.0, (ratio + 1) / 2)
+        details["price"] = diff
+
+    times = _column(columns, table, "departure_time")
+    original_time = _scalar_minutes(original.get("departure_time"))
+    if times is not None and not np.isnan(original_time):
+        shift = _minutes(times) - original_time
+        circular = np.minimum(np.abs(shift), 1440 - np.abs(shift))
+        penalties["departure_time"] = np.where(np.isnan(shift), 1.0, circular / 720)
+        details["departure_time"] = shift
+
+    dates = _column(columns, table, "departure_date")
+    original_day = _scalar_days(original.get("departure_date"))
+    if dates is not None and not np.isnan(original_day):
+        delta = _days(dates) - original_day
+        distance = np.abs(delta)
+        penalties["date"] = np.where(np.isnan(delta), 1.0, distance / (distance + DATE_SCALE_DAYS))
+        details["date"] = delta
+
+    airlines = _column(columns, table, "airline_code")
+    if airlines is not None and original.get("airline_code"):
+        # airline_code 存的是航班号（如 LH824），按前两位航司代码比较
+        same = np.asarray(airlines, dtype="U2") == str(original["airline_code"])[:2]
+        penalties["airline"] = np.where(same, 0.0, 1.0)
+        details["airline"] = same
+
+    return_dates = _column(columns, table, "return_date")
+    original_return = _scalar_days(original.get("return_date"))
+    if return_dates is not None and not np.isnan(original_return):
+        delta = _days(return_dates) - original_return
+        distance = np.abs(delta)
+        date_penalty = np.where(np.isnan(delta), 1.0, distance / (distance + DATE_SCALE_DAYS))
+        airport_penalty = np.zeros(count)
+        for name in ("return_departure_airport", "return_arrival_airport"):
+            airports = _column(columns, table, name)
+            if airports is not None and original.get(name):
+                airport_penalty += 0.5 * (np.asarray(airports, dtype=object) != original[name])
+        penalties["return_leg"] = np.where(np.isnan(delta), 1.0, (date_penalty + airport_penalty) / 2)
+        details["return_leg"] = delta
+
+    active = [name for name in CRITERIA if name in penalties and weights[name] > 0]
+    total_weight = sum(weights[name] for name in active)
+    if total_weight:
+        cost = sum(weights[name] * penalties[name] for name in active) / total_weight
+    else:
+        cost = np.zeros(count)
+
+    top_k = min(top_k, count)
+    candidates = np.argpartition(cost, top_k - 1)[:top_k] if top_k < count else np.arange(count)
+    order = candidates[np.lexsort((candidates, cost[candidates]))]
+
+    ranked = []
+    for index in order:
+        explanations = {}
+        for name in active:
+            value = details[name][index]
+            if name == "airline":
+                explanations[name] = "same airline" if value else "different airline"
+            elif isinstance(value, float) and np.isnan(value):
+                explanations[name] = "unknown"
+            elif name == "price":
+                explanations[name] = _price_text(value)
+            elif name == "departure_time":
+                explanations[name] = _shift_text(value)
+            elif name == "date":
+                explanations[name] = "same date" if value == 0 else _signed(value, "day(s)")
+            else:
+                explanations[name] = "same return date" if value == 0 else f"return {_signed(value, 'day(s)')}"
+        ranked.append(RankedAlternative(
+            row=dict(zip(columns, rows[index])),
+            score=float(1 - cost[index]),
+            penalties={name: float(penalties[name][index]) for name in active},
+            explanations=explanations,
+        ))
+    return ranked
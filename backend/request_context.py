@@ -0,0 +1,127 @@
+# request_context.py
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+from archive import conversation_stats
+from metrics import metrics
+
+
+class DeadlineExceeded(Exception):
+    """本轮请求的时间预算已耗尽"""
+
+
+class Deadline:
+    """单次请求的端到端时间预算，经 LangGraph config 传递给每个节点"""
+
+    def __init__(self, budget: float, low_watermark: float = 0.0):
+        self.budget = budget
+        self.low_watermark = low_watermark
+        self.expires_at = time.monotonic() + budget
+        self.tripped = False
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def is_low(self) -> bool:
+        """剩余预算不足以再做可选的 LLM 调用"""
+        return self.remaining() < self.low_watermark
+
+    def check(self, where: str = ""):
+        if self.expired:
+            self.tripped = True
+            raise DeadlineExceeded(f"Deadline of {self.budget:.1f}s exceeded at {where or 'unknown step'}")
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+_current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+_current_session: ContextVar[Optional[str]] = ContextVar("current_session", default=None)
+_current_event_sink: ContextVar[Optional[Callable[[dict], None]]] = ContextVar("current_event_sink", default=None)
+
+
+def new_deadline(endpoint: str, settings) -> Deadline:
+    """按端点取预算（未单独配置时使用全局值）"""
+    budget = settings.endpoint_deadlines.get(endpoint, settings.request_deadline_seconds)
+    return Deadline(budget, low_watermark=settings.optional_llm_min_budget)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def current_node() -> Optional[str]:
+    return _current_node.get()
+
+
+def current_session() -> Optional[str]:
+    return _current_session.get()
+
+
+def current_event_sink() -> Optional[Callable[[dict], None]]:
+    """流式客户端（/ws/chat）的事件回调；普通请求为 None"""
+    return _current_event_sink.get()
+
+
+def budget_is_low() -> bool:
+    deadline = current_deadline()
+    return deadline is not None and deadline.is_low()
+
+
+@contextmanager
+def session_scope(session_id: Optional[str]):
+    """请求级关联 id：节点之外（如 chat_endpoint）的日志也能带上会话 id"""
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+@contextmanager
+def node_scope(node_id: str, config: Optional[RunnableConfig]):
+    configurable = (config or {}).get("configurable", {})
+    deadline = configurable.get("deadline")
+    deadline_token = _current_deadline.set(deadline)
+    node_token = _current_node.set(node_id)
+    session_token = _current_session.set(configurable.get("thread_id"))
+    sink_token = _current_event_sink.set(configurable.get("on_event"))
+    try:
+        if deadline is not None:
+            deadline.check(node_id)
+        yield deadline
+    finally:
+        _current_event_sink.reset(sink_token)
+        _current_session.reset(session_token)
+        _current_node.reset(node_token)
+        _current_deadline.reset(deadline_token)
+
+
+def bind_node_context(node_id: str, func):
+    """包装节点函数：进入节点前检查预算，并让 LLM/DB 调用可见当前预算"""
+    def run(state, config: RunnableConfig):
+        started = time.perf_counter()
+        configurable = (config or {}).get("configurable", {})
+        profile = configurable.get("profile")
+        if profile is not None:
+            # 剖析中的请求：节点可能在线程池中执行，登记当前线程以便采样
+            profile.add_thread(threading.get_ident())
+        with node_scope(node_id, config) as deadline:
+            result = func(state)
+            if deadline is not None and deadline.tripped:
+                # 节点内部吞掉了超时异常，丢弃本次结果，恢复时重新执行该节点
+                raise DeadlineExceeded(f"Deadline exceeded inside {node_id}")
+        elapsed = time.perf_counter() - started
+        metrics.observe("graph_node_seconds", elapsed, node=node_id)
+        conversation_stats.record_node(configurable.get("thread_id"), node_id, elapsed)
+        if profile is not None:
+            profile.record_node(node_id, started, elapsed)
+        return result
+    run.__name__ = node_id
+    return run
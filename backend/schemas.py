@@ -1,9 +1,10 @@
 #schemas.py
 from datetime import date
-from typing import Any, Dict, List, Optional, Union, Literal
+from typing import Annotated, Any, Dict, List, Optional, Union, Literal
 from uuid import uuid4
 from loguru import logger
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+from message_log import MessageLog, append_messages
 
 class ChatMessage(BaseModel):
     sender: str  # "user" | "assistant"
@@ -12,12 +13,36 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id:  Optional[str] = None
+    client_message_id: Optional[str] = None  # 客户端重试时保持不变，作用同 Idempotency-Key
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     flight_url: str | None = None
 
+class TicketTriple(BaseModel):
+    ticket_number: str
+    passenger_birthday: str  # ddmmyyyy
+    passenger_name: str
+
+class BatchVerifyRequest(BaseModel):
+    tickets: List[TicketTriple]
+
+class DisruptionRequest(BaseModel):
+    airline_code: str        # 受影响航班，例如 LH726
+    departure_date: str      # ddmmyyyy
+    max_alternatives: int = Field(default=3, ge=1, le=10)
+    window_days: Optional[int] = Field(default=None, ge=0)
+
+class DisruptionResult(BaseModel):
+    airline_code: str
+    departure_date: str
+    affected_tickets: int
+    tickets_with_proposals: int
+    proposals: int
+    seconds: float
+    tickets_per_second: float
+
 class BaseMessage(BaseModel):
     content: str
     sender: str = "system"
@@ -33,7 +58,7 @@ Change_Confirmed = "change_confirmed"
 Other_Intent = "other"
 
 class FlightMessage(BaseMessage):
-    intent_info: Literal["search_flight", "flight_change", "search_alternative", "alternative_found", "no_alternative", "change_confirmed" "other"] = Other_Intent
+    intent_info: Literal["search_flight", "flight_change", "search_alternative", "alternative_found", "no_alternative", "change_confirmed", "other"] = Other_Intent
     missing_info: List[str] = []
     flight_url: Optional[str] = None 
 
@@ -44,10 +69,91 @@ class GeneralMessage(BaseMessage):
 # 联合类型（按需选择一种方案）
 MessageType = Union[FlightMessage, GeneralMessage]
 
+# 节点的结构化输出：声明字段与取值范围，用于服务端 JSON Schema 约束与本地校验
+class IntentOutput(FlightMessage):
+    intent_info: Literal["search_flight", "flight_change", "other"] = Other_Intent
+
+class InfoCollectionOutput(BaseModel):
+    collected_info: Dict[str, Any] = {}
+    missing_info: List[str] = []
+    response: str = ""
+
+class VerificationOutput(GeneralMessage):
+    intent_info: Literal["flight_change", "search_alternative"]
+
+class AlternativeOutput(GeneralMessage):
+    intent_info: Literal["alternative_found", "no_alternative"]
+
+class ConfirmationOutput(GeneralMessage):
+    intent_info: Literal["flight_change", "change_confirmed"]
+
+class SearchOutput(FlightMessage):
+    intent_info: Literal["search_flight"] = Search_Flight
+
+class GeneratedSQL(BaseModel):
+    sql: str = Field(min_length=1)
+    # 用户强调的排序准则及权重（见 ranking.CRITERIA），未提及的准则使用默认权重
+    priorities: Dict[str, float] = Field(default_factory=dict)
+
+PHASE_FIELDS = ("phase", "last_intent", "last_sender", "last_user_message", "last_offer")
+OFFER_INTENTS = (Alternative_Found, No_Alternative)
+
+
+def phase_updates(messages) -> Dict[str, str]:
+    """按顺序应用新增消息后的路由字段（只看本次新增的消息）"""
+    updates: Dict[str, str] = {}
+    for message in messages:
+        intent_info = message.get("intent_info") or ""
+        sender = message.get("sender") or ""
+        updates["last_intent"] = intent_info
+        updates["last_sender"] = sender
+        if sender in ("system", "assistant"):
+            updates["phase"] = intent_info
+        elif sender == "user":
+            updates["last_user_message"] = message.get("content") or ""
+        if intent_info in OFFER_INTENTS:
+            updates["last_offer"] = intent_info
+    return updates
+
+
+def derive_phase(messages) -> Dict[str, str]:
+    """从消息历史推导路由字段：自末尾向前，找到最近的系统回复、用户输入与备选方案回复即停止"""
+    derived = dict.fromkeys(PHASE_FIELDS, "")
+    if messages:
+        derived["last_intent"] = messages[-1].get("intent_info") or ""
+        derived["last_sender"] = messages[-1].get("sender") or ""
+    found_phase = found_user = found_offer = False
+    for message in reversed(messages):
+        sender = message.get("sender")
+        if not found_phase and sender in ("system", "assistant"):
+            derived["phase"], found_phase = message.get("intent_info") or "", True
+        elif not found_user and sender == "user":
+            derived["last_user_message"], found_user = message.get("content") or "", True
+        if not found_offer and message.get("intent_info") in OFFER_INTENTS:
+            derived["last_offer"], found_offer = message.get("intent_info"), True
+        if found_phase and found_user and found_offer:
+            break
+    return derived
+
+
+def track_phase(func):
+    """包装节点函数：根据节点新增的消息更新路由字段，节点显式返回的字段优先"""
+    def run(state):
+        update = func(state)
+        if not isinstance(update, dict) or "messages" not in update:
+            return update
+        messages = update["messages"]
+        if isinstance(messages, dict) or hasattr(messages, "to_dict"):
+            messages = [messages]
+        return {**phase_updates(messages), **update}
+    return run
+
+
 # 状态容器
 class MessageState(BaseModel):
-    messages: List[Dict] = Field(
-        default_factory=list,
+    # 只追加的消息日志：节点只返回新增消息，由 append_messages 合并
+    messages: Annotated[MessageLog, append_messages] = Field(
+        default_factory=MessageLog,
         description="对话消息历史"
     )
     collected_info: Dict[str, Any] = Field(  # 明确字典结构
@@ -67,12 +173,30 @@ class MessageState(BaseModel):
         ],
         description="缺失信息字段"
     )
+    # 路由字段：由节点输出的新消息维护（见 track_phase），路由时直接读取，无需扫描消息历史；
+    # 为 None 时（新会话、旧版本保存的状态）从消息历史推导一次
+    phase: Optional[str] = Field(default=None, description="对话阶段：最近一条系统回复的 intent_info")
+    last_intent: Optional[str] = Field(default=None, description="最新一条消息的 intent_info")
+    last_sender: Optional[str] = Field(default=None, description="最新一条消息的发送方")
+    last_user_message: Optional[str] = Field(default=None, description="最近一条用户输入")
+    last_offer: Optional[str] = Field(default=None, description="最近一次备选方案回复的 intent_info（尚未回复过为空）")
+
+    @model_validator(mode="after")
+    def _derive_phase(self):
+        if any(getattr(self, name) is None for name in PHASE_FIELDS):
+            derived = derive_phase(self.messages)
+            for name, value in derived.items():
+                if getattr(self, name) is None:
+                    setattr(self, name, value)
+        return self
+
     def model_copy(self, **kwargs):
         """创建当前对象的副本"""
         return MessageState(
             messages=self.messages.copy(),
             collected_info=self.collected_info.copy(),
             missing_info=self.missing_info.copy(),
+            **{name: getattr(self, name) for name in PHASE_FIELDS},
             **kwargs
         )
     
@@ -81,11 +205,14 @@ class MessageState(BaseModel):
         return {
             "messages": self.messages,
             "collected_info": self.collected_info,
-            "missing_info": self.missing_info
+            "missing_info": self.missing_info,
+            **{name: getattr(self, name) for name in PHASE_FIELDS}
         }
     def log_state(self):
-        """记录当前状态"""
-        logger.info(f"\n=== 当前收集状态 ===")
-        logger.info(f"已收集信息: {self.collected_info}")
-        logger.info(f"缺失字段: {self.missing_info}")
-        logger.info(f"最新消息: {self.messages[-1]['content'] if self.messages else '无'}\n")
\ No newline at end of file
+        """记录当前状态（DEBUG 级别，惰性格式化：未开启 DEBUG 时不产生开销）"""
+        logger.opt(lazy=True).debug(
+            "收集状态 已收集: {} 缺失: {} 消息数: {}",
+            lambda: list(self.collected_info),
+            lambda: self.missing_info,
+            lambda: len(self.messages)
+        )
\ No newline at end of file
@@ -0,0 +1,108 @@
+# session_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from metrics import metrics
+from request_context import current_session
+
+_QUOTED = re.compile(r"('(?:[^']|'')*')")
+
+
+def info_fingerprint(collected_info: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> str:
+    """collected_info（或其中若干字段）的指纹；任一值变化，依赖它的备忘条目即失效"""
+    if fields is not None:
+        collected_info = {field: collected_info.get(field) for field in fields}
+    payload = json.dumps(collected_info, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """用户请求的归一化：忽略大小写与多余空白"""
+    return " ".join(text.lower().split())
+
+
+def normalize_sql(sql: str) -> str:
+    """生成 SQL 的归一化：字符串字面量之外忽略大小写与空白，去掉结尾分号"""
+    parts = _QUOTED.split(sql.strip().rstrip(";"))
+    return "".join(part if i % 2 else " ".join(part.lower().split()) for i, part in enumerate(parts))
+
+
+class SessionCache:
+    """会话内的结果备忘（已核验的机票、备选航班查询结果等）
+
+    每个会话按 kind 分组，每组记录写入时的 collected_info 指纹；读写时指纹不一致则整组清空。
+    会话按最近访问排序，超过 ttl 未访问或超出 max_sessions 时淘汰最久未访问的会话。
+    不在会话内（没有 thread_id，例如基准脚本）或 ttl 为 0 时不读不写。
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, Tuple[str, Dict]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        while self._sessions:
+            session, (touched_at, _) = next(iter(self._sessions.items()))
+            if touched_at + self.ttl <= now or len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            else:
+                break
+
+    def _group(self, session: str, kind: str, fingerprint: str) -> Dict:
+        now = time.monotonic()
+        self._purge(now)
+        _, groups = self._sessions.pop(session, (now, {}))
+        self._sessions[session] = (now, groups)
+        if len(self._sessions) > self.max_sessions:
+            # 新会话加入后超出上限：淘汰最久未访问的会话（当前会话已在末尾）
+            self._sessions.popitem(last=False)
+        stored_fingerprint, entries = groups.get(kind, (fingerprint, {}))
+        if stored_fingerprint != fingerprint:
+            metrics.inc("session_cache_invalidations_total", kind=kind)
+            entries = {}
+        groups[kind] = (fingerprint, entries)
+        return entries
+
+    def get(self, kind: str, key: Hashable, fingerprint: str) -> Optional[Any]:
+        session = current_session()
+        if session is None or self.ttl <= 0:
+            return None
+        with self._lock:
+            value = self._group(session, kind, fingerprint).get(key)
+        metrics.inc("session_cache_total", kind=kind, result="hit" if value is not None else "miss")
+        return value
+
+    def put(self, kind: str, key: Hashable, fingerprint: str, value: Any):
+        session = current_session()
+        if session is None or self.ttl <= 0:
+            return
+        with self._lock:
+            self._group(session, kind, fingerprint)[key] = value
+
+    def drop(self, session: str):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {"session_cache_sessions": len(self._sessions)}
+
+
+_cache: Optional[SessionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_session_cache(settings) -> SessionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SessionCache(ttl=settings.session_cache_ttl_seconds,
+                                  max_sessions=settings.session_cache_max_sessions)
+            metrics.register_collector(_cache.collect)
+        return _cache
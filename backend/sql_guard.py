@@ -0,0 +1,132 @@
+# sql_guard.py
+import re
+from typing import List, Tuple
+
+import psycopg2
+from psycopg2 import errors
+from loguru import logger
+
+from db import get_db_pool
+from metrics import metrics
+from request_context import DeadlineExceeded, current_deadline
+
+# 出现在语句中（字符串与注释之外）即拒绝的关键字
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "DROP", "ALTER", "CREATE", "TRUNCATE",
+    "GRANT", "REVOKE", "COPY", "CALL", "DO", "EXECUTE", "PREPARE", "VACUUM", "ANALYZE",
+    "LOCK", "INTO", "SET", "RESET", "LISTEN", "NOTIFY", "REFRESH", "COMMENT",
+}
+# 只读事务里仍然有副作用或会拖住连接的函数
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "lo_import", "lo_export", "dblink",
+    "set_config", "nextval", "setval",
+}
+
+_MASK_PATTERN = re.compile(
+    r"""--[^\n]*                     # 行注释
+      | /\*.*?\*/                    # 块注释
+      | '(?:[^']|'')*'               # 字符串
+      | "(?:[^"]|"")*"               # 带引号的标识符
+      | (\$[A-Za-z_0-9]*\$).*?\1     # $tag$...$tag$
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+_WORD = re.compile(r"[A-Za-z_][A-Za-z_0-9]*")
+
+
+class SqlRejected(Exception):
+    """生成的 SQL 未通过检查或执行超时；retry_prompt() 用于让 LLM 修正后重试"""
+
+    def __init__(self, reason: str, detail: str, sql: str):
+        super().__init__(f"SQL rejected ({reason}): {detail}")
+        self.reason = reason
+        self.detail = detail
+        self.sql = sql
+
+    def retry_prompt(self) -> str:
+        return (
+            "# Previous attempt was rejected, generate a corrected query:\n"
+            f"- Rejected SQL: {self.sql}\n"
+            f"- Reason: {self.reason}\n"
+            f"- Detail: {self.detail}\n"
+            f"- Fix: {RETRY_HINTS.get(self.reason, RETRY_HINTS['error'])}\n"
+        )
+
+
+RETRY_HINTS = {
+    "not_select": "Output exactly one read-only SELECT statement on alternative_tickets.",
+    "multiple_statements": "Output exactly one statement without semicolons in between.",
+    "forbidden": "Remove the forbidden keyword or function; only plain SELECT with WHERE/ORDER BY/LIMIT is allowed.",
+    "cost": "The query is too expensive. Add selective WHERE conditions (airports, date range) and avoid joins.",
+    "timeout": "The query ran too long. Add selective WHERE conditions and avoid joins or functions on columns.",
+    "error": "Fix the SQL error using the exact column names and formats from the table schema.",
+}
+
+
+def _mask(sql: str) -> str:
+    """把字符串、注释与带引号的标识符替换为空白，只保留需要检查的 SQL 结构"""
+    return _MASK_PATTERN.sub(lambda m: " " * len(m.group(0)), sql)
+
+
+def _reject(reason: str, detail: str, sql: str):
+    metrics.inc("sql_guard_rejected_total", reason=reason)
+    logger.warning(f"Generated SQL rejected ({reason}): {detail}")
+    raise SqlRejected(reason, detail, sql)
+
+
+def check_select(sql: str, row_limit: int) -> str:
+    """只允许单条 SELECT（可带 WITH）；缺少 LIMIT 时追加，返回可执行的语句"""
+    sql = sql.strip().rstrip(";").strip()
+    masked = _mask(sql)
+    if ";" in masked:
+        _reject("multiple_statements", "More than one statement was generated", sql)
+    words = [w.upper() for w in _WORD.findall(masked)]
+    if not words or words[0] not in ("SELECT", "WITH"):
+        _reject("not_select", f"Statement starts with {words[0] if words else 'nothing'}", sql)
+    if forbidden := sorted(FORBIDDEN_KEYWORDS.intersection(words)):
+        _reject("forbidden", f"Forbidden keyword(s): {', '.join(forbidden)}", sql)
+    functions = {name.lower() for name in re.findall(r"([A-Za-z_][A-Za-z_0-9]*)\s*\(", masked)}
+    if forbidden := sorted(FORBIDDEN_FUNCTIONS.intersection(functions)):
+        _reject("forbidden", f"Forbidden function(s): {', '.join(forbidden)}", sql)
+    if "LIMIT" not in words and "FETCH" not in words:
+        sql = f"{sql}\nLIMIT {row_limit}"
+    return sql
+
+
+def _error_message(e: psycopg2.Error) -> str:
+    return (e.diag.message_primary if e.diag else None) or str(e).strip()
+
+
+def _plan_cost(cursor, sql: str) -> float:
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    plan = cursor.fetchone()[0]
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def run_guarded_select(sql: str, settings) -> Tuple[List[str], List[tuple]]:
+    """在只读事务中执行 LLM 生成的查询：先检查语句与 EXPLAIN 代价，再带 statement_timeout 执行"""
+    sql = check_select(sql, settings.generated_sql_row_limit)
+    try:
+        with get_db_pool(settings).connection(
+            statement_timeout=settings.generated_sql_statement_timeout, read_only=True
+        ) as conn:
+            with conn.cursor() as cursor:
+                cost = _plan_cost(cursor, sql)
+                metrics.observe("sql_guard_plan_cost", cost)
+                if cost > settings.generated_sql_max_cost:
+                    _reject("cost", f"Estimated cost {cost:.0f} exceeds {settings.generated_sql_max_cost:.0f}", sql)
+                cursor.execute(sql)
+                columns = [desc[0] for desc in cursor.description]
+                return columns, cursor.fetchall()
+    except errors.QueryCanceled as e:
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            deadline.tripped = True
+            raise DeadlineExceeded("Deadline exceeded while running generated SQL") from e
+        _reject("timeout", f"Cancelled after {settings.generated_sql_statement_timeout}s: {e.pgerror or e}", sql)
+    except (errors.ReadOnlySqlTransaction, errors.InsufficientPrivilege) as e:
+        _reject("forbidden", _error_message(e), sql)
+    except (psycopg2.ProgrammingError, psycopg2.DataError) as e:
+        # 语法错误、列名不存在、日期格式错误等：把数据库错误信息交给 LLM 修正
+        _reject("error", _error_message(e), sql)
@@ -0,0 +1,190 @@
+# structured_output.py
+import ast
+import json
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Generic, Optional, Type, TypeVar
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from dependencies import get_settings
+from json_stream import JsonFieldStream
+from metrics import metrics
+from request_context import budget_is_low, current_event_sink
+
+M = TypeVar("M", bound=BaseModel)
+
+_FENCE = re.compile(r"```[A-Za-z]*\s*(.*?)```", re.DOTALL)
+_LINE_COMMENT = re.compile(r'^(\s*(?:[^"\n]*"[^"\n]*")*[^"\n]*?)\s*//[^\n]*$', re.MULTILINE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# 相邻两个字段之间漏写逗号："a": "x"\n "b": ...
+_MISSING_COMMA = re.compile(r'("|\d|true|false|null|[}\]])(\s*\n\s*")')
+
+
+# 流式推送给客户端的路由字段（完整到达即推送，早于整个对象解析完成）
+STREAMED_ROUTING_FIELDS = ("intent_info", "missing_info", "flight_url")
+
+
+class StructuredOutputError(ValueError):
+    """模型输出经本地修复与重新询问后仍不符合声明的模型"""
+
+
+def _json_candidate(text: str) -> str:
+    """去掉代码块标记，截取最外层的 {...}"""
+    if match := _FENCE.search(text):
+        text = match.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else text.strip()
+
+
+def repair_json(text: str) -> Any:
+    """按从轻到重的顺序尝试解析：原样 → 注释/多余逗号/漏写逗号 → Python 字面量（单引号、True/None）"""
+    candidate = _json_candidate(text)
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    fixed = _LINE_COMMENT.sub(r"\1", candidate)
+    fixed = _TRAILING_COMMA.sub(r"\1", fixed)
+    fixed = _MISSING_COMMA.sub(r"\1,\2", fixed)
+    try:
+        return json.loads(fixed)
+    except json.JSONDecodeError as e:
+        error = e
+    try:
+        return ast.literal_eval(fixed)
+    except (ValueError, SyntaxError):
+        raise ValueError(f"Output is not valid JSON: {error}") from error
+
+
+class ParseStats:
+    """按节点统计结构化输出：ok 首次即有效，repaired 本地修复后有效，reasked 重新询问后有效，failed 最终失败"""
+
+    OUTCOMES = ("ok", "repaired", "reasked", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(self.OUTCOMES, 0))
+
+    def record(self, node: str, outcome: str):
+        metrics.inc("structured_output_total", node=node, outcome=outcome)
+        with self._lock:
+            self._counts[node][outcome] += 1
+
+    def collect(self) -> dict:
+        gauges = {}
+        with self._lock:
+            for node, counts in self._counts.items():
+                total = sum(counts.values())
+                if not total:
+                    continue
+                # 首次输出不能直接使用的比例，以及修复与重新询问后仍失败的比例
+                gauges[f"structured_output_parse_failure_ratio{{node={node}}}"] = (total - counts["ok"]) / total
+                gauges[f"structured_output_failure_ratio{{node={node}}}"] = counts["failed"] / total
+        return gauges
+
+
+parse_stats = ParseStats()
+metrics.register_collector(parse_stats.collect)
+
+
+def response_format_for(schema: Type[BaseModel], mode: str) -> Optional[Dict]:
+    """服务端约束输出格式：json_schema 按模型的 JSON Schema 约束，json_object 只保证是 JSON 对象"""
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema(), "strict": False},
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+class StructuredChain(Generic[M]):
+    """提示词 → LLM → 声明的 Pydantic 模型
+
+    解析失败时先在本地修复（代码块、注释、逗号、单引号），仍失败则带上错误与 JSON Schema
+    重新询问一次（预算不足时跳过），最终失败抛出 StructuredOutputError。
+    raw_field：输出不是 JSON 时，把去掉代码块标记后的整段文本作为该字段（例如 SQL）。
+    text_field：有流式客户端时边生成边推送的面向用户文本字段；为 None 时不推送（例如 SQL）。
+    """
+
+    def __init__(self, prompt: ChatPromptTemplate, llm, schema: Type[M], name: str,
+                 raw_field: Optional[str] = None, text_field: Optional[str] = "content"):
+        self.prompt = prompt
+        self.schema = schema
+        self.name = name
+        self.raw_field = raw_field
+        self.text_field = text_field
+        settings = get_settings()
+        self.max_reasks = settings.structured_output_max_reasks
+        response_format = response_format_for(schema, settings.llm_response_format)
+        self.llm = llm.bind(response_format=response_format) if response_format else llm
+
+    def _parse(self, text: str) -> M:
+        try:
+            data = repair_json(text)
+        except ValueError:
+            if not self.raw_field:
+                raise
+            fenced = _FENCE.search(text)
+            data = {self.raw_field: (fenced.group(1) if fenced else text).strip()}
+        return self.schema.model_validate(data)
+
+    def _generate(self, messages) -> str:
+        sink = current_event_sink()
+        if sink is None or self.text_field is None:
+            return self.llm.invoke(messages).content
+        # 流式：路由字段一完整就推送，面向用户的文本逐段推送；完整文本仍按下方流程校验
+        parser = JsonFieldStream(text_fields=(self.text_field,))
+        parts = []
+        for chunk in self.llm.stream(messages):
+            parts.append(chunk.content)
+            for kind, key, value in parser.feed(chunk.content):
+                if kind == "delta":
+                    sink({"type": "delta", "node": self.name, "field": key, "text": value})
+                elif key in STREAMED_ROUTING_FIELDS:
+                    sink({"type": "field", "node": self.name, "name": key, "value": value})
+        return "".join(parts)
+
+    def invoke(self, inputs: Dict[str, Any]) -> M:
+        messages = self.prompt.format_messages(**inputs)
+        text = self._generate(messages)
+        try:
+            result = self.schema.model_validate_json(text)
+            parse_stats.record(self.name, "ok")
+            return result
+        except ValidationError:
+            pass
+        try:
+            result = self._parse(text)
+            parse_stats.record(self.name, "repaired")
+            return result
+        except (ValueError, ValidationError) as e:
+            error = e
+        for _ in range(self.max_reasks if not budget_is_low() else 0):
+            logger.warning(f"{self.name} output rejected, re-asking: {error}")
+            if sink := current_event_sink():
+                sink({"type": "reset", "node": self.name})
+            text = self._generate([*messages, AIMessage(content=text), HumanMessage(content=self._reask_prompt(error))])
+            try:
+                result = self._parse(text)
+                parse_stats.record(self.name, "reasked")
+                return result
+            except (ValueError, ValidationError) as e:
+                error = e
+        parse_stats.record(self.name, "failed")
+        raise StructuredOutputError(f"{self.name} returned unusable output: {error}")
+
+    def _reask_prompt(self, error: Exception) -> str:
+        if isinstance(error, ValidationError):
+            error = "; ".join(f"{'.'.join(map(str, e['loc'])) or 'output'}: {e['msg']}" for e in error.errors())
+        return (
+            f"Your previous reply could not be used: {error}\n"
+            "Reply again with ONLY one JSON object, no markdown and no other text, matching this JSON Schema:\n"
+            f"{json.dumps(self.schema.model_json_schema(), ensure_ascii=False)}"
+        )
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
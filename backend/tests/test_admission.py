@@ -0,0 +1,102 @@
+# tests/test_admission.py
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, BucketTable, TokenBucket
+from dependencies import get_settings
+
+
+def controller(**overrides) -> AdmissionController:
+    values = {"rate_limit_user_per_minute": 6000, "rate_limit_user_burst": 100,
+              "rate_limit_session_per_minute": 6000, "rate_limit_session_burst": 100,
+              "chat_max_in_flight": 1, "chat_max_queue": 1, "chat_queue_timeout": 0.05}
+    return AdmissionController(get_settings().model_copy(update={**values, **overrides}))
+
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated_at
+    assert bucket.wait_time(now) == 0
+    bucket.consume()
+    bucket.consume()
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == 0
+    assert bucket.wait_time(now + 10) == 0 and bucket.tokens == 2
+
+
+def test_bucket_table_evicts_least_recently_used():
+    table = BucketTable(rate=1, burst=1, max_entries=2)
+    first = table.get("a")
+    table.get("b")
+    table.get("a")
+    table.get("c")
+    assert len(table) == 2
+    assert table.get("a") is first
+
+
+def test_session_rate_rejects_without_charging_user():
+    # 用户桶不补充令牌，剩余令牌数与调用间隔无关
+    admission = controller(rate_limit_session_burst=1, rate_limit_session_per_minute=0.001,
+                           rate_limit_user_per_minute=0)
+    with admission.admit("u", "s"):
+        pass
+    with pytest.raises(AdmissionRejected) as rejected:
+        with admission.admit("u", "s"):
+            pass
+    assert rejected.value.reason == "session_rate"
+    assert admission.users.get("u").tokens == 99
+
+
+def test_reserve_rejects_when_in_flight_and_queue_are_full():
+    admission = controller()
+    with admission.reserve("u"), admission.reserve("u"):
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.reserve("u"):
+                pass
+    assert rejected.value.reason == "queue_full"
+    assert admission.reserved == 0
+
+
+def test_queue_timeout_when_slot_stays_busy():
+    admission = controller()
+    busy, done = threading.Event(), threading.Event()
+
+    def hold():
+        with admission.admit("u", None):
+            busy.set()
+            done.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    busy.wait()
+    try:
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.admit("u", None):
+                pass
+        assert rejected.value.reason == "queue_timeout"
+    finally:
+        done.set()
+        holder.join()
+    assert admission.in_flight == 0 and admission.waiting == 0
+
+
+def test_queued_request_runs_when_slot_frees():
+    admission = controller(chat_queue_timeout=1)
+    order = []
+    busy = threading.Event()
+
+    def hold():
+        with admission.admit("u", None):
+            busy.set()
+            time.sleep(0.05)
+            order.append("first")
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    busy.wait()
+    with admission.admit("u", None):
+        order.append("second")
+    holder.join()
+    assert order == ["first", "second"]
@@ -0,0 +1,91 @@
+# tests/test_archive.py
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from archive import CHANGE_CONFIRMED, IDLE, ConversationArchiver
+from checkpointer import SharedLogMemorySaver
+from dependencies import get_settings
+from main import SessionStore, initial_state
+
+
+def archiver(directory: str, store: SessionStore, idle_seconds: float = 3600) -> ConversationArchiver:
+    settings = get_settings().model_copy(update={
+        "archive_dir": directory, "archive_idle_seconds": idle_seconds, "archive_batch_size": 10,
+    })
+    return ConversationArchiver(settings, store, SharedLogMemorySaver())
+
+
+def read_archive(directory: str):
+    records = []
+    for name in sorted(os.listdir(directory)):
+        with gzip.open(os.path.join(directory, name), "rt") as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_finished_and_idle_sessions_are_archived_and_released(tmp_path):
+    store = SessionStore()
+    store.save("done", initial_state("confirm"), outcome=CHANGE_CONFIRMED)
+    store.save("idle", initial_state("hello"))
+    store.save("open", initial_state("still here"))
+    store.sessions["idle"]["timestamp"] = datetime.now() - timedelta(hours=2)
+    result = archiver(str(tmp_path), store).run_once()
+    assert result["archived"] == 2
+    assert set(store.sessions) == {"open"}
+    records = {record["session_id"]: record for record in read_archive(str(tmp_path))}
+    assert records["done"]["outcome"] == CHANGE_CONFIRMED and records["idle"]["outcome"] == IDLE
+    assert records["done"]["turns"] == 1
+
+
+def test_session_with_active_turn_is_skipped(tmp_path):
+    store = SessionStore()
+    store.save("busy", initial_state("hi"), outcome=CHANGE_CONFIRMED)
+    with store.turn("busy"):
+        assert archiver(str(tmp_path), store).run_once()["archived"] == 0
+    assert "busy" in store.sessions
+    assert archiver(str(tmp_path), store).run_once()["archived"] == 1
+
+
+def test_write_failure_releases_claim_and_keeps_state(tmp_path):
+    store = SessionStore()
+    store.save("done", initial_state("hi"), outcome=CHANGE_CONFIRMED)
+    blocked = tmp_path / "not-a-directory"
+    blocked.write_text("")
+    result = archiver(str(blocked), store).run_once()
+    assert result["archived"] == 0 and "error" in result
+    assert "done" in store.sessions and not store._archiving
+    with store.turn("done"):
+        pass  # 认领已结束，新一轮不会阻塞
+    assert archiver(str(tmp_path / "archive"), store).run_once()["archived"] == 1
+
+
+def test_turn_waits_while_session_is_claimed():
+    store = SessionStore()
+    store.save("s", initial_state("hi"))
+    entry = store.sessions["s"]
+    assert store.claim("s", entry)
+    entered = threading.Event()
+
+    def run_turn():
+        with store.turn("s"):
+            entered.set()
+
+    thread = threading.Thread(target=run_turn)
+    thread.start()
+    time.sleep(0.05)
+    assert not entered.is_set()
+    store.release(["s"], remove=False)
+    thread.join(timeout=1)
+    assert entered.is_set()
+
+
+def test_updated_state_is_not_claimed():
+    store = SessionStore()
+    store.save("s", initial_state("hi"))
+    stale = store.sessions["s"]
+    store.save("s", initial_state("again"))
+    assert not store.claim("s", stale)
@@ -0,0 +1,67 @@
+# tests/test_checkpointer.py
+from typing import Annotated, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from checkpointer import SharedLogMemorySaver
+from message_log import MessageLog, append_messages
+
+MARKER = "unique-message-text"
+
+
+class State(TypedDict):
+    messages: Annotated[MessageLog, append_messages]
+    step: int
+
+
+def build(saver: SharedLogMemorySaver):
+    graph = StateGraph(State)
+    graph.add_node("reply", lambda state: {"messages": [{"content": f"{MARKER} reply", "sender": "system"}],
+                                           "step": state.get("step", 0) + 1})
+    graph.add_node("follow_up", lambda state: {"messages": {"content": f"{MARKER} follow-up", "sender": "assistant"}})
+    graph.add_edge(START, "reply")
+    graph.add_edge("reply", "follow_up")
+    graph.add_edge("follow_up", END)
+    return graph.compile(checkpointer=saver)
+
+
+def config(thread_id: str):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_checkpoints_share_message_log_without_copying():
+    saver = SharedLogMemorySaver()
+    app = build(saver)
+    app.invoke({"messages": [{"content": "hi", "sender": "user"}]}, config("t"))
+
+    latest = saver.get_tuple(config("t"))
+    messages = latest.checkpoint["channel_values"]["messages"]
+    assert isinstance(messages, MessageLog)
+    assert [m["content"] for m in messages] == ["hi", f"{MARKER} reply", f"{MARKER} follow-up"]
+    assert latest.checkpoint["channel_values"]["step"] == 1
+
+    history = [t.checkpoint["channel_values"].get("messages") for t in saver.list(config("t"))]
+    logs = [log for log in history if log is not None]
+    assert [len(log) for log in logs] == [3, 2, 1]
+    # 相邻检查点引用同一前缀对象，而不是各自保存一份副本
+    for newer, older in zip(logs, logs[1:]):
+        assert newer.extends(older)
+    # 序列化保存的检查点中不含节点追加的消息内容
+    for saved in saver.storage["t"][""].values():
+        assert MARKER.encode() not in saved[0][1]
+
+
+def test_delete_thread_releases_checkpoints_and_logs():
+    saver = SharedLogMemorySaver()
+    app = build(saver)
+    for thread_id in ("a", "b"):
+        app.invoke({"messages": [{"content": "hi", "sender": "user"}]}, config(thread_id))
+    assert set(saver.thread_sizes(["a", "b"])) == {"a", "b"}
+
+    saver.delete_thread("a")
+    assert saver.get_tuple(config("a")) is None
+    assert list(saver.list(config("a"))) == []
+    assert not any(key[0] == "a" for key in saver.logs)
+    assert not any(key[0] == "a" for key in saver.writes)
+    assert len(saver.get_tuple(config("b")).checkpoint["channel_values"]["messages"]) == 3
+    assert saver.thread_sizes(["a"]) == {"a": (0, 0)}
@@ -0,0 +1,73 @@
+# tests/test_hedging.py
+import threading
+import time
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from llm.hedging import HedgedChatModel, HedgePolicy
+
+
+class SlowModel(FakeListChatModel):
+    delay: float = 0.0
+    fail: bool = False
+    threads: List[Any] = []
+
+    def _call(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("primary failed")
+        return super()._call(*args, **kwargs)
+
+
+def hedged(primary: SlowModel, secondary: SlowModel, min_delay: float = 0.02) -> HedgedChatModel:
+    policy = HedgePolicy(min_delay=min_delay, max_ratio=1.0)
+    return HedgedChatModel(primary=primary, secondary=secondary, policy=policy, model_name="m")
+
+
+def test_fast_primary_is_returned_without_hedge():
+    primary, secondary = SlowModel(responses=["primary"], threads=[]), SlowModel(responses=["secondary"], threads=[])
+    assert hedged(primary, secondary, min_delay=1).invoke("hi").content == "primary"
+    assert len(primary.threads) == 1
+    assert secondary.threads == []
+
+
+def test_slow_primary_loses_to_fast_hedge():
+    primary = SlowModel(responses=["primary"], delay=0.5, threads=[])
+    secondary = SlowModel(responses=["secondary"], threads=[])
+    model = hedged(primary, secondary)
+    started = time.perf_counter()
+    assert model.invoke("hi").content == "secondary"
+    assert time.perf_counter() - started < 0.4
+    assert model.policy.secondary_wins == 1
+
+
+def test_failed_slow_primary_falls_back_to_hedge():
+    primary = SlowModel(responses=["primary"], delay=0.1, fail=True, threads=[])
+    secondary = SlowModel(responses=["secondary"], threads=[])
+    model = hedged(primary, secondary)
+    assert model.invoke("hi").content == "secondary"
+    assert len(secondary.threads) == 1 and secondary.threads[0] != threading.get_ident()
+    assert model.policy.secondary_wins == 1
+
+
+def test_fast_primary_failure_is_raised_without_hedge():
+    primary = SlowModel(responses=["primary"], fail=True, threads=[])
+    secondary = SlowModel(responses=["secondary"], threads=[])
+    model = hedged(primary, secondary, min_delay=1)
+    with pytest.raises(ConnectionError):
+        model.invoke("hi")
+    time.sleep(0.05)
+    assert secondary.threads == []
+
+
+def test_latency_windows_are_kept_per_key():
+    policy = HedgePolicy(min_delay=2.0, min_samples=5)
+    for _ in range(5):
+        policy.record_latency(("m", "intent_detection_node"), 0.5)
+        policy.record_latency(("m", "collect_info_node"), 4.0)
+    assert policy.delay(("m", "intent_detection_node")) == 0.5
+    assert policy.delay(("m", "collect_info_node")) == 4.0
+    assert policy.delay(("other", "intent_detection_node")) == 2.0
@@ -0,0 +1,130 @@
+# tests/test_http_pool.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from llm.http_pool import (AsyncResilientTransport, CircuitBreaker, CircuitOpenError, ResilientTransport,
+                           RetryPolicy)
+from request_context import Deadline, DeadlineExceeded, node_scope
+
+NO_RETRY = RetryPolicy(max_retries=0)
+
+
+def sync_client(handler, breaker, policy=NO_RETRY):
+    return httpx.Client(transport=ResilientTransport(httpx.MockTransport(handler), policy, breaker))
+
+
+def open_breaker(reset_timeout: float = 0.05) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    client = sync_client(lambda request: httpx.Response(503), breaker)
+    client.get("http://llm/")
+    assert breaker.state == CircuitBreaker.CLOSED
+    client.get("http://llm/")
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get("http://llm/")
+
+
+def test_half_open_allows_single_probe_and_closes_on_success():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.before_request() is not None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_request() is None
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    sync_client(lambda request: httpx.Response(502), breaker).get("http://llm/")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.parametrize("status", [501, 505, 599])
+def test_any_5xx_counts_as_failure(status):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    sync_client(lambda request: httpx.Response(status), breaker).get("http://llm/")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_429_is_not_a_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    sync_client(lambda request: httpx.Response(429), breaker).get("http://llm/")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rate_limited_probe_keeps_breaker_half_open():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    sync_client(lambda request: httpx.Response(429), breaker).get("http://llm/")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.consecutive_failures == 2
+    assert breaker.before_request() is not None
+
+
+def test_probe_released_on_deadline_exceeded():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    def slow(request):
+        time.sleep(0.05)
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    with node_scope("test", {"configurable": {"deadline": Deadline(0.02)}}):
+        with pytest.raises(DeadlineExceeded):
+            sync_client(slow, breaker).get("http://llm/")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_request() is not None
+
+
+def test_probe_released_on_cancellation():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    async def run():
+        transport = AsyncResilientTransport(httpx.MockTransport(hang), NO_RETRY, breaker)
+        async with httpx.AsyncClient(transport=transport) as client:
+            task = asyncio.create_task(client.get("http://llm/"))
+            await asyncio.sleep(0.01)
+            assert breaker.probe_started is not None
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(run())
+    assert breaker.probe_started is None
+    assert breaker.before_request() is not None
+
+
+def test_stale_probe_expires_after_reset_timeout():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    time.sleep(0.06)
+    assert breaker.before_request() is not None
+
+
+def test_retries_then_succeeds():
+    responses = iter([httpx.Response(503), httpx.Response(200)])
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    client = sync_client(lambda request: next(responses), breaker, RetryPolicy(max_retries=2, backoff_base=0.001))
+    assert client.get("http://llm/").status_code == 200
+    assert breaker.consecutive_failures == 0
@@ -0,0 +1,111 @@
+# tests/test_idempotency.py
+import threading
+import time
+
+import pytest
+
+from idempotency import IdempotencyCache, IdempotencyInProgress, IdempotencyKeyMismatch
+
+
+def test_completed_result_is_replayed():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=1)
+    calls = []
+    assert cache.run("user", "k", lambda: calls.append(1) or "reply") == ("reply", False)
+    assert cache.run("user", "k", lambda: calls.append(1) or "other") == ("reply", True)
+    assert cache.run("other-user", "k", lambda: "fresh") == ("fresh", False)
+    assert len(calls) == 1
+
+
+def test_duplicate_waits_for_in_flight_execution():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=2)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait()
+        return "reply"
+
+    owner = threading.Thread(target=lambda: results.append(cache.run("user", "k", slow)))
+    owner.start()
+    started.wait()
+    duplicate = threading.Thread(target=lambda: results.append(cache.run("user", "k", lambda: "unexpected")))
+    duplicate.start()
+    time.sleep(0.05)
+    release.set()
+    owner.join()
+    duplicate.join()
+    assert sorted(results) == [("reply", False), ("reply", True)]
+
+
+def test_duplicate_gives_up_after_wait_timeout():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=0.02)
+    started, release = threading.Event(), threading.Event()
+    owner = threading.Thread(target=cache.run, args=("user", "k", lambda: started.set() or release.wait()))
+    owner.start()
+    started.wait()
+    with pytest.raises(IdempotencyInProgress):
+        cache.run("user", "k", lambda: "unexpected")
+    release.set()
+    owner.join()
+
+
+def test_failure_is_not_cached():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.run("user", "k", fail)
+    assert cache.run("user", "k", lambda: "retried") == ("retried", False)
+
+
+def test_expired_entries_are_recomputed():
+    cache = IdempotencyCache(ttl=0.01, max_entries=10, wait_timeout=1)
+    cache.run("user", "k", lambda: "first")
+    time.sleep(0.02)
+    assert cache.run("user", "k", lambda: "second") == ("second", False)
+
+
+def test_max_entries_enforced_past_in_flight_request():
+    cache = IdempotencyCache(ttl=60, max_entries=2, wait_timeout=1)
+    started, release = threading.Event(), threading.Event()
+    owner = threading.Thread(target=cache.run, args=("user", "slow", lambda: started.set() or release.wait()))
+    owner.start()
+    started.wait()
+    for index in range(5):
+        cache.run("user", f"k{index}", lambda: "reply")
+    assert cache.collect() == {"idempotency_entries": 2, "idempotency_in_flight": 1}
+    assert cache.run("user", "k4", lambda: "other") == ("reply", True)
+    assert cache.run("user", "k0", lambda: "again") == ("again", False)
+    release.set()
+    owner.join()
+
+
+def test_same_key_with_different_body_is_rejected():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=1)
+    assert cache.run("user", "k", lambda: "reply", "body-a") == ("reply", False)
+    with pytest.raises(IdempotencyKeyMismatch):
+        cache.run("user", "k", lambda: "other", "body-b")
+    assert cache.run("user", "k", lambda: "other", "body-a") == ("reply", True)
+
+
+def test_in_flight_key_with_different_body_is_rejected():
+    cache = IdempotencyCache(ttl=60, max_entries=10, wait_timeout=2)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return "reply"
+
+    owner = threading.Thread(target=lambda: cache.run("user", "k", slow, "body-a"))
+    owner.start()
+    started.wait()
+    try:
+        with pytest.raises(IdempotencyKeyMismatch):
+            cache.run("user", "k", lambda: "unexpected", "body-b")
+    finally:
+        release.set()
+        owner.join()
@@ -0,0 +1,48 @@
+# tests/test_json_stream.py
+import json
+
+import pytest
+
+from json_stream import JsonFieldStream
+
+OUTPUT = {
+    "intent_info": "flight_change",
+    "missing_info": ["ticket_number", {"nested": [1, 2]}],
+    "content": "Hi \"Anna\" \\ 你好 😀\nline two",
+    "confidence": 0.9,
+    "sender": None,
+}
+
+
+def run(text: str, size: int):
+    stream = JsonFieldStream(text_fields=("content",))
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(stream.feed(text[start:start + size]))
+    return stream, events
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_fields_and_deltas_match_full_parse(size, ensure_ascii):
+    text = "```json\n" + json.dumps(OUTPUT, ensure_ascii=ensure_ascii) + "\n```"
+    stream, events = run(text, size)
+    assert stream.done
+    fields = {key: value for kind, key, value in events if kind == "field"}
+    assert fields == OUTPUT
+    assert "".join(value for kind, key, value in events if kind == "delta") == OUTPUT["content"]
+    assert all(key == "content" for kind, key, _ in events if kind == "delta")
+
+
+def test_routing_field_arrives_before_text_is_complete():
+    text = json.dumps({"intent_info": "other", "content": "a long answer"})
+    stream = JsonFieldStream()
+    events = stream.feed(text[:text.index("long")])
+    assert ("field", "intent_info", "other") in events
+    assert not any(kind == "field" and key == "content" for kind, key, _ in events)
+
+
+def test_content_after_object_is_ignored():
+    stream, events = run('{"content": "x"} trailing {"content": "y"}', 4)
+    assert stream.done
+    assert [event for event in events if event[0] == "field"] == [("field", "content", "x")]
@@ -0,0 +1,104 @@
+# tests/test_message_log.py
+import pytest
+
+from message_log import MessageLog, MessageRecord, append_messages
+
+
+def make(count: int, start: int = 0):
+    return [{"content": f"m{index}", "sender": "user" if index % 2 == 0 else "system"}
+            for index in range(start, start + count)]
+
+
+def chained(count: int, step: int = 3) -> MessageLog:
+    log = MessageLog()
+    for start in range(0, count, step):
+        log = log.concat(make(min(step, count - start), start))
+    return log
+
+
+def test_indexing_slicing_and_iteration_match_list():
+    messages = make(20)
+    log = chained(20)
+    assert len(log) == 20
+    assert log == messages and messages == log
+    assert [record.to_dict() for record in log] == messages
+    assert list(reversed(log)) == list(reversed(list(log)))
+    for index in (0, 5, 19, -1, -7, -20):
+        assert log[index] == MessageRecord.from_value(messages[index])
+    for index in (20, -21):
+        with pytest.raises(IndexError):
+            log[index]
+    for window in (slice(None), slice(-3, None), slice(2, 9), slice(None, None, 2), slice(15, 5, -1), slice(30, 40)):
+        assert log[window] == [MessageRecord.from_value(m) for m in messages[window]]
+
+
+def test_equality_with_lists_and_other_logs():
+    log = MessageLog(make(3))
+    assert log == make(3)
+    assert log == tuple(make(3))
+    assert log == chained(3, step=1)
+    assert log != make(2)
+    assert log != make(3, start=1)
+    assert (log == "m0") is False
+
+
+def test_concat_shares_prefix_and_bounds_depth():
+    base = MessageLog(make(2))
+    extended = base.concat(make(1, 2))
+    assert base == make(2)
+    assert extended.extends(base) and not base.extends(extended)
+    assert base.concat([]) is base
+    deep = chained(MessageLog.MAX_DEPTH * 3, step=1)
+    assert deep._depth <= MessageLog.MAX_DEPTH
+    assert deep == make(MessageLog.MAX_DEPTH * 3)
+
+
+@pytest.mark.parametrize("message", [
+    {"content": "hi", "sender": "user"},
+    {"content": "where to?", "sender": "system", "intent_info": "flight_change", "missing_info": ["date", "city"]},
+    {"content": {"alternatives": [1, 2]}, "sender": "assistant", "flight_url": "https://example.com/f"},
+])
+def test_record_round_trip(message):
+    record = MessageRecord.from_value(message)
+    assert record.to_dict() == message
+    assert MessageRecord.from_value(record) is record
+    assert MessageRecord.from_value(record.to_dict()) == record
+    assert record["sender"] == message["sender"]
+    assert record.get("flight_url", "none") == message.get("flight_url", "none")
+    assert set(record.keys()) == set(message)
+    assert repr(record) == repr(message)
+
+
+def test_record_missing_keys():
+    record = MessageRecord.from_value({"content": "hi"})
+    assert record.sender == "system" and record.missing_info is None
+    assert "intent_info" not in record
+    with pytest.raises(KeyError):
+        record["intent_info"]
+    assert record.get("unknown") is None
+
+
+def test_reducer_appends_new_messages():
+    left = MessageLog(make(2))
+    assert append_messages(left, make(1, 2)) == make(3)
+    assert append_messages(left, make(1, 2)).extends(left)
+    assert append_messages(left, {"content": "m2", "sender": "user"}) == make(3)
+    assert append_messages(left, MessageRecord.from_value(make(1, 2)[0])) == make(3)
+    assert append_messages(None, make(1)) == make(1)
+    assert append_messages(make(1), make(1, 1)) == make(2)
+
+
+def test_reducer_accepts_full_history_from_nodes():
+    left = MessageLog(make(2))
+    full = left.concat(make(2, 2))
+    assert append_messages(left, full) is full
+    assert append_messages(MessageLog(), full) is full
+    assert append_messages(left, MessageLog(make(1, 2))) == make(3)
+
+
+def test_reducer_keeps_history_when_node_routes_to_end_without_messages():
+    # 走向 END 的节点不返回新消息（None 或空列表），历史保持不变
+    left = MessageLog(make(2))
+    assert append_messages(left, None) is left
+    assert append_messages(left, []) is left
+    assert append_messages(None, None) == []
@@ -0,0 +1,66 @@
+# tests/test_phase.py
+import random
+
+import pytest
+
+from schemas import (Alternative_Found, Change_Confirmed, Flight_Change, MessageState, No_Alternative, Other_Intent,
+                     PHASE_FIELDS, Search_Alternative, derive_phase, phase_updates, track_phase)
+
+INTENTS = [Flight_Change, Search_Alternative, Alternative_Found, No_Alternative, Change_Confirmed, Other_Intent, None]
+
+
+def random_messages(rng: random.Random, count: int):
+    messages = []
+    for index in range(count):
+        sender = rng.choice(["user", "system", "assistant"])
+        message = {"content": f"{sender} {index}", "sender": sender}
+        if sender != "user" or rng.random() < 0.3:
+            if (intent := rng.choice(INTENTS)) is not None:
+                message["intent_info"] = intent
+        messages.append(message)
+    return messages
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_updates_match_full_derivation(seed):
+    rng = random.Random(seed)
+    messages = random_messages(rng, rng.randint(0, 30))
+    fields = derive_phase([])
+    position = 0
+    while position < len(messages):
+        step = rng.randint(1, 4)
+        fields = {**fields, **phase_updates(messages[position:position + step])}
+        position += step
+        assert fields == derive_phase(messages[:position])
+
+
+def test_derive_phase_reads_latest_of_each_kind():
+    messages = [
+        {"content": "change my flight", "sender": "user"},
+        {"content": "found", "sender": "system", "intent_info": Alternative_Found},
+        {"content": "the second one", "sender": "user"},
+        {"content": "confirm?", "sender": "system", "intent_info": Flight_Change},
+    ]
+    assert derive_phase(messages) == {
+        "phase": Flight_Change, "last_intent": Flight_Change, "last_sender": "system",
+        "last_user_message": "the second one", "last_offer": Alternative_Found,
+    }
+    assert derive_phase([]) == dict.fromkeys(PHASE_FIELDS, "")
+
+
+def test_track_phase_prefers_explicit_fields():
+    node = track_phase(lambda state: {"messages": {"content": "hi", "sender": "system", "intent_info": Other_Intent}})
+    assert node(None)["phase"] == Other_Intent
+    explicit = track_phase(lambda state: {"messages": [{"content": "x", "sender": "user"}], "phase": Flight_Change})
+    assert explicit(None)["phase"] == Flight_Change
+    untouched = track_phase(lambda state: {"collected_info": {}})
+    assert untouched(None) == {"collected_info": {}}
+
+
+def test_state_derives_missing_fields_once():
+    state = MessageState(messages=[{"content": "hi", "sender": "user"},
+                                   {"content": "none", "sender": "system", "intent_info": No_Alternative}])
+    assert (state.phase, state.last_offer, state.last_user_message) == (No_Alternative, No_Alternative, "hi")
+    kept = MessageState(messages=[{"content": "hi", "sender": "user"}], phase=Flight_Change, last_intent="",
+                        last_sender="user", last_user_message="hi", last_offer="")
+    assert kept.phase == Flight_Change
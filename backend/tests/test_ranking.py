@@ -0,0 +1,155 @@
+# tests/test_ranking.py
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from ranking import DATE_SCALE_DAYS, rank_alternatives
+
+COLUMNS = ["ticket_id", "airline_code", "departure_date", "departure_time", "price_usd",
+           "return_date", "return_departure_airport", "return_arrival_airport"]
+ORIGINAL = {"airline_code": "LH824", "departure_date": "10062025", "departure_time": "10:00",
+            "price_usd": 200, "return_date": "20062025", "return_departure_airport": "JFK",
+            "return_arrival_airport": "FRA"}
+
+
+def row(ticket_id, airline="LH900", date="10062025", time="10:00", price=Decimal("200"),
+        return_date="20062025", return_from="JFK", return_to="FRA"):
+    return (ticket_id, airline, date, time, price, return_date, return_from, return_to)
+
+
+def only(criterion: str):
+    return {name: 1.0 if name == criterion else 0.0
+            for name in ("price", "departure_time", "date", "airline", "return_leg")}
+
+
+def test_identical_ticket_only_pays_neutral_price_penalty():
+    [best] = rank_alternatives(COLUMNS, [row(1)], ORIGINAL)
+    # 价格惩罚把 [-1, 1] 的差价比例映射到 [0, 1]，同价为 0.5
+    assert best.penalties == {"price": 0.5, "departure_time": 0.0, "date": 0.0, "airline": 0.0, "return_leg": 0.0}
+    assert best.score == pytest.approx(1 - 0.5 / 4.0)
+    assert best.explanations == {"price": "same price", "departure_time": "same departure time",
+                                 "date": "same date", "airline": "same airline", "return_leg": "same return date"}
+
+
+def test_price_difference():
+    rows = [row(1, price=300), row(2, price=100), row(3, price=200)]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, priorities=only("price"))
+    assert [r.row["ticket_id"] for r in ranked] == [2, 3, 1]
+    assert [r.penalties["price"] for r in ranked] == pytest.approx([0.25, 0.5, 0.75])
+    assert ranked[0].explanations["price"] == "$100.00 cheaper"
+    assert ranked[2].explanations["price"] == "$100.00 more expensive"
+
+
+def test_departure_time_shift_is_circular():
+    rows = [row(1, time="13:30"), row(2, time=datetime.time(8, 0)), row(3, time="22:00")]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, priorities=only("departure_time"))
+    assert [r.row["ticket_id"] for r in ranked] == [2, 1, 3]
+    assert ranked[0].penalties["departure_time"] == pytest.approx(120 / 720)
+    assert ranked[0].explanations["departure_time"] == "departs 2h00m earlier"
+    assert ranked[1].explanations["departure_time"] == "departs 3h30m later"
+    assert ranked[2].penalties["departure_time"] == pytest.approx(1.0)
+    # 10:00 → 次日 02:00 前后只差 8 小时
+    [wrapped] = rank_alternatives(COLUMNS, [row(4, time="02:00")], ORIGINAL, priorities=only("departure_time"))
+    assert wrapped.penalties["departure_time"] == pytest.approx(480 / 720)
+
+
+def test_date_distance():
+    rows = [row(1, date="13062025"), row(2, date="09062025"), row(3, date="10062025")]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, priorities=only("date"))
+    assert [r.row["ticket_id"] for r in ranked] == [3, 2, 1]
+    assert ranked[1].penalties["date"] == pytest.approx(1 / (1 + DATE_SCALE_DAYS))
+    assert ranked[1].explanations["date"] == "-1 day(s)"
+    assert ranked[2].penalties["date"] == pytest.approx(0.5)
+    assert ranked[2].explanations["date"] == "+3 day(s)"
+
+
+def test_airline_compares_carrier_prefix():
+    ranked = rank_alternatives(COLUMNS, [row(1, airline="UA100"), row(2, airline="LH455")], ORIGINAL,
+                               priorities=only("airline"))
+    assert [r.row["ticket_id"] for r in ranked] == [2, 1]
+    assert [r.explanations["airline"] for r in ranked] == ["same airline", "different airline"]
+
+
+def test_return_leg_combines_date_and_airports():
+    rows = [row(1, return_to="MUC"), row(2, return_date="23062025"), row(3), row(4, return_date=None)]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, priorities=only("return_leg"), top_k=4)
+    assert [r.row["ticket_id"] for r in ranked] == [3, 1, 2, 4]
+    assert [r.penalties["return_leg"] for r in ranked] == pytest.approx([0.0, 0.25, 0.25, 1.0])
+    assert ranked[2].explanations["return_leg"] == "return +3 day(s)"
+    assert ranked[3].explanations["return_leg"] == "unknown"
+
+
+def test_return_leg_ignored_for_one_way_original():
+    one_way = {k: v for k, v in ORIGINAL.items() if k != "return_date"}
+    [best] = rank_alternatives(COLUMNS, [row(1, return_date=None)], one_way)
+    assert set(best.penalties) == {"price", "departure_time", "date", "airline"}
+
+
+def test_priorities_weight_criteria():
+    cheap_late = row(1, price=100, date="14062025")
+    pricey_same_day = row(2, price=260)
+    by_price = rank_alternatives(COLUMNS, [cheap_late, pricey_same_day], ORIGINAL,
+                                 priorities={"price": 5, "date": 1})
+    by_date = rank_alternatives(COLUMNS, [cheap_late, pricey_same_day], ORIGINAL,
+                                priorities={"price": 1, "date": 5})
+    assert by_price[0].row["ticket_id"] == 1
+    assert by_date[0].row["ticket_id"] == 2
+
+
+def test_zero_weight_disables_criterion():
+    ranked = rank_alternatives(COLUMNS, [row(1, price=900), row(2, price=100)], ORIGINAL,
+                               priorities={"price": 0, "unknown": 3})
+    assert all("price" not in r.penalties and "price" not in r.explanations for r in ranked)
+    # 其余准则相同，按原顺序返回
+    assert [r.row["ticket_id"] for r in ranked] == [1, 2]
+    assert all(r.score == pytest.approx(1.0) for r in ranked)
+    negative = rank_alternatives(COLUMNS, [row(1, price=900)], ORIGINAL, priorities={"price": -2})
+    assert "price" not in negative[0].penalties
+
+
+def test_all_weights_zero_keeps_order():
+    rows = [row(1, price=900), row(2, price=100)]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, priorities={name: 0 for name in only("price")})
+    assert [r.row["ticket_id"] for r in ranked] == [1, 2]
+    assert all(r.score == 1.0 and r.penalties == {} for r in ranked)
+
+
+def test_null_and_invalid_values_rank_last():
+    rows = [row(1, price=None, time=None, date="1o062025"), row(2, price=150, time="11:00", date="11062025"),
+            row(3, price=float("nan"), time="bad", date=None)]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, top_k=3)
+    assert ranked[0].row["ticket_id"] == 2
+    for worst in ranked[1:]:
+        assert worst.penalties["price"] == 1.0
+        assert worst.penalties["departure_time"] == 1.0
+        assert worst.penalties["date"] == 1.0
+        assert worst.explanations["price"] == "unknown"
+        assert worst.explanations["departure_time"] == "unknown"
+        assert worst.explanations["date"] == "unknown"
+
+
+def test_missing_columns_and_original_values_are_skipped():
+    columns = ["ticket_id", "price_usd"]
+    [best] = rank_alternatives(columns, [(1, 180)], ORIGINAL)
+    assert set(best.penalties) == {"price"}
+    [unknown] = rank_alternatives(columns, [(1, 180)], {"airline_code": "LH824"})
+    assert unknown.penalties == {} and unknown.score == 1.0
+
+
+def test_top_k_truncates_and_sorts():
+    rows = [row(index, price=100 + index * 10) for index in range(20)]
+    ranked = rank_alternatives(COLUMNS, rows, ORIGINAL, top_k=5)
+    assert [r.row["ticket_id"] for r in ranked] == [0, 1, 2, 3, 4]
+    assert [r.score for r in ranked] == sorted((r.score for r in ranked), reverse=True)
+    assert len(rank_alternatives(COLUMNS, rows[:2], ORIGINAL, top_k=5)) == 2
+    assert rank_alternatives(COLUMNS, [], ORIGINAL) == []
+
+
+def test_to_prompt_includes_explanations():
+    [best] = rank_alternatives(COLUMNS, [row(7, price=Decimal("150.5"), return_from=None)], ORIGINAL)
+    prompt = best.to_prompt()
+    assert prompt["why"]["price"] == "$49.50 cheaper"
+    assert prompt["ticket"]["price_usd"] == "150.5"
+    assert "return_departure_airport" not in prompt["ticket"]
+    assert prompt["score"] == round(best.score, 3)
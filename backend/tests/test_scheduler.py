@@ -0,0 +1,81 @@
+# tests/test_scheduler.py
+import threading
+import time
+
+import pytest
+
+from llm.scheduler import LLMScheduler
+
+
+def queue_in_order(scheduler: LLMScheduler, classes, pause: float = 0.0):
+    """依次排队（前一个入堆后再启动下一个），返回获得槽位的顺序"""
+    granted, threads = [], []
+
+    def waiter(priority_class):
+        scheduler.acquire(priority_class)
+        granted.append(priority_class)
+        scheduler.release()
+
+    for priority_class in classes:
+        queued = len(scheduler._heap)
+        thread = threading.Thread(target=waiter, args=(priority_class,))
+        thread.start()
+        while len(scheduler._heap) == queued:
+            time.sleep(0.001)
+        threads.append(thread)
+        time.sleep(pause)
+    return granted, threads
+
+
+def test_higher_priority_class_is_served_first():
+    scheduler = LLMScheduler(max_concurrency=1, aging_seconds=60)
+    scheduler.acquire("progress")
+    granted, threads = queue_in_order(scheduler, ["entry", "progress", "closing"])
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert granted == ["closing", "progress", "entry"]
+
+
+def test_same_class_is_fifo():
+    scheduler = LLMScheduler(max_concurrency=1, aging_seconds=60)
+    scheduler.acquire("progress")
+    order, threads = [], []
+
+    def waiter(index):
+        scheduler.acquire("progress")
+        order.append(index)
+        scheduler.release()
+
+    for index in range(3):
+        thread = threading.Thread(target=waiter, args=(index,))
+        thread.start()
+        while len(scheduler._heap) == index:
+            time.sleep(0.001)
+        threads.append(thread)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2]
+
+
+def test_aging_prevents_starvation():
+    # 等待 0.05s 相当于提升 5 级，超过 entry 与 closing 的级差 2
+    scheduler = LLMScheduler(max_concurrency=1, aging_seconds=0.01)
+    scheduler.acquire("progress")
+    granted, threads = queue_in_order(scheduler, ["entry", "closing"], pause=0.05)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert granted == ["entry", "closing"]
+
+
+def test_timeout_leaves_queue_clean():
+    scheduler = LLMScheduler(max_concurrency=1, aging_seconds=60)
+    scheduler.acquire("progress")
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("entry", timeout=0.02)
+    assert scheduler._heap == [] and scheduler.active == 1
+    scheduler.release()
+    scheduler.acquire("entry", timeout=0.02)
+    assert scheduler.active == 1
@@ -0,0 +1,65 @@
+# tests/test_session_cache.py
+import time
+
+from request_context import session_scope
+from session_cache import SessionCache, info_fingerprint, normalize_sql, normalize_text
+
+INFO = {"ticket_number": "ABC123", "passenger_name": "Anna"}
+
+
+def test_hit_within_session_only():
+    cache = SessionCache(ttl=60, max_sessions=10)
+    fingerprint = info_fingerprint(INFO)
+    with session_scope("s1"):
+        cache.put("verification", "ABC123", fingerprint, {"valid": True})
+        assert cache.get("verification", "ABC123", fingerprint) == {"valid": True}
+    with session_scope("s2"):
+        assert cache.get("verification", "ABC123", fingerprint) is None
+    assert cache.get("verification", "ABC123", fingerprint) is None  # 不在会话内：不读不写
+
+
+def test_changed_collected_info_invalidates_the_whole_kind():
+    cache = SessionCache(ttl=60, max_sessions=10)
+    before, after = info_fingerprint(INFO), info_fingerprint({**INFO, "passenger_name": "Ben"})
+    with session_scope("s1"):
+        cache.put("alternatives", "a", before, [1])
+        cache.put("alternatives", "b", before, [2])
+        cache.put("proposals", "p", before, [3])
+        assert cache.get("alternatives", "a", after) is None
+        assert cache.get("alternatives", "b", before) is None
+        assert cache.get("proposals", "p", before) == [3]
+
+
+def test_fingerprint_over_selected_fields():
+    changed = {**INFO, "passenger_name": "Ben"}
+    assert info_fingerprint(INFO, ["ticket_number"]) == info_fingerprint(changed, ["ticket_number"])
+    assert info_fingerprint(INFO) != info_fingerprint(changed)
+    assert info_fingerprint({"a": 1, "b": 2}) == info_fingerprint({"b": 2, "a": 1})
+
+
+def test_sessions_expire_and_are_bounded():
+    cache = SessionCache(ttl=0.02, max_sessions=2)
+    for session in ("s1", "s2", "s3"):
+        with session_scope(session):
+            cache.put("kind", "k", "f", session)
+    assert cache.collect() == {"session_cache_sessions": 2}
+    with session_scope("s1"):
+        assert cache.get("kind", "k", "f") is None
+    time.sleep(0.03)
+    with session_scope("s3"):
+        assert cache.get("kind", "k", "f") is None
+
+
+def test_drop_removes_session():
+    cache = SessionCache(ttl=60, max_sessions=10)
+    with session_scope("s1"):
+        cache.put("kind", "k", "f", 1)
+    cache.drop("s1")
+    with session_scope("s1"):
+        assert cache.get("kind", "k", "f") is None
+
+
+def test_normalization():
+    assert normalize_text("  Cheaper   FLIGHT ") == "cheaper flight"
+    assert normalize_sql("SELECT *\n FROM t WHERE name = 'Anna  B';") == normalize_sql("select * from t  where name = 'Anna  B'")
+    assert normalize_sql("SELECT * FROM t WHERE name = 'Anna  B'") != normalize_sql("SELECT * FROM t WHERE name = 'anna b'")
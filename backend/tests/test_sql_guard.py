@@ -0,0 +1,37 @@
+# tests/test_sql_guard.py
+import pytest
+
+from sql_guard import SqlRejected, check_select
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("SELECT * FROM alternative_tickets; DROP TABLE alternative_tickets", "multiple_statements"),
+    ("DELETE FROM alternative_tickets", "not_select"),
+    ("", "not_select"),
+    ("WITH x AS (DELETE FROM alternative_tickets RETURNING *) SELECT * FROM x", "forbidden"),
+    ("SELECT * INTO copy FROM alternative_tickets", "forbidden"),
+    ("SELECT pg_sleep(10)", "forbidden"),
+    ("SELECT * FROM alternative_tickets WHERE set_config ('a', 'b', false) IS NULL", "forbidden"),
+])
+def test_rejects_unsafe_statements(sql, reason):
+    with pytest.raises(SqlRejected) as rejected:
+        check_select(sql, row_limit=50)
+    assert rejected.value.reason == reason
+    assert reason in rejected.value.retry_prompt()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM alternative_tickets WHERE note = 'please DELETE; DROP'",
+    "SELECT * FROM alternative_tickets -- UPDATE later;",
+    'SELECT "insert" FROM alternative_tickets',
+    "SELECT $$pg_sleep(1)$$ FROM alternative_tickets",
+])
+def test_keywords_in_strings_comments_and_identifiers_are_allowed(sql):
+    assert check_select(sql, row_limit=50).startswith(sql.strip().rstrip(";"))
+
+
+def test_limit_is_appended_only_when_missing():
+    assert check_select("SELECT * FROM alternative_tickets;", 50).endswith("LIMIT 50")
+    assert check_select("SELECT * FROM alternative_tickets LIMIT 5", 50) == "SELECT * FROM alternative_tickets LIMIT 5"
+    fetch = "SELECT * FROM alternative_tickets FETCH FIRST 3 ROWS ONLY"
+    assert check_select(fetch, 50) == fetch
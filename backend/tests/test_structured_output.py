@@ -0,0 +1,55 @@
+# tests/test_structured_output.py
+from typing import List
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+
+from structured_output import StructuredChain, StructuredOutputError, repair_json
+
+
+class Output(BaseModel):
+    intent_info: str
+    missing_info: List[str] = []
+
+
+@pytest.mark.parametrize("text", [
+    '{"intent_info": "other", "missing_info": []}',
+    'Sure:\n```json\n{"intent_info": "other", "missing_info": []}\n```',
+    '{"intent_info": "other", // chosen intent\n "missing_info": [],}',
+    '{"intent_info": "other"\n "missing_info": []}',
+    "{'intent_info': 'other', 'missing_info': []}",
+])
+def test_repair_json(text):
+    assert repair_json(text) == {"intent_info": "other", "missing_info": []}
+
+
+def test_repair_json_rejects_prose():
+    with pytest.raises(ValueError):
+        repair_json("I cannot answer that.")
+
+
+def chain(responses, raw_field=None):
+    prompt = ChatPromptTemplate.from_messages([("human", "{question}")])
+    return StructuredChain(prompt, FakeListChatModel(responses=responses), Output, "test_node", raw_field=raw_field)
+
+
+def test_valid_and_repaired_outputs_parse_without_reask():
+    assert chain(['{"intent_info": "other"}']).invoke({"question": "q"}).intent_info == "other"
+    assert chain(["{'intent_info': 'search_flight',}"]).invoke({"question": "q"}).intent_info == "search_flight"
+
+
+def test_unusable_output_is_reasked_once():
+    result = chain(["no json here", '{"intent_info": "other"}']).invoke({"question": "q"})
+    assert result.intent_info == "other"
+
+
+def test_gives_up_after_reask_budget():
+    with pytest.raises(StructuredOutputError):
+        chain(["no json here", '{"missing_info": []}']).invoke({"question": "q"})
+
+
+def test_raw_field_takes_non_json_text():
+    result = chain(["```sql\nSELECT 1\n```"], raw_field="intent_info").invoke({"question": "q"})
+    assert result.intent_info == "SELECT 1"
@@ -0,0 +1,41 @@
+# tests/test_warmup.py
+import threading
+
+import warmup
+from dependencies import get_settings
+
+
+def test_failed_required_step_is_retried_until_ready(monkeypatch):
+    calls = []
+
+    def flaky(context, settings):
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("database unavailable")
+        return "ok"
+
+    monkeypatch.setitem(warmup.WARMUP_STEPS, "flaky", flaky)
+    settings = get_settings().model_copy(update={
+        "warmup_steps": ["flaky"], "warmup_required": ["flaky"], "warmup_retry_base": 0.01, "warmup_retry_max": 0.02,
+    })
+    warmup.run_warmup(settings, {})
+    report = warmup.warmup_state.report()
+    assert report["ready"]
+    assert report["components"]["flaky"]["attempts"] == 3
+
+
+def test_retries_stop_when_asked(monkeypatch):
+    def broken(context, settings):
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setitem(warmup.WARMUP_STEPS, "broken", broken)
+    settings = get_settings().model_copy(update={
+        "warmup_steps": ["broken"], "warmup_required": ["broken"], "warmup_retry_base": 10, "warmup_retry_max": 10,
+    })
+    stop = threading.Event()
+    thread = threading.Thread(target=warmup.run_warmup, args=(settings, {}, stop))
+    thread.start()
+    stop.set()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert not warmup.warmup_state.ready
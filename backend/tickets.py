@@ -0,0 +1,74 @@
+# tickets.py
+import json
+from typing import Iterator, List
+
+import psycopg2
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from auth import get_current_user
+from db import TICKET_COLUMNS, get_db_pool
+from dependencies import get_settings
+from metrics import metrics
+from schemas import BatchVerifyRequest, TicketTriple
+
+router = APIRouter()
+
+# 一次查询核验整批三元组：unnest 展开为带序号的虚拟表，与 tickets 做 LEFT JOIN，
+# 未匹配的行 ticket 列为 NULL，结果按输入顺序返回
+BATCH_VERIFY_SQL = f"""
+SELECT i.idx, {", ".join(f"t.{col}" for col in TICKET_COLUMNS)}
+FROM unnest(%s::text[], %s::text[], %s::text[])
+     WITH ORDINALITY AS i(ticket_number, passenger_birthday, passenger_name, idx)
+LEFT JOIN tickets t
+       ON t.ticket_number = i.ticket_number
+      AND t.passenger_birthday = i.passenger_birthday
+      AND t.passenger_name = i.passenger_name
+ORDER BY i.idx
+"""
+
+
+def _stream_verification(pool, items: List[TicketTriple]) -> Iterator[str]:
+    settings = get_settings()
+    verified = 0
+    with pool.connection(statement_timeout=settings.verify_batch_statement_timeout) as conn:
+        # 服务端游标：边取边写，内存占用与批量大小无关
+        with conn.cursor(name="batch_verify") as cursor:
+            cursor.itersize = settings.verify_batch_fetch_size
+            cursor.execute(BATCH_VERIFY_SQL, (
+                [item.ticket_number for item in items],
+                [item.passenger_birthday for item in items],
+                [item.passenger_name for item in items],
+            ))
+            for row in cursor:
+                index, values = row[0], row[1:]
+                item = items[index - 1]
+                match = values[0] is not None
+                verified += match
+                yield json.dumps({
+                    "index": index - 1,
+                    "ticket_number": item.ticket_number,
+                    "verified": match,
+                    "ticket": dict(zip(TICKET_COLUMNS, values)) if match else None,
+                }, ensure_ascii=False, default=str) + "\n"
+    metrics.inc("tickets_batch_verified_total", verified, result="verified")
+    metrics.inc("tickets_batch_verified_total", len(items) - verified, result="not_found")
+
+
+@router.post("/tickets/verify:batch")
+def verify_tickets_batch(
+    request: BatchVerifyRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """批量核验机票（不经过 LLM），结果按输入顺序以 NDJSON 流式返回"""
+    settings = get_settings()
+    if len(request.tickets) > settings.verify_batch_max_items:
+        raise HTTPException(413, detail=f"At most {settings.verify_batch_max_items} tickets per batch")
+    try:
+        pool = get_db_pool(settings)
+    except psycopg2.Error as e:
+        logger.error(f"Database unavailable for batch verification: {e}")
+        raise HTTPException(503, detail="Database unavailable")
+    logger.info(f"Batch verification of {len(request.tickets)} tickets by {current_user['username']}")
+    return StreamingResponse(_stream_verification(pool, request.tickets), media_type="application/x-ndjson")
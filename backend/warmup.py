@@ -0,0 +1,195 @@
+# warmup.py
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import RunnableSequence
+from loguru import logger
+
+from db import get_db_pool, queries
+from llm import get_http_pool
+from metrics import metrics
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class WarmupState:
+    """预热进度：每个组件的状态、耗时与错误，供 /readyz 报告"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.components: Dict[str, Dict] = {}
+        self.required: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def start(self, steps: Iterable[str], required: Iterable[str]):
+        with self._lock:
+            self.required = list(required)
+            self.components = {name: {"status": PENDING} for name in steps}
+            self.started_at = time.monotonic()
+            self.finished_at = None
+
+    def record(self, name: str, status: str, seconds: float, detail: Optional[str] = None, attempts: int = 1):
+        with self._lock:
+            self.components[name] = {"status": status, "seconds": round(seconds, 3), "attempts": attempts}
+            if detail:
+                self.components[name]["detail"] = detail
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self.finished_at is not None and all(
+                self.components.get(name, {}).get("status") in (READY, SKIPPED) for name in self.required
+            )
+
+    def report(self) -> Dict:
+        ready = self.ready
+        with self._lock:
+            if self.started_at is None:
+                duration = None
+            else:
+                duration = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+            return {
+                "ready": ready,
+                "warmup_finished": self.finished_at is not None,
+                "warmup_seconds": duration,
+                "required": list(self.required),
+                "components": {name: dict(info) for name, info in self.components.items()},
+            }
+
+
+warmup_state = WarmupState()
+
+
+def warm_db_pool(context: Dict, settings) -> str:
+    """建立连接池中的最小连接数，并在每个连接上预编译注册的固定语句"""
+    pool = get_db_pool(settings)
+    connections = []
+    try:
+        for _ in range(max(1, settings.db_pool_min)):
+            connections.append(pool.pool.getconn())
+        for conn in connections:
+            with conn.cursor() as cursor:
+                for name in queries.queries:
+                    if name not in conn.prepared:
+                        cursor.execute(queries.queries[name].prepare_sql)
+                        conn.prepared.add(name)
+            conn.commit()
+    finally:
+        for conn in connections:
+            pool.pool.putconn(conn)
+    return f"{len(connections)} connections, {len(queries.queries)} prepared statements"
+
+
+def _llm_endpoints(settings) -> Dict[str, str]:
+    endpoints = {os.getenv("LLM_URL"): os.getenv("OPENAI_API_KEY")}
+    if settings.llm_small_url:
+        endpoints.setdefault(settings.llm_small_url, os.getenv("OPENAI_API_KEY"))
+    if settings.llm_hedge_enabled and settings.llm_hedge_url:
+        endpoints.setdefault(settings.llm_hedge_url, settings.llm_hedge_api_key or os.getenv("OPENAI_API_KEY"))
+    for profile in settings.node_models.values():
+        if profile.base_url:
+            endpoints.setdefault(profile.base_url, profile.api_key or os.getenv("OPENAI_API_KEY"))
+    return {url: key for url, key in endpoints.items() if url}
+
+
+def warm_llm(context: Dict, settings) -> str:
+    """对每个 LLM 端点请求 /models：不消耗 token，建立并保持 keep-alive 连接"""
+    client = get_http_pool(settings).client
+    results = []
+    for base_url, api_key in _llm_endpoints(settings).items():
+        response = client.get(f"{base_url.rstrip('/')}/models", headers={"Authorization": f"Bearer {api_key}"})
+        response.close()
+        if response.status_code >= 500:
+            raise RuntimeError(f"{base_url} returned {response.status_code}")
+        results.append(f"{base_url} {response.status_code}")
+    return ", ".join(results) or "no endpoint configured"
+
+
+def _prompt_template(value) -> Optional[BasePromptTemplate]:
+    if isinstance(value, BasePromptTemplate):
+        return value
+    if isinstance(value, RunnableSequence) and isinstance(value.first, BasePromptTemplate):
+        return value.first
+    if isinstance(getattr(value, "prompt", None), BasePromptTemplate):
+        # StructuredChain 等自带提示词的组件
+        return value.prompt
+    return None
+
+
+def _prompt_templates(obj) -> Iterable[BasePromptTemplate]:
+    values = [obj] if _prompt_template(obj) is not None else list(vars(obj).values())
+    for value in values:
+        if (template := _prompt_template(value)) is not None:
+            yield template
+
+
+def warm_prompts(context: Dict, settings) -> str:
+    """用占位值渲染节点与链中的提示词模板，提前完成模板解析与相关模块的导入"""
+    templates = {}
+    for component in context.get("prompt_owners", []):
+        for template in _prompt_templates(component):
+            templates[id(template)] = template
+    for template in templates.values():
+        template.format(**{name: "" for name in template.input_variables})
+    return f"{len(templates)} templates"
+
+
+# 名称 -> 预热函数；其他模块可在导入时注册自己的预热步骤
+WARMUP_STEPS: Dict[str, Callable[[Dict, object], str]] = {
+    "db_pool": warm_db_pool,
+    "llm": warm_llm,
+    "prompts": warm_prompts,
+}
+
+
+def register_warmup_step(name: str, func: Callable[[Dict, object], str]):
+    WARMUP_STEPS[name] = func
+
+
+def _run_step(name: str, context: Dict, settings, attempt: int) -> bool:
+    started = time.perf_counter()
+    try:
+        detail = WARMUP_STEPS[name](context, settings)
+        status = READY
+    except Exception as e:
+        detail, status = str(e), FAILED
+        logger.warning(f"Warm-up step {name} failed (attempt {attempt}): {e}")
+    elapsed = time.perf_counter() - started
+    warmup_state.record(name, status, elapsed, detail, attempts=attempt)
+    metrics.observe("warmup_step_seconds", elapsed, step=name)
+    return status == READY
+
+
+def run_warmup(settings, context: Dict, stop: Optional[threading.Event] = None):
+    """按配置顺序执行预热步骤；单个步骤失败只影响该组件的就绪状态
+
+    首轮结束后，失败的步骤按指数退避（warmup_retry_base 起，最长 warmup_retry_max 秒）重试，
+    直到全部成功或 stop 被设置；例如数据库恢复后 /readyz 随之转为 200。
+    """
+    steps = [name for name in settings.warmup_steps if name in WARMUP_STEPS]
+    warmup_state.start(steps, [name for name in settings.warmup_required if name in steps])
+    failed = [name for name in steps if not _run_step(name, context, settings, 1)]
+    warmup_state.finish()
+    logger.info(f"Warm-up finished: {warmup_state.report()}")
+    stop = stop or threading.Event()
+    attempt = 1
+    while failed:
+        delay = min(settings.warmup_retry_max, settings.warmup_retry_base * 2 ** (attempt - 1))
+        if stop.wait(delay):
+            return
+        attempt += 1
+        metrics.inc("warmup_retries_total", len(failed))
+        failed = [name for name in failed if not _run_step(name, context, settings, attempt)]
+        if not failed:
+            logger.info(f"Warm-up retries finished after {attempt} attempts: {warmup_state.report()}")
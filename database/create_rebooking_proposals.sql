@@ -0,0 +1,33 @@
+DROP TABLE IF EXISTS rebooking_proposals CASCADE;
+
+-- Pre-computed rebooking offers for tickets on a disrupted flight.
+-- Filled by the disruption job (backend/disruption.py), one row per (ticket, rank).
+CREATE TABLE rebooking_proposals (
+    ticket_number VARCHAR(13) NOT NULL REFERENCES tickets(ticket_number) ON DELETE CASCADE,
+    rank SMALLINT NOT NULL,                     -- 1 = best match
+    disrupted_airline_code VARCHAR(10) NOT NULL,
+    disrupted_date VARCHAR(8) NOT NULL,         -- DDMMYYYY
+
+    airline_code VARCHAR(10) NOT NULL,          -- Proposed alternative flight
+    departure_airport CHAR(3) NOT NULL,
+    arrival_airport CHAR(3) NOT NULL,
+    departure_date VARCHAR(8),
+    departure_time TIME NOT NULL,
+    arrival_date VARCHAR(8),
+    arrival_time TIME NOT NULL,
+    return_departure_airport CHAR(3),
+    return_arrival_airport CHAR(3),
+    return_date VARCHAR(8),
+    return_departure_time TIME,
+    return_arrival_date VARCHAR(8),
+    return_arrival_time TIME,
+    price_usd DECIMAL(10, 2) NOT NULL,
+    price_difference_usd DECIMAL(10, 2) NOT NULL,
+
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (ticket_number, rank)
+);
+
+-- Disruption lookups: affected tickets by flight and date, candidate alternatives by route
+CREATE INDEX IF NOT EXISTS tickets_airline_date_idx ON tickets (airline_code, departure_date);
+CREATE INDEX IF NOT EXISTS alternative_tickets_route_idx ON alternative_tickets (departure_airport, arrival_airport);